@@ -0,0 +1,35 @@
+from django.urls import path
+
+from LibraryService.urls import urlpatterns as sync_urlpatterns
+from books_app.async_views import AsyncBookDetailView, AsyncBookListView
+from borrowing_app.async_views import (
+    AsyncBorrowingDetailView,
+    AsyncBorrowingListView,
+)
+
+# The project urls plus async read-only twins of the book and borrowing
+# list/detail views. Used with ASYNC_VIEWS, they only pay off when served
+# over ASGI (LibraryService.asgi).
+urlpatterns = [
+    *sync_urlpatterns,
+    path(
+        "api/async/books/",
+        AsyncBookListView.as_view(),
+        name="async-book-list",
+    ),
+    path(
+        "api/async/books/<int:pk>/",
+        AsyncBookDetailView.as_view(),
+        name="async-book-detail",
+    ),
+    path(
+        "api/async/borrowings/",
+        AsyncBorrowingListView.as_view(),
+        name="async-borrowing-list",
+    ),
+    path(
+        "api/async/borrowings/<int:pk>/",
+        AsyncBorrowingDetailView.as_view(),
+        name="async-borrowing-detail",
+    ),
+]
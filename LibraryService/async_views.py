@@ -0,0 +1,99 @@
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.views import View
+from rest_framework.exceptions import (
+    APIException,
+    AuthenticationFailed,
+    NotAuthenticated,
+    NotFound,
+    Throttled,
+)
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+
+def not_found(model) -> NotFound:
+    """The error DRF's ``get_object_or_404`` answers with"""
+    return NotFound(f"No {model._meta.object_name} matches the given query.")
+
+
+class AsyncAPIView(View):
+    """
+    A read-only JSON view running on the event loop under ASGI.
+
+    It keeps the parts of DRF the sync views rely on: the configured
+    authentication and throttle classes, DRF error bodies and JSON
+    rendering, so both answer the same. Handlers get a DRF ``Request`` and
+    return the response data or a response (e.g. from
+    ``aconditional_response``), the queries go through the async ORM.
+    """
+
+    http_method_names = ["get"]
+    authentication_classes = api_settings.DEFAULT_AUTHENTICATION_CLASSES
+    throttle_classes = api_settings.DEFAULT_THROTTLE_CLASSES
+    login_required = False
+
+    async def dispatch(self, request, *args, **kwargs):
+        request = Request(
+            request,
+            authenticators=[auth() for auth in self.authentication_classes],
+        )
+        # JSON only, as negotiated for the ETag of conditional responses.
+        request.accepted_renderer = JSONRenderer()
+        request.accepted_media_type = JSONRenderer.media_type
+        try:
+            await self.initial(request)
+            data = await super().dispatch(request, *args, **kwargs)
+        except APIException as exc:
+            return self.handle_exception(request, exc)
+
+        if isinstance(data, HttpResponse):
+            return data
+        return self.render(data)
+
+    async def initial(self, request: Request) -> None:
+        # Authenticators and throttles are sync, one thread hop for both.
+        await sync_to_async(self.check_access)(request)
+
+    def check_access(self, request: Request) -> None:
+        # Reading ``request.user`` runs the authenticators.
+        if self.login_required and not request.user.is_authenticated:
+            raise NotAuthenticated()
+
+        waits = []
+        for throttle_class in self.throttle_classes:
+            throttle = throttle_class()
+            if not throttle.allow_request(request, self):
+                waits.append(throttle.wait())
+        if waits:
+            raise Throttled(
+                max((wait for wait in waits if wait is not None), default=None)
+            )
+
+    def handle_exception(self, request: Request, exc: APIException):
+        data = (
+            exc.detail
+            if isinstance(exc.detail, (dict, list))
+            else {"detail": exc.detail}
+        )
+        response = self.render(data, status=exc.status_code)
+
+        if isinstance(exc, (NotAuthenticated, AuthenticationFailed)):
+            if self.authentication_classes:
+                authenticator = self.authentication_classes[0]()
+                response["WWW-Authenticate"] = (
+                    authenticator.authenticate_header(request)
+                )
+            else:
+                response.status_code = 403
+        if getattr(exc, "wait", None):
+            response["Retry-After"] = "%d" % exc.wait
+        return response
+
+    def render(self, data, status: int = 200) -> HttpResponse:
+        return HttpResponse(
+            JSONRenderer().render(data),
+            content_type="application/json",
+            status=status,
+        )
@@ -15,4 +15,19 @@ app.conf.beat_schedule = {
         "task": "borrowing_app.tasks.borrowing_overdue",
         "schedule": crontab(hour=13, minute=00),
     },
+    "drain_outbox": {
+        "task": "borrowing_app.tasks.drain_outbox",
+        "schedule": settings.OUTBOX_DRAIN_INTERVAL,
+        # Runs piling up behind a stalled worker would only race each other.
+        "options": {"expires": settings.OUTBOX_DRAIN_INTERVAL},
+    },
+    # Webhooks schedule their own runs, this only catches lost ones.
+    "process_stripe_events": {
+        "task": "payment_app.tasks.process_stripe_events",
+        "schedule": 60,
+    },
+    "reconcile_pending_payments": {
+        "task": "payment_app.tasks.reconcile_pending_payments",
+        "schedule": crontab(minute=30),
+    },
 }
@@ -0,0 +1,242 @@
+"""
+Response compression negotiated from ``Accept-Encoding``.
+
+zstd and brotli are used when their packages (``zstandard``, ``brotli``)
+are installed, gzip always works. Among the encodings the client accepts
+with the highest q-value the first one of ``COMPRESSION_ENCODINGS`` wins.
+Small bodies are sent as they are, streaming responses are compressed
+chunk by chunk and flushed after each chunk, so rows still reach the
+client while an export runs.
+"""
+
+import gzip
+import re
+import zlib
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.decorators import sync_and_async_middleware
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSIBLE_TYPES = (
+    "application/javascript",
+    "application/json",
+    "application/x-ndjson",
+    "application/xml",
+    "image/svg+xml",
+)
+NO_TRANSFORM_RE = re.compile(r"\bno-transform\b")
+
+
+class GzipEncoder:
+    name = "gzip"
+
+    def __init__(self, level: int):
+        self.level = level
+
+    def compress(self, data: bytes) -> bytes:
+        return gzip.compress(data, compresslevel=self.level, mtime=0)
+
+    def start(self):
+        self.stream = zlib.compressobj(self.level, zlib.DEFLATED, 31)
+
+    def compress_chunk(self, chunk: bytes) -> bytes:
+        return self.stream.compress(chunk) + self.stream.flush(
+            zlib.Z_SYNC_FLUSH
+        )
+
+    def finish(self) -> bytes:
+        return self.stream.flush()
+
+
+class BrotliEncoder(GzipEncoder):
+    name = "br"
+
+    def compress(self, data: bytes) -> bytes:
+        return brotli.compress(data, quality=self.level)
+
+    def start(self):
+        self.stream = brotli.Compressor(quality=self.level)
+
+    def compress_chunk(self, chunk: bytes) -> bytes:
+        return self.stream.process(chunk) + self.stream.flush()
+
+    def finish(self) -> bytes:
+        return self.stream.finish()
+
+
+class ZstdEncoder(GzipEncoder):
+    name = "zstd"
+
+    def compress(self, data: bytes) -> bytes:
+        return zstandard.ZstdCompressor(level=self.level).compress(data)
+
+    def start(self):
+        self.stream = zstandard.ZstdCompressor(level=self.level).compressobj()
+
+    def compress_chunk(self, chunk: bytes) -> bytes:
+        return self.stream.compress(chunk) + self.stream.flush(
+            zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        )
+
+    def finish(self) -> bytes:
+        return self.stream.flush()
+
+
+ENCODERS = {"gzip": GzipEncoder}
+if brotli is not None:
+    ENCODERS["br"] = BrotliEncoder
+if zstandard is not None:
+    ENCODERS["zstd"] = ZstdEncoder
+
+
+def available_encodings() -> list[str]:
+    """``COMPRESSION_ENCODINGS`` that can be produced here, in order"""
+    return [
+        name for name in settings.COMPRESSION_ENCODINGS if name in ENCODERS
+    ]
+
+
+def get_encoder(name: str) -> GzipEncoder:
+    return ENCODERS[name](settings.COMPRESSION_LEVELS[name])
+
+
+def parse_accept_encoding(header: str) -> dict[str, float]:
+    """``gzip, br;q=0.5`` to ``{"gzip": 1.0, "br": 0.5}``"""
+    accepted = {}
+    for part in header.split(","):
+        name, *params = (token.strip() for token in part.split(";"))
+        if not name:
+            continue
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[name.lower()] = quality
+    return accepted
+
+
+def negotiate(header: str, encodings: list[str]) -> str | None:
+    """The encoding of ``encodings`` to answer ``header`` with, if any"""
+    accepted = parse_accept_encoding(header)
+    wildcard = accepted.get("*", 0.0)
+    best, best_quality = None, 0.0
+    for name in encodings:
+        quality = accepted.get(name, wildcard)
+        # Ties go to the earlier, preferred encoding.
+        if quality > best_quality:
+            best, best_quality = name, quality
+    return best
+
+
+def is_compressible(content_type: str) -> bool:
+    media_type = content_type.split(";")[0].strip().lower()
+    return (
+        media_type.startswith("text/")
+        or media_type.endswith("+json")
+        or media_type in COMPRESSIBLE_TYPES
+    )
+
+
+@sync_and_async_middleware
+class CompressionMiddleware:
+    """
+    Compress response bodies with zstd, brotli or gzip.
+
+    Levels come from ``COMPRESSION_LEVELS``, bodies shorter than
+    ``COMPRESSION_MIN_SIZE`` bytes are left alone. Like Django's
+    ``GZipMiddleware`` a strong ETag is made weak, the compressed bytes
+    differ but the representation doesn't.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.encodings = available_encodings()
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return self.compress(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.compress(request, await self.get_response(request))
+
+    def compress(self, request, response):
+        if (
+            response.has_header("Content-Encoding")
+            or not is_compressible(response.get("Content-Type", ""))
+            or NO_TRANSFORM_RE.search(response.get("Cache-Control", ""))
+        ):
+            return response
+        if (
+            not response.streaming
+            and len(response.content) < settings.COMPRESSION_MIN_SIZE
+        ):
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        name = negotiate(
+            request.META.get("HTTP_ACCEPT_ENCODING", ""), self.encodings
+        )
+        if name is None:
+            return response
+
+        encoder = get_encoder(name)
+        if response.streaming:
+            response.streaming_content = self.compress_stream(
+                encoder, response.streaming_content, response.is_async
+            )
+            del response["Content-Length"]
+        else:
+            compressed = encoder.compress(response.content)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response["Content-Length"] = str(len(compressed))
+
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response["ETag"] = "W/" + etag
+        response["Content-Encoding"] = name
+        return response
+
+    @staticmethod
+    def compress_stream(encoder: GzipEncoder, content, is_async: bool):
+        encoder.start()
+
+        if is_async:
+
+            async def compressed():
+                async for chunk in content:
+                    data = encoder.compress_chunk(chunk)
+                    if data:
+                        yield data
+                yield encoder.finish()
+
+            return compressed()
+
+        def compressed():
+            for chunk in content:
+                data = encoder.compress_chunk(chunk)
+                if data:
+                    yield data
+            yield encoder.finish()
+
+        return compressed()
@@ -0,0 +1,128 @@
+"""
+Version counters and conditional GET.
+
+A version is the time of the last write to what it covers, in
+microseconds, kept in the cache without expiry. Responses built from
+versioned data carry an ETag and a Last-Modified derived from the
+versions, so a client revalidating an unchanged list gets a 304 before
+any query runs.
+"""
+
+import hashlib
+import time
+from typing import Awaitable, Callable, Iterable
+
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from rest_framework.request import Request
+
+
+def fresh_version() -> int:
+    # Time based, so a lost version key never resurrects old entries.
+    return time.time_ns() // 1000
+
+
+def get_versions(keys: list[str]) -> list[int]:
+    """The versions under ``keys``, in one round trip once they exist"""
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        for key in missing:
+            cache.add(key, fresh_version(), timeout=None)
+        versions.update(cache.get_many(missing))
+    return [versions[key] for key in keys]
+
+
+def bump_versions(keys: Iterable[str]) -> None:
+    cache.set_many(dict.fromkeys(keys, fresh_version()), timeout=None)
+
+
+def invalidate_versions(keys: Iterable[str]) -> None:
+    """Move ``keys`` on, now and once the transaction commits"""
+    # The first bump lets the writer read its own changes, the second one
+    # retires anything derived from the pre-commit rows in between.
+    keys = list(keys)
+    bump_versions(keys)
+    transaction.on_commit(lambda: bump_versions(keys))
+
+
+def _validators(
+    request: Request, versions: list[int]
+) -> tuple[str, int | None]:
+    """The ETag and Last-Modified (epoch seconds) of ``versions``"""
+    digest = hashlib.md5(
+        ":".join(
+            [
+                request.get_full_path(),
+                str(request.user.pk),
+                request.accepted_renderer.format,
+                *map(str, versions),
+            ]
+        ).encode()
+    ).hexdigest()
+    # Whole seconds: a write later in the current second would keep the
+    # same Last-Modified, so there is none (and If-Modified-Since is not
+    # answered) until that second is over. The ETag can't miss a write.
+    last_modified = max(versions) // 1_000_000
+    if last_modified >= int(time.time()):
+        last_modified = None
+    return f'W/"{digest}"', last_modified
+
+
+def _with_validators(
+    response: HttpResponse,
+    etag: str,
+    last_modified: int | None,
+    private: bool,
+) -> HttpResponse:
+    response["ETag"] = etag
+    if last_modified is not None:
+        response["Last-Modified"] = http_date(last_modified)
+    # Revalidate every time, the versions move on without notice.
+    patch_cache_control(response, no_cache=True, private=private)
+    return response
+
+
+def conditional_response(
+    request: Request,
+    versions: list[int],
+    render: Callable[[], HttpResponse],
+    private: bool = False,
+) -> HttpResponse:
+    """
+    Answer ``If-None-Match`` / ``If-Modified-Since`` from ``versions``.
+
+    ``versions`` must cover everything ``render`` reads for this request,
+    they are combined with the url, the user and the response format into
+    the ETag. A matching request gets a 304 without calling ``render``.
+    """
+    etag, last_modified = _validators(request, versions)
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    if response is None:
+        response = render()
+        if response.status_code != 200:
+            return response
+    return _with_validators(response, etag, last_modified, private)
+
+
+async def aconditional_response(
+    request: Request,
+    versions: list[int],
+    render: Callable[[], Awaitable[HttpResponse]],
+    private: bool = False,
+) -> HttpResponse:
+    """``conditional_response`` for async views, ``render`` is awaited"""
+    etag, last_modified = _validators(request, versions)
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    if response is None:
+        response = await render()
+        if response.status_code != 200:
+            return response
+    return _with_validators(response, etag, last_modified, private)
@@ -0,0 +1,297 @@
+import csv
+import io
+import random
+from datetime import date, datetime, time, timedelta, timezone
+from decimal import Decimal
+from typing import Callable, Iterable, Iterator
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+
+from books_app.cache import invalidate_catalog
+from books_app.models import Book
+from borrowing_app.cache import invalidate_borrowings
+from borrowing_app.models import Borrowing
+from payment_app.models import Payment
+from user.accounts import rebuild_account_summaries
+
+User = get_user_model()
+
+DATASET_EMAIL = "dataset-{}@example.com"
+DATASET_PASSWORD = "dataset"
+
+ADJECTIVES = (
+    "Silent", "Hidden", "Last", "Broken", "Golden", "Winter", "Distant",
+    "Forgotten", "Burning", "Glass", "Iron", "Wandering", "Secret", "Wild",
+)
+NOUNS = (
+    "River", "Garden", "Empire", "Island", "Forest", "Harbor", "Mirror",
+    "Machine", "Letters", "Crown", "Shadow", "Journey", "Stone", "Night",
+)
+AUTHORS = (
+    "Taras Shevchenko", "Lesya Ukrainka", "Ivan Franko", "Serhiy Zhadan",
+    "Andrey Kurkov", "Ursula Le Guin", "Olga Tokarczuk", "Italo Calvino",
+    "Toni Morrison", "Haruki Murakami", "Chinua Achebe", "Jorge Luis Borges",
+)
+
+# Loans start in the last HISTORY_DAYS and run for LOAN_DAYS.
+HISTORY_DAYS = 730
+LOAN_DAYS = (7, 30)
+# Of the loans not due yet, how many came back early.
+EARLY_RETURN_RATE = 0.3
+# Of the loans past due, how many are still out (overdue) or came back late.
+OVERDUE_RATE = 0.04
+LATE_RETURN_RATE = 0.15
+MEAN_DAYS_LATE = 6
+# Returns in the last RECENT_DAYS are often still unpaid, older ones rarely.
+RECENT_DAYS = 14
+RECENT_PENDING_RATE = 0.25
+PENDING_RATE = 0.005
+
+BORROWING_COLUMNS = (
+    "id", "borrow_date", "expected_return_date", "actual_return_date",
+    "book_id", "user_id",
+)
+PAYMENT_COLUMNS = (
+    "id", "status", "type", "borrowing_id", "session_id", "money_to_pay",
+)
+
+
+def skewed_choice(rng: random.Random, ids: list[int], skew: float) -> int:
+    """A few ids get most of the picks, like popular books and heavy readers"""
+    return ids[int(len(ids) * rng.random() ** skew)]
+
+
+def write_rows(model, columns: tuple[str, ...], rows: list[tuple]) -> None:
+    """
+    Insert ``rows`` into ``model``'s table, bypassing the ORM.
+
+    Postgres gets them through ``COPY``, other databases through one
+    ``executemany``. Values are strings or None, dates in ISO format.
+    """
+    table = connection.ops.quote_name(model._meta.db_table)
+    names = ", ".join(connection.ops.quote_name(column) for column in columns)
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(rows)
+            buffer.seek(0)
+            cursor.copy_expert(
+                f"COPY {table} ({names}) FROM STDIN WITH (FORMAT csv)", buffer
+            )
+        else:
+            placeholders = ", ".join(["%s"] * len(columns))
+            cursor.executemany(
+                f"INSERT INTO {table} ({names}) VALUES ({placeholders})", rows
+            )
+
+
+def chunked(rows: Iterable, size: int) -> Iterator[list]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def generate_users(
+    rng: random.Random, count: int, today: date, chunk_size: int
+) -> list[int]:
+    password = make_password(DATASET_PASSWORD)
+    first_id = (User.objects.aggregate(last=Max("id"))["last"] or 0) + 1
+    users = (
+        User(
+            email=DATASET_EMAIL.format(number),
+            password=password,
+            date_joined=datetime.combine(
+                today - timedelta(days=rng.randint(0, HISTORY_DAYS)),
+                time(),
+                tzinfo=timezone.utc,
+            ),
+        )
+        for number in range(count)
+    )
+    for chunk in chunked(users, chunk_size):
+        User.objects.bulk_create(chunk)
+    return list(
+        User.objects.filter(id__gte=first_id)
+        .order_by("id")
+        .values_list("id", flat=True)
+    )
+
+
+def generate_books(
+    rng: random.Random, count: int, chunk_size: int
+) -> dict[int, Decimal]:
+    """Create the catalog, return the daily fee of every book id"""
+    first_id = (Book.objects.aggregate(last=Max("id"))["last"] or 0) + 1
+    books = (
+        Book(
+            title=f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)}, vol. {number}",
+            author=rng.choice(AUTHORS),
+            cover=rng.choice(Book.CoverType.values),
+            inventory=rng.randint(0, 40),
+            daily_fee=Decimal(rng.randint(25, 500)) / 100,
+        )
+        for number in range(count)
+    )
+    for chunk in chunked(books, chunk_size):
+        Book.objects.bulk_create(chunk)
+    return dict(
+        Book.objects.filter(id__gte=first_id)
+        .order_by("id")
+        .values_list("id", "daily_fee")
+    )
+
+
+def generate_loans(
+    rng: random.Random,
+    count: int,
+    user_ids: list[int],
+    daily_fees: dict[int, Decimal],
+    today: date,
+    first_id: int,
+) -> Iterator[tuple[tuple, tuple | None]]:
+    """
+    Yield ``(borrowing row, payment row or None)`` pairs.
+
+    Borrow dates are spread over the history, readers and books are
+    skewed. Returned loans have a payment (a fine when returned late,
+    priced by ``Borrowing.fine_payable``) and ids are assigned here, so
+    payments can point at their borrowing without reading it back.
+    """
+    books = {
+        book_id: Book(daily_fee=fee) for book_id, fee in daily_fees.items()
+    }
+    book_ids = list(daily_fees)
+    for borrowing_id in range(first_id, first_id + count):
+        borrow_date = today - timedelta(days=rng.randint(0, HISTORY_DAYS))
+        expected = borrow_date + timedelta(days=rng.randint(*LOAN_DAYS))
+        book_id = skewed_choice(rng, book_ids, 3)
+        user_id = skewed_choice(rng, user_ids, 2)
+
+        if expected >= today:
+            returned = None
+            if rng.random() < EARLY_RETURN_RATE:
+                returned = borrow_date + timedelta(
+                    days=rng.randint(0, (today - borrow_date).days)
+                )
+        else:
+            chance = rng.random()
+            if chance < OVERDUE_RATE:
+                returned = None
+            elif chance < OVERDUE_RATE + LATE_RETURN_RATE:
+                late = 1 + int(rng.expovariate(1 / MEAN_DAYS_LATE))
+                returned = min(expected + timedelta(days=late), today)
+            else:
+                returned = expected - timedelta(
+                    days=rng.randint(0, (expected - borrow_date).days)
+                )
+
+        borrowing = (
+            str(borrowing_id),
+            borrow_date.isoformat(),
+            expected.isoformat(),
+            returned.isoformat() if returned else None,
+            str(book_id),
+            str(user_id),
+        )
+        if returned is None:
+            yield borrowing, None
+            continue
+
+        if returned > expected:
+            payment_type = Payment.Type.FINE
+            money = Borrowing(
+                borrow_date=borrow_date,
+                expected_return_date=expected,
+                actual_return_date=returned,
+                book=books[book_id],
+            ).fine_payable
+        else:
+            # Borrowing.payable as of the day the book came back.
+            payment_type = Payment.Type.PAYMENT
+            money = ((returned - borrow_date).days + 1) * daily_fees[book_id]
+        pending_rate = (
+            RECENT_PENDING_RATE
+            if (today - returned).days <= RECENT_DAYS
+            else PENDING_RATE
+        )
+        pending = rng.random() < pending_rate
+        yield borrowing, (
+            str(borrowing_id),
+            Payment.Status.PENDING if pending else Payment.Status.PAID,
+            payment_type,
+            str(borrowing_id),
+            f"cs_dataset_{borrowing_id}",
+            str(money),
+        )
+
+
+def generate_dataset(
+    users: int,
+    books: int,
+    borrowings: int,
+    seed: int = 0,
+    today: date | None = None,
+    chunk_size: int = 10000,
+    progress: Callable[[str], None] | None = None,
+) -> dict[str, int]:
+    """
+    Fill the database with a synthetic library, the same for the same input.
+
+    Users and books go through ``bulk_create``, borrowings and payments,
+    the bulk of the data, are written in chunks with ``COPY`` on Postgres.
+    Account summaries are rebuilt and the cached catalog and borrowing
+    lists retired at the end. Returns the row counts.
+    """
+    rng = random.Random(seed)
+    today = today or date.today()
+    progress = progress or (lambda message: None)
+
+    user_ids = generate_users(rng, users, today, chunk_size)
+    progress(f"Created {len(user_ids)} users")
+    daily_fees = generate_books(rng, books, chunk_size)
+    progress(f"Created {len(daily_fees)} books")
+
+    first_id = max(
+        (Borrowing.objects.aggregate(last=Max("id"))["last"] or 0),
+        (Payment.objects.aggregate(last=Max("id"))["last"] or 0),
+    ) + 1
+    loans = generate_loans(
+        rng, borrowings, user_ids, daily_fees, today, first_id
+    )
+    created = {"users": len(user_ids), "books": len(daily_fees)}
+    created.update(borrowings=0, payments=0)
+    for chunk in chunked(loans, chunk_size):
+        payments = [payment for _, payment in chunk if payment]
+        with transaction.atomic():
+            write_rows(
+                Borrowing, BORROWING_COLUMNS, [loan for loan, _ in chunk]
+            )
+            write_rows(Payment, PAYMENT_COLUMNS, payments)
+        created["borrowings"] += len(chunk)
+        created["payments"] += len(payments)
+        progress(f"Created {created['borrowings']} borrowings")
+
+    # Explicit ids leave the Postgres sequences behind.
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(
+            no_style(), [Borrowing, Payment]
+        ):
+            cursor.execute(sql)
+        if connection.vendor == "postgresql":
+            cursor.execute("ANALYZE")
+
+    rebuild_account_summaries(chunk_size=chunk_size)
+    progress("Rebuilt account summaries")
+    # Raw inserts fire no signals.
+    invalidate_catalog()
+    invalidate_borrowings(*user_ids)
+    return created
@@ -0,0 +1,108 @@
+import csv
+import io
+from typing import Iterator
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import QuerySet
+from django.http import StreamingHttpResponse
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import OpenApiParameter
+
+EXPORT_FORMATS = ("csv", "ndjson")
+CONTENT_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+EXPORT_PARAMETERS = [
+    OpenApiParameter(
+        name="file_format",
+        description="Export format, csv (default) or ndjson",
+        required=False,
+        type=OpenApiTypes.STR,
+        enum=EXPORT_FORMATS,
+    ),
+    OpenApiParameter(
+        name="after_id",
+        description=(
+            "Resume an interrupted export after the last id received "
+            "(ex. ?after_id=1500)"
+        ),
+        required=False,
+        type=OpenApiTypes.INT,
+    ),
+]
+
+
+def stream_rows(
+    queryset: QuerySet,
+    fields: tuple[str, ...],
+    file_format: str,
+    chunk_size: int = 2000,
+) -> Iterator[str]:
+    """
+    Render ``fields`` of every row as CSV or NDJSON, one chunk at a time.
+
+    Rows come from ``values_list().iterator()``, so neither model instances
+    nor the whole result are ever held in memory.
+    """
+    rows = queryset.values_list(*fields).iterator(chunk_size=chunk_size)
+    buffer = io.StringIO()
+
+    if file_format == "csv":
+        writer = csv.writer(buffer)
+        writer.writerow(fields)
+        write = writer.writerow
+    else:
+        encoder = DjangoJSONEncoder()
+
+        def write(row):
+            buffer.write(encoder.encode(dict(zip(fields, row))))
+            buffer.write("\n")
+
+    for number, row in enumerate(rows, start=1):
+        write(row)
+        if number % chunk_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    yield buffer.getvalue()
+
+
+def export_response(
+    queryset: QuerySet,
+    fields: tuple[str, ...],
+    file_format: str,
+    filename: str,
+    after_id: int | None = None,
+) -> StreamingHttpResponse:
+    """Stream ``queryset`` ordered by id, resuming after ``after_id``"""
+    if after_id is not None:
+        queryset = queryset.filter(id__gt=after_id)
+
+    response = StreamingHttpResponse(
+        stream_rows(queryset.order_by("id"), fields, file_format),
+        content_type=CONTENT_TYPES[file_format],
+    )
+    response["Content-Disposition"] = (
+        f'attachment; filename="{filename}.{file_format}"'
+    )
+    return response
+
+
+def parse_export_params(query_params) -> tuple[str, int | None]:
+    """Read ``file_format`` and ``after_id``, raise ValueError when invalid"""
+    file_format = query_params.get("file_format", "csv")
+    if file_format not in EXPORT_FORMATS:
+        raise ValueError(
+            f"file_format must be one of: {', '.join(EXPORT_FORMATS)}"
+        )
+
+    after_id = query_params.get("after_id")
+    if after_id is not None:
+        if not after_id.isdigit():
+            raise ValueError("after_id must be a positive integer")
+        after_id = int(after_id)
+
+    return file_format, after_id
@@ -0,0 +1,153 @@
+"""
+Sparse fieldsets and opt-in expansion of related objects.
+
+``?fields=id,book`` keeps only the listed fields of a response and
+``?expand=book`` nests the related object instead of its primary key,
+``?expand=borrowing.book`` one level further down. The view builds its
+``select_related`` from the expansion, so related rows nobody asked for
+are neither joined nor serialized.
+"""
+
+from django.db.models import QuerySet
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import OpenApiParameter
+from rest_framework.exceptions import ParseError
+from rest_framework.request import Request
+
+FIELDSET_PARAMETERS = [
+    OpenApiParameter(
+        name="fields",
+        description=(
+            "Comma separated fields to return, all by default "
+            "(ex. ?fields=id,expected_return_date)"
+        ),
+        required=False,
+        type=OpenApiTypes.STR,
+    ),
+    OpenApiParameter(
+        name="expand",
+        description=(
+            "Comma separated relations to nest instead of their id, "
+            "dotted for nested ones (ex. ?expand=book,borrowing.user)"
+        ),
+        required=False,
+        type=OpenApiTypes.STR,
+    ),
+]
+
+
+def split_param(value: str | None) -> list[str]:
+    return [name.strip() for name in (value or "").split(",") if name.strip()]
+
+
+class ExpandableSerializerMixin:
+    """
+    A ``ModelSerializer`` taking ``fields`` and ``expand`` keyword arguments.
+
+    ``expandable_fields`` maps a field to the serializer nesting it, the
+    field as declared renders the relation unexpanded, usually by its
+    primary key. ``expand`` is a tree of names as ``parse_expand`` builds.
+    """
+
+    expandable_fields: dict = {}
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+        for name, nested in (expand or {}).items():
+            if name in self.fields:
+                # Only expandable serializers take a nested expansion.
+                extra = {"expand": nested} if nested else {}
+                self.fields[name] = self.expandable_fields[name](
+                    read_only=True, **extra
+                )
+
+    @classmethod
+    def parse_fields(cls, value: str | None) -> list[str] | None:
+        if value is None:
+            return None
+        fields = split_param(value)
+        unknown = set(fields) - set(cls.Meta.fields)
+        if unknown:
+            raise ParseError(
+                f"Unknown fields: {', '.join(sorted(unknown))}. "
+                f"Choose from {', '.join(cls.Meta.fields)}."
+            )
+        return fields
+
+    @classmethod
+    def parse_expand(cls, value: str | None) -> dict:
+        """``borrowing.book,borrowing.user`` to ``{"borrowing": {...}}``"""
+        tree = {}
+        for path in split_param(value):
+            serializer_class, node = cls, tree
+            for name in path.split("."):
+                expandable = getattr(serializer_class, "expandable_fields", {})
+                if name not in expandable:
+                    raise ParseError(
+                        f"Cannot expand {path}. Expandable: "
+                        f"{', '.join(expandable) or 'nothing'}."
+                    )
+                serializer_class = expandable[name]
+                node = node.setdefault(name, {})
+        return tree
+
+
+def related_paths(expand: dict, prefix: str = "") -> list[str]:
+    """The ``select_related`` lookups an expansion tree needs"""
+    paths = []
+    for name, nested in expand.items():
+        paths.append(prefix + name)
+        paths.extend(related_paths(nested, f"{prefix}{name}__"))
+    return paths
+
+
+def select_expanded(queryset: QuerySet, expand: dict) -> QuerySet:
+    paths = related_paths(expand)
+    # A bare select_related() would follow every foreign key.
+    return queryset.select_related(*paths) if paths else queryset
+
+
+def request_fieldset(
+    request: Request, serializer_class
+) -> tuple[list[str] | None, dict]:
+    """The validated ``?fields=`` and ``?expand=`` of ``request``"""
+    fields = serializer_class.parse_fields(request.query_params.get("fields"))
+    expand = serializer_class.parse_expand(request.query_params.get("expand"))
+    if fields is not None:
+        expand = {
+            name: nested for name, nested in expand.items() if name in fields
+        }
+    return fields, expand
+
+
+class FieldsetViewMixin:
+    """
+    Honour ``?fields=`` and ``?expand=`` on the list and retrieve actions.
+
+    Their serializers must use ``ExpandableSerializerMixin``. Call
+    ``expand_queryset`` from ``get_queryset`` to join what is expanded.
+    """
+
+    fieldset_actions = ("list", "retrieve")
+
+    def get_fieldset(self) -> tuple[list[str] | None, dict]:
+        if not hasattr(self, "_fieldset"):
+            self._fieldset = request_fieldset(
+                self.request, self.get_serializer_class()
+            )
+        return self._fieldset
+
+    def expand_queryset(self, queryset: QuerySet) -> QuerySet:
+        if self.action not in self.fieldset_actions:
+            return queryset
+        fields, expand = self.get_fieldset()
+        return select_expanded(queryset, expand)
+
+    def get_serializer(self, *args, **kwargs):
+        if self.action in self.fieldset_actions:
+            kwargs["fields"], kwargs["expand"] = self.get_fieldset()
+        return super().get_serializer(*args, **kwargs)
+
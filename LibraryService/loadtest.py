@@ -0,0 +1,746 @@
+"""
+In-process HTTP load test of the API.
+
+The project is served by a pooled WSGI server (or an ASGI bridge for the
+async views) on localhost, Stripe and Telegram are replaced by local
+stubs, and virtual users drive a weighted mix of scenarios. Every
+response is recorded with its latency and SQL query count
+(``X-Query-Count``) and summarized as JSON.
+"""
+
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import random
+import socket
+import socketserver
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager, nullcontext, suppress
+from dataclasses import dataclass
+from decimal import Decimal
+from itertools import compress
+from statistics import mean
+from typing import Callable, Iterator
+from unittest import mock
+
+import requests
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.servers.basehttp import WSGIRequestHandler, WSGIServer
+from django.db import DatabaseError, close_old_connections, connection
+from django.db.backends.signals import connection_created
+from django.test.utils import modify_settings, override_settings
+from rest_framework.settings import api_settings
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from LibraryService.testing import LocalHTTPStub
+
+User = get_user_model()
+
+logger = logging.getLogger(__name__)
+
+LOADTEST_EMAIL = "loadtest-{}@example.com"
+LOADTEST_PASSWORD = "loadtestQq1"
+WEBHOOK_SECRET = "whsec_loadtest"
+# SIMPLE_JWT's AUTH_HEADER_NAME is a WSGI environ key, HTTP_AUTHORIZE here.
+AUTH_HEADER = (
+    jwt_settings.AUTH_HEADER_NAME.removeprefix("HTTP_").replace("_", "-").title()
+)
+
+DEFAULT_MIX = {
+    "books": 40,
+    "book_detail": 15,
+    "borrowings": 15,
+    "payments": 10,
+    "borrow_return": 10,
+    "token": 10,
+}
+
+
+@dataclass
+class Sample:
+    name: str
+    status: int
+    latency: float
+    queries: int | None
+    # Body bytes on the wire, compressed when the server compressed.
+    size: int
+    # Body bytes a 304 spared, the size of the cached response.
+    saved: int = 0
+
+
+class Recorder:
+    def __init__(self):
+        self.samples: list[Sample] = []
+        self.lock = threading.Lock()
+
+    def add(self, sample: Sample) -> None:
+        with self.lock:
+            self.samples.append(sample)
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    """Nearest-rank percentile of already sorted ``values``"""
+    index = max(0, min(len(values) - 1, round(fraction * len(values)) - 1))
+    return values[index]
+
+
+def latency_summary(samples: list[Sample]) -> dict:
+    latencies = sorted(sample.latency * 1000 for sample in samples)
+    return {
+        "p50": round(percentile(latencies, 0.50), 2),
+        "p95": round(percentile(latencies, 0.95), 2),
+        "p99": round(percentile(latencies, 0.99), 2),
+        "max": round(latencies[-1], 2),
+        "mean": round(mean(latencies), 2),
+    }
+
+
+def summarize(samples: list[Sample], elapsed: float) -> dict:
+    """Totals and per endpoint latency, status and query statistics"""
+    if not samples:
+        return {"requests": 0}
+
+    def stats(group: list[Sample]) -> dict:
+        queries = [s.queries for s in group if s.queries is not None]
+        statuses = {}
+        for sample in group:
+            statuses[str(sample.status)] = statuses.get(str(sample.status), 0) + 1
+        return {
+            "requests": len(group),
+            "errors": sum(1 for s in group if s.status == 0 or s.status >= 500),
+            "statuses": dict(sorted(statuses.items())),
+            "latency_ms": latency_summary(group),
+            "queries_per_request": (
+                round(mean(queries), 2) if queries else None
+            ),
+            "bytes_per_request": round(mean(s.size for s in group)),
+            "not_modified": statuses.get("304", 0),
+            "bytes_saved": sum(s.saved for s in group),
+        }
+
+    endpoints = {}
+    for sample in samples:
+        endpoints.setdefault(sample.name, []).append(sample)
+
+    return {
+        **stats(samples),
+        "duration_s": round(elapsed, 2),
+        "throughput_rps": round(len(samples) / elapsed, 2),
+        "endpoints": {
+            name: stats(group) for name, group in sorted(endpoints.items())
+        },
+    }
+
+
+class PooledWSGIServer(socketserver.ThreadingMixIn, WSGIServer):
+    """
+    Serves requests on a fixed pool of threads, like gunicorn's gthread.
+
+    Long lived worker threads keep their database connections, unlike
+    Django's ThreadedWSGIServer that closes them after every request.
+    """
+
+    request_queue_size = 128
+
+    def __init__(self, *args, workers: int = 8, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.connections = set()
+
+    def process_request(self, request, client_address):
+        # Don't let Nagle hold back the body written after the headers.
+        request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.connections.add(request)
+        self.pool.submit(self.process_request_thread, request, client_address)
+
+    def shutdown_request(self, request):
+        self.connections.discard(request)
+        super().shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        # Wake up the threads waiting on idle keep-alive connections.
+        for request in list(self.connections):
+            with suppress(OSError):
+                request.shutdown(socket.SHUT_RDWR)
+        self.pool.shutdown(cancel_futures=True)
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+@contextmanager
+def serve(application, workers: int) -> Iterator[str]:
+    """Run ``application`` on a free localhost port, yield its base url"""
+    server = PooledWSGIServer(
+        ("127.0.0.1", 0), QuietRequestHandler, workers=workers
+    )
+    server.set_app(application)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://localhost:{server.server_port}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@contextmanager
+def serve_asgi(application) -> Iterator[str]:
+    """
+    Run an ASGI ``application`` on aiohttp's server, yield its base url.
+
+    A minimal HTTP/1.1 bridge on one event loop thread, enough to load test
+    the project without an ASGI server installed.
+    """
+    from aiohttp import web
+
+    async def handle(request: web.Request) -> web.StreamResponse:
+        body = await request.read()
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": request.method,
+            "scheme": "http",
+            "path": request.path,
+            "raw_path": request.raw_path.split("?", 1)[0].encode(),
+            "query_string": request.query_string.encode(),
+            "root_path": "",
+            "headers": [
+                (name.lower(), value) for name, value in request.raw_headers
+            ],
+            "client": (request.remote, 0),
+            "server": (request.host, 0),
+        }
+        messages = [{"type": "http.request", "body": body}]
+
+        async def receive():
+            if messages:
+                return messages.pop()
+            # Django listens for a disconnect until the response is sent.
+            return await asyncio.Future()
+
+        response = web.StreamResponse()
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                response.set_status(message["status"])
+                for name, value in message["headers"]:
+                    response.headers.add(name.decode(), value.decode())
+                await response.prepare(request)
+            elif message["type"] == "http.response.body":
+                await response.write(message.get("body", b""))
+                if not message.get("more_body"):
+                    await response.write_eof()
+
+        await application(scope, receive, send)
+        return response
+
+    app = web.Application()
+    app.router.add_route("*", "/{tail:.*}", handle)
+    runner = web.AppRunner(app, access_log=None)
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(runner.setup())
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    loop.run_until_complete(site.start())
+    port = runner.addresses[0][1]
+
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://localhost:{port}"
+    finally:
+        asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+
+@contextmanager
+def query_latency(seconds: float) -> Iterator[None]:
+    """Add ``seconds`` to every SQL query, like a database across a network"""
+
+    def delay(execute, sql, params, many, context):
+        time.sleep(seconds)
+        return execute(sql, params, many, context)
+
+    def install(sender, connection, **kwargs):
+        # Connections open lazily, often inside an ``execute_wrapper()``
+        # block that pops the last wrapper on exit.
+        connection.execute_wrappers.insert(0, delay)
+
+    if not seconds:
+        yield
+        return
+    connection_created.connect(install)
+    try:
+        yield
+    finally:
+        connection_created.disconnect(install)
+
+
+def stripe_stub_handler(base_url: Callable[[], str]):
+    """Checkout sessions that redirect to a fake payment page"""
+
+    def handle(method, path, body):
+        session_id = (
+            path.rsplit("/", 1)[-1]
+            if method == "GET"
+            else f"cs_loadtest_{time.monotonic_ns()}"
+        )
+        return 200, {
+            "id": session_id,
+            "object": "checkout.session",
+            "url": f"{base_url()}/pay/{session_id}",
+            "expires_at": int(time.time()) + 24 * 60 * 60,
+            "status": "open",
+            "payment_status": "unpaid",
+        }
+
+    return handle
+
+
+def telegram_stub_handler(method, path, body):
+    return 200, {"ok": True, "result": {}}
+
+
+@contextmanager
+def stub_services() -> Iterator[dict]:
+    """
+    Point Stripe and Telegram at local stubs and run Celery eagerly.
+
+    Stripe webhooks are processed by a background thread standing in for
+    the worker, as they would be in production.
+    """
+    from LibraryService.celery import app
+    from borrowing_app import telegram
+    from borrowing_app.tasks import drain_outbox
+    from payment_app.tasks import process_stripe_events
+
+    with ExitStack() as stack:
+        stripe_stub = LocalHTTPStub(
+            stripe_stub_handler(lambda: stripe_stub.url)
+        )
+        stack.enter_context(stripe_stub)
+        telegram_stub = stack.enter_context(
+            LocalHTTPStub(telegram_stub_handler)
+        )
+
+        stack.enter_context(mock.patch("stripe.api_base", stripe_stub.url))
+        stack.enter_context(
+            mock.patch(
+                "payment_app.webhooks.STRIPE_WEBHOOK_SECRET", WEBHOOK_SECRET
+            )
+        )
+        stack.enter_context(
+            mock.patch.object(
+                telegram,
+                "_dispatcher",
+                telegram.TelegramDispatcher(
+                    "loadtest", telegram_stub.url, rate_limit=10_000
+                ),
+            )
+        )
+        stack.enter_context(
+            mock.patch("payment_app.views.schedule_stripe_events")
+        )
+        eager = app.conf.task_always_eager
+        app.conf.task_always_eager = True
+        stack.callback(setattr, app.conf, "task_always_eager", eager)
+
+        stop = threading.Event()
+
+        def worker():
+            while not stop.wait(0.2):
+                try:
+                    process_stripe_events()
+                    drain_outbox()
+                except DatabaseError as error:
+                    # e.g. "database is locked" on SQLite, Celery would retry.
+                    logger.warning("Load test worker failed: %s", error)
+            close_old_connections()
+
+        thread = threading.Thread(target=worker, daemon=True)
+        thread.start()
+        try:
+            yield {"stripe": stripe_stub, "telegram": telegram_stub}
+        finally:
+            stop.set()
+            thread.join()
+
+
+def prepare_data(users: int, books: int = 200) -> None:
+    """(Re)create the load test users and make sure there is a catalog"""
+    from books_app.models import Book
+
+    User.objects.filter(email__startswith="loadtest-").delete()
+    password = make_password(LOADTEST_PASSWORD)
+    User.objects.bulk_create(
+        User(email=LOADTEST_EMAIL.format(number), password=password)
+        for number in range(users)
+    )
+
+    existing = Book.objects.filter(author="Load Tester").count()
+    Book.objects.bulk_create(
+        Book(
+            title=f"Load test book {number}",
+            author="Load Tester",
+            inventory=1_000_000,
+            daily_fee=Decimal("1.00"),
+        )
+        for number in range(existing, books)
+    )
+
+
+def wire_size(response: requests.Response) -> int:
+    # requests decompresses ``content``, Content-Length is what was sent.
+    length = response.headers.get("Content-Length")
+    return int(length) if length is not None else len(response.content)
+
+
+class VirtualUser:
+    """
+    One API client with its own JWT, driving scenarios in a loop.
+
+    ``read_prefix`` is where the book and borrowing reads are sent, e.g.
+    ``/api/async`` for the async views. With ``conditional`` the user
+    keeps the responses that carry an ETag and revalidates them, a 304 is
+    recorded as such and the kept response is used.
+    """
+
+    def __init__(
+        self,
+        number: int,
+        base_url: str,
+        recorder: Recorder,
+        read_prefix: str = "/api",
+        keep_alive: bool = True,
+        conditional: bool = False,
+    ):
+        self.email = LOADTEST_EMAIL.format(number)
+        self.base_url = base_url
+        self.recorder = recorder
+        self.read_prefix = read_prefix
+        self.keep_alive = keep_alive
+        self.conditional = conditional
+        self.responses: dict[str, requests.Response] = {}
+        self.session = requests.Session()
+        if not keep_alive:
+            self.session.headers["Connection"] = "close"
+        self.rng = random.Random(number)
+        self.book_ids: list[int] = []
+
+    def request(self, name: str, method: str, path: str, **kwargs):
+        kept = self.responses.get(path) if method == "GET" else None
+        if kept is not None:
+            kwargs["headers"] = {
+                **kwargs.get("headers", {}),
+                "If-None-Match": kept.headers["ETag"],
+            }
+        started = time.perf_counter()
+        try:
+            response = self.session.request(
+                method,
+                self.base_url + path,
+                allow_redirects=False,
+                timeout=30,
+                **kwargs,
+            )
+        except requests.RequestException:
+            self.recorder.add(
+                Sample(name, 0, time.perf_counter() - started, None, 0)
+            )
+            return None
+        finally:
+            if not self.keep_alive:
+                # urllib3 pools the connection anyway, and may reuse it
+                # before it sees the server close it.
+                self.session.close()
+
+        queries = response.headers.get("X-Query-Count")
+        self.recorder.add(
+            Sample(
+                name,
+                response.status_code,
+                time.perf_counter() - started,
+                int(queries) if queries is not None else None,
+                wire_size(response),
+                wire_size(kept) if response.status_code == 304 else 0,
+            )
+        )
+        if response.status_code == 304 and kept is not None:
+            return kept
+        if (
+            self.conditional
+            and method == "GET"
+            and response.status_code == 200
+            and "ETag" in response.headers
+        ):
+            self.responses[path] = response
+        return response
+
+    def login(self) -> bool:
+        response = self.request(
+            "POST /api/users/token/",
+            "POST",
+            "/api/users/token/",
+            json={"email": self.email, "password": LOADTEST_PASSWORD},
+        )
+        if response is None or response.status_code != 200:
+            return False
+        tokens = response.json()
+        self.refresh = tokens["refresh"]
+        self.session.headers[AUTH_HEADER] = f"Bearer {tokens['access']}"
+        return True
+
+    def books(self):
+        page = self.rng.randint(0, 3) * 20
+        response = self.request(
+            f"GET {self.read_prefix}/books/",
+            "GET",
+            f"{self.read_prefix}/books/?limit=20&offset={page}",
+        )
+        if response is not None and response.status_code == 200:
+            data = response.json()
+            results = data["results"] if isinstance(data, dict) else data
+            self.book_ids = [
+                book["id"] for book in results if book["inventory"] > 0
+            ] or self.book_ids
+
+    def book_detail(self):
+        if not self.book_ids:
+            return self.books()
+        self.request(
+            f"GET {self.read_prefix}/books/{{id}}/",
+            "GET",
+            f"{self.read_prefix}/books/{self.rng.choice(self.book_ids)}/",
+        )
+
+    def borrowings(self):
+        self.request(
+            f"GET {self.read_prefix}/borrowings/",
+            "GET",
+            f"{self.read_prefix}/borrowings/?limit=20",
+        )
+
+    def payments(self):
+        self.request("GET /api/payments/", "GET", "/api/payments/?limit=20")
+
+    def token(self):
+        self.request(
+            "POST /api/users/token/refresh/",
+            "POST",
+            "/api/users/token/refresh/",
+            json={"refresh": self.refresh},
+        )
+
+    def borrow_return(self):
+        """Borrow a book, return it and pay through the Stripe webhook"""
+        if not self.book_ids:
+            return self.books()
+        borrowed = self.request(
+            "POST /api/borrowings/",
+            "POST",
+            "/api/borrowings/",
+            json={
+                "book": self.rng.choice(self.book_ids),
+                "expected_return_date": "2099-01-01",
+            },
+        )
+        if borrowed is None or borrowed.status_code != 201:
+            return
+        # The create response has no id, find the loan like a client would.
+        active = self.request(
+            "GET /api/borrowings/?is_active=true",
+            "GET",
+            "/api/borrowings/?is_active=true&limit=1",
+        )
+        if active is None or active.status_code != 200:
+            return
+        borrowing_id = active.json()["results"][0]["id"]
+
+        returned = self.request(
+            "POST /api/borrowings/{id}/return/",
+            "POST",
+            f"/api/borrowings/{borrowing_id}/return/",
+        )
+        if returned is None or "Location" not in returned.headers:
+            return
+        session_id = returned.headers["Location"].rsplit("/", 1)[-1]
+
+        payload = json.dumps(
+            {
+                "id": f"evt_{session_id}",
+                "type": "checkout.session.completed",
+                "data": {
+                    "object": {"id": session_id, "payment_status": "paid"}
+                },
+            }
+        )
+        timestamp = int(time.time())
+        signature = hmac.new(
+            WEBHOOK_SECRET.encode(),
+            f"{timestamp}.{payload}".encode(),
+            hashlib.sha256,
+        ).hexdigest()
+        self.request(
+            "POST /api/payments/webhook/",
+            "POST",
+            "/api/payments/webhook/",
+            data=payload,
+            headers={
+                "Content-Type": "application/json",
+                "Stripe-Signature": f"t={timestamp},v1={signature}",
+            },
+        )
+
+    def run(self, mix: dict[str, int], deadline: float) -> None:
+        scenarios = [getattr(self, name) for name in mix]
+        weights = list(mix.values())
+        # Closing the session frees the server thread keeping it alive.
+        with self.session:
+            while time.monotonic() < deadline:
+                self.rng.choices(scenarios, weights)[0]()
+
+
+def run_load(
+    base_url: str,
+    concurrency: int,
+    duration: float,
+    mix: dict[str, int] | None = None,
+    read_prefix: str = "/api",
+    keep_alive: bool = True,
+    conditional: bool = False,
+) -> dict:
+    """Drive ``concurrency`` virtual users for ``duration`` seconds"""
+    mix = mix or DEFAULT_MIX
+    unknown = set(mix) - set(DEFAULT_MIX)
+    if unknown:
+        raise ValueError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+    logins = Recorder()
+    recorder = Recorder()
+    users = [
+        VirtualUser(
+            number, base_url, logins, read_prefix, keep_alive, conditional
+        )
+        for number in range(concurrency)
+    ]
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        # Password hashing is slow on purpose, keep it out of the mix.
+        started = time.monotonic()
+        logged_in = list(executor.map(VirtualUser.login, users))
+        login_elapsed = time.monotonic() - started
+        users = list(compress(users, logged_in))
+
+        started = time.monotonic()
+        deadline = started + duration
+        for user in users:
+            user.recorder = recorder
+        for future in [
+            executor.submit(user.run, mix, deadline) for user in users
+        ]:
+            future.result()
+
+    return {
+        **summarize(recorder.samples, time.monotonic() - started),
+        "login": summarize(logins.samples, login_elapsed),
+    }
+
+
+def loadtest(
+    concurrency: int = 8,
+    duration: float = 30,
+    mix: dict[str, int] | None = None,
+    base_url: str | None = None,
+    asgi: bool = False,
+    workers: int | None = None,
+    keep_alive: bool = True,
+    conditional: bool = False,
+) -> dict:
+    """
+    Load test a server at ``base_url``, or the project served in process.
+
+    In process, load test users are recreated and Stripe / Telegram are
+    stubbed. The WSGI app runs on ``workers`` threads (one per virtual user
+    by default) with the query count middleware. With ``asgi`` the ASGI app
+    runs on a single event loop and the reads go to the async views, routed
+    for the run whatever ``ASYNC_VIEWS`` says; query counts are not
+    available there, the async ORM queries on other threads. A server at
+    ``base_url`` needs ``ASYNC_VIEWS`` for ``asgi``.
+    With ``conditional`` the virtual users revalidate with ``If-None-Match``.
+    """
+    read_prefix = "/api/async" if asgi else "/api"
+    if base_url:
+        report = run_load(
+            base_url,
+            concurrency,
+            duration,
+            mix,
+            read_prefix,
+            keep_alive,
+            conditional,
+        )
+        return {"target": base_url, "concurrency": concurrency, **report}
+
+    prepare_data(users=concurrency)
+
+    if asgi:
+        from django.core.asgi import get_asgi_application
+
+        server = serve_asgi(get_asgi_application())
+    else:
+        from django.core.wsgi import get_wsgi_application
+
+        # The handler reads MIDDLEWARE once, when it is created.
+        with modify_settings(
+            MIDDLEWARE={"prepend": settings.QUERY_COUNT_MIDDLEWARE}
+        ):
+            application = get_wsgi_application()
+        server = serve(application, workers=workers or concurrency + 2)
+
+    # Virtual users return books far more often than the per-user limit.
+    lift_return_limit = mock.patch.dict(
+        api_settings.DEFAULT_THROTTLE_RATES, return_book=None
+    )
+    async_urls = (
+        override_settings(ROOT_URLCONF="LibraryService.async_urls")
+        if asgi
+        else nullcontext()
+    )
+    with stub_services(), lift_return_limit, async_urls, server as url:
+        report = run_load(
+            url,
+            concurrency,
+            duration,
+            mix,
+            read_prefix,
+            keep_alive,
+            conditional,
+        )
+
+    return {
+        "target": "in-process",
+        "server": "asgi" if asgi else "wsgi",
+        "database": connection.vendor,
+        "concurrency": concurrency,
+        **report,
+    }
+
+
+def parse_mix(value: str) -> dict[str, int]:
+    """``books=40,borrow_return=10`` to a scenario weight dict"""
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = int(weight or 1)
+    return mix
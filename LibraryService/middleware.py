@@ -0,0 +1,94 @@
+import time
+
+from asgiref.sync import (
+    iscoroutinefunction,
+    markcoroutinefunction,
+    sync_to_async,
+)
+from django.db import connection
+from django.utils.decorators import sync_and_async_middleware
+
+
+class QueryStats:
+    """``connection.execute_wrapper`` hook counting queries and SQL time"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+
+
+def view_name(view_func, method: str) -> str:
+    """``module.ViewClass.action`` for class based views, else the function"""
+    view_class = getattr(view_func, "cls", None) or getattr(
+        view_func, "view_class", None
+    )
+    if view_class is None:
+        return f"{view_func.__module__}.{view_func.__name__}"
+
+    actions = getattr(view_func, "actions", None) or {}
+    action = actions.get(method.lower(), method.lower())
+    return f"{view_class.__module__}.{view_class.__name__}.{action}"
+
+
+def install_query_stats(stats: QueryStats) -> None:
+    connection.execute_wrappers.append(stats)
+
+
+def remove_query_stats(stats: QueryStats) -> None:
+    connection.execute_wrappers.remove(stats)
+
+
+@sync_and_async_middleware
+class QueryCountMiddleware:
+    """
+    Expose the number of SQL queries and the SQL time of every request.
+
+    Adds ``X-Query-Count``, ``X-Query-Time-Ms`` and ``X-View`` headers.
+    Meant for dev/test, enable it with ``QUERY_COUNT_HEADERS=True``.
+    Queries run while a streaming response is consumed are not included.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+
+        stats = QueryStats()
+        with connection.execute_wrapper(stats):
+            response = self.get_response(request)
+        return self.add_headers(request, response, stats)
+
+    async def __acall__(self, request):
+        stats = QueryStats()
+        # Async views query through sync_to_async, on the request's thread
+        # sensitive thread, whose connection is not this thread's.
+        await sync_to_async(install_query_stats)(stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(remove_query_stats)(stats)
+        return self.add_headers(request, response, stats)
+
+    @staticmethod
+    def add_headers(request, response, stats: QueryStats):
+        response["X-Query-Count"] = str(stats.count)
+        response["X-Query-Time-Ms"] = f"{stats.duration * 1000:.2f}"
+        # Read after the fact, a process_view hook would cost async
+        # requests a thread hop.
+        match = getattr(request, "resolver_match", None)
+        if match is not None:
+            response["X-View"] = view_name(match.func, request.method)
+        return response
@@ -0,0 +1,166 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class AsyncLimitOffsetPagination(LimitOffsetPagination):
+    """LimitOffsetPagination that can also page a queryset with the async ORM"""
+
+    async def apaginate_queryset(self, queryset, request) -> list | None:
+        self.request = request
+        self.limit = self.get_limit(request)
+        if self.limit is None:
+            return None
+
+        self.count = await queryset.acount()
+        self.offset = self.get_offset(request)
+        if self.count > self.limit and self.template is not None:
+            self.display_page_controls = True
+        if self.count == 0 or self.offset > self.count:
+            return []
+        return [
+            row async for row in queryset[self.offset:self.offset + self.limit]
+        ]
+
+
+class KeysetPagination(AsyncLimitOffsetPagination):
+    """
+    Limit/offset pages by default, keyset (cursor) pages on opt-in.
+
+    Sending ``?cursor=`` (empty for the first page) switches to keyset mode:
+    pages are fetched with ``WHERE (ordering) < (last row)`` instead of
+    ``OFFSET`` and without ``COUNT(*)``, so page N costs the same as page 1
+    as long as ``ordering`` is backed by an index.
+    """
+
+    ordering = ("-id",)
+    cursor_query_param = "cursor"
+    cursor_query_description = (
+        "Opt in to keyset pagination, leave empty for the first page "
+        "and then follow the `next` link."
+    )
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = queryset.order_by(*self.ordering)
+        self.keyset = self.cursor_query_param in request.query_params
+
+        if not self.keyset:
+            return super().paginate_queryset(queryset, request, view)
+
+        page = self.keyset_page(queryset, request)
+        return None if page is None else self.keyset_rows(list(page))
+
+    async def apaginate_queryset(self, queryset, request) -> list | None:
+        queryset = queryset.order_by(*self.ordering)
+        self.keyset = self.cursor_query_param in request.query_params
+
+        if not self.keyset:
+            return await super().apaginate_queryset(queryset, request)
+
+        page = self.keyset_page(queryset, request)
+        if page is None:
+            return None
+        return self.keyset_rows([row async for row in page])
+
+    def keyset_page(self, queryset, request):
+        """The rows after the cursor, one more than the limit to spot a next page"""
+        self.request = request
+        self.limit = self.get_limit(request)
+        if self.limit is None:
+            return None
+
+        cursor = request.query_params[self.cursor_query_param]
+        if cursor:
+            queryset = queryset.filter(
+                self.after(self.decode_cursor(cursor, queryset.model))
+            )
+        return queryset[:self.limit + 1]
+
+    def keyset_rows(self, rows: list) -> list:
+        self.has_next = len(rows) > self.limit
+        rows = rows[:self.limit]
+        self.last_row = rows[-1] if rows else None
+        return rows
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+
+        return Response({"next": self.get_next_link(), "results": data})
+
+    def get_next_link(self):
+        if not self.keyset:
+            return super().get_next_link()
+
+        if not self.has_next:
+            return None
+
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.limit_query_param, self.limit)
+        url = remove_query_param(url, self.offset_query_param)
+        return replace_query_param(
+            url, self.cursor_query_param, self.encode_cursor(self.last_row)
+        )
+
+    def get_schema_operation_parameters(self, view):
+        parameters = super().get_schema_operation_parameters(view)
+        parameters.append(
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": self.cursor_query_description,
+                "schema": {"type": "string"},
+            }
+        )
+        return parameters
+
+    def field_names(self) -> list[str]:
+        return [field.lstrip("-") for field in self.ordering]
+
+    def after(self, values: list) -> Q:
+        """Rows strictly after ``values`` in ``ordering``, lexicographically"""
+        condition = Q()
+        equal = Q()
+        for field, value in zip(self.ordering, values):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") else "gt"
+            condition |= equal & Q(**{f"{name}__{lookup}": value})
+            equal &= Q(**{name: value})
+
+        # Leading range on the first column lets the index bound the scan.
+        first = self.ordering[0]
+        lookup = "lte" if first.startswith("-") else "gte"
+        return Q(**{f"{first.lstrip('-')}__{lookup}": values[0]}) & condition
+
+    def encode_cursor(self, row) -> str:
+        values = []
+        for name in self.field_names():
+            value = row[name] if isinstance(row, dict) else getattr(row, name)
+            if isinstance(value, (date, datetime)):
+                value = value.isoformat()
+            elif isinstance(value, Decimal):
+                value = str(value)
+            values.append(value)
+        return urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+    def decode_cursor(self, cursor: str, model) -> list:
+        try:
+            values = json.loads(urlsafe_b64decode(cursor.encode()))
+            if len(values) != len(self.ordering):
+                raise ValueError
+            return [
+                model._meta.get_field(name).to_python(value)
+                for name, value in zip(self.field_names(), values)
+            ]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
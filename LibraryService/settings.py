@@ -36,6 +36,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "LibraryService.compression.CompressionMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -44,7 +45,30 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
-ROOT_URLCONF = "LibraryService.urls"
+# Per-request SQL query count/time response headers (dev/test only)
+QUERY_COUNT_HEADERS = config("QUERY_COUNT_HEADERS", default=DEBUG, cast=bool)
+QUERY_COUNT_MIDDLEWARE = "LibraryService.middleware.QueryCountMiddleware"
+
+if QUERY_COUNT_HEADERS:
+    MIDDLEWARE.insert(0, QUERY_COUNT_MIDDLEWARE)
+
+# Response compression, the first encoding of COMPRESSION_ENCODINGS the
+# client accepts wins. zstd and br need the zstandard / brotli packages.
+COMPRESSION_ENCODINGS = ("zstd", "br", "gzip")
+COMPRESSION_LEVELS = {
+    "zstd": config("COMPRESSION_ZSTD_LEVEL", default=3, cast=int),
+    "br": config("COMPRESSION_BROTLI_LEVEL", default=4, cast=int),
+    "gzip": config("COMPRESSION_GZIP_LEVEL", default=6, cast=int),
+}
+COMPRESSION_MIN_SIZE = config("COMPRESSION_MIN_SIZE", default=1024, cast=int)
+
+# The async read views under /api/async/ (LibraryService.async_urls) only
+# pay off behind an ASGI server, they stay off in the WSGI deployment.
+ASYNC_VIEWS = config("ASYNC_VIEWS", default=False, cast=bool)
+
+ROOT_URLCONF = (
+    "LibraryService.async_urls" if ASYNC_VIEWS else "LibraryService.urls"
+)
 
 TEMPLATES = [
     {
@@ -104,12 +128,17 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 REST_FRAMEWORK = {
     "DEFAULT_THROTTLE_CLASSES": [
-        "rest_framework.throttling.AnonRateThrottle",
-        "rest_framework.throttling.UserRateThrottle",
+        "LibraryService.throttling.AnonRateThrottle",
+        "LibraryService.throttling.UserRateThrottle",
     ],
-    "DEFAULT_THROTTLE_RATES": {"anon": "1800/day", "user": "18000/day"},
+    "DEFAULT_THROTTLE_RATES": {
+        "anon": "1800/day",
+        "user": "18000/day",
+        # Each return may open a Stripe checkout session.
+        "return_book": "30/hour",
+    },
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "user.authentication.CachedJWTAuthentication",
     ),
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.LimitOffsetPagination",
@@ -141,6 +170,13 @@ SPECTACULAR_SETTINGS = {
 STRIPE_PUBLISHABLE_KEY = config("STRIPE_PUBLISHABLE_KEY")
 STRIPE_SECRET_KEY = config("STRIPE_SECRET_KEY")
 STRIPE_API_VERSION = "2022-08-01"
+# Point it at a local stub in tests and load tests.
+STRIPE_API_BASE = config("STRIPE_API_BASE", default="https://api.stripe.com")
+# Signing secret of the checkout webhook endpoint (whsec_...), the webhook
+# answers 503 until it is set.
+STRIPE_WEBHOOK_SECRET = config("STRIPE_WEBHOOK_SECRET", default=None)
+# Parallel Stripe requests of the pending payments reconciliation.
+STRIPE_MAX_CONCURRENCY = config("STRIPE_MAX_CONCURRENCY", default=8, cast=int)
 
 # Celery, Redis settings
 CACHES = {
@@ -162,6 +198,11 @@ CELERY_LOG_LEVEL = "info"
 CELERY_TIMEZONE = "UTC"
 CELERY_TASK_TRACK_STARTED = True
 CELERY_TASK_TIME_LIMIT = 30 * 60
+# Seconds between two runs of the notification outbox drainer.
+OUTBOX_DRAIN_INTERVAL = config("OUTBOX_DRAIN_INTERVAL", default=5, cast=float)
 
 # Business logic settings
 FINE_COEFFICIENT = 2
+BORROWING_BATCH_MAX_SIZE = 50
+# Books a user may have borrowed at the same time, 0 for no limit.
+MAX_ACTIVE_LOANS = config("MAX_ACTIVE_LOANS", default=0, cast=int)
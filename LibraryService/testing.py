@@ -0,0 +1,85 @@
+import json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+from typing import Callable
+
+from django.conf import settings
+
+
+class QueryBudgetMixin:
+    """
+    Fail when an endpoint runs more SQL queries than its view declares.
+
+    Views declare ``query_budget = {"<action>": <max queries>}``. The budget
+    is checked at every size in ``budget_sizes``, so a query count that
+    grows with the number of rows (N+1) fails the test.
+    """
+
+    budget_sizes = (10, 100, 1000)
+
+    def assertWithinQueryBudget(
+        self,
+        url: str,
+        view_class,
+        action: str,
+        populate: Callable[[int], None],
+    ) -> None:
+        budget = view_class.query_budget[action]
+
+        for size in self.budget_sizes:
+            populate(size)
+            with self.modify_settings(
+                MIDDLEWARE={"prepend": settings.QUERY_COUNT_MIDDLEWARE}
+            ):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+
+            count = int(response["X-Query-Count"])
+            self.assertLessEqual(
+                count,
+                budget,
+                f"{response['X-View']} ran {count} queries with {size} rows, "
+                f"its budget is {budget}",
+            )
+
+
+class LocalHTTPStub:
+    """
+    A tiny HTTP server on localhost standing in for a third-party API.
+
+    ``handler(method, path, body)`` returns ``(status, json_payload)``.
+    Use it as a context manager, ``url`` points at the running server.
+    """
+
+    def __init__(self, handler: Callable[[str, str, bytes], tuple[int, dict]]):
+        stub = self
+
+        class RequestHandler(BaseHTTPRequestHandler):
+            def handle_request(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length)
+                stub.requests.append((self.command, self.path, body))
+                status, payload = handler(self.command, self.path, body)
+                content = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            do_GET = do_POST = do_DELETE = handle_request
+
+            def log_message(self, *args):
+                pass
+
+        self.requests = []
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), RequestHandler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def __enter__(self):
+        Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
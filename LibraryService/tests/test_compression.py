@@ -0,0 +1,124 @@
+import gzip
+import zlib
+from datetime import date, timedelta
+from decimal import Decimal
+from functools import partial
+from unittest.mock import patch
+
+from asgiref.sync import SyncToAsync
+from django.contrib.auth import get_user_model
+from django.core.handlers.asgi import ASGIHandler
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from LibraryService.compression import negotiate
+from LibraryService.exports import stream_rows
+from books_app.models import Book
+from borrowing_app.models import Borrowing
+
+User = get_user_model()
+BORROWING_URL = reverse("borrowing_app:borrowing-list")
+
+
+class CompressionTests(APITestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user(
+            email="staff@test.test", password="passwordQq1", is_staff=True
+        )
+        self.client.force_authenticate(user=self.staff)
+        book = Book.objects.create(
+            title="Test Book",
+            author="Author",
+            inventory=10,
+            daily_fee=Decimal("1.00"),
+        )
+        Borrowing.objects.bulk_create(
+            Borrowing(
+                user=self.staff,
+                book=book,
+                expected_return_date=date.today() + timedelta(days=7),
+            )
+            for _ in range(50)
+        )
+
+    def test_negotiation(self):
+        encodings = ["zstd", "br", "gzip"]
+        self.assertEqual(negotiate("gzip, br, zstd", encodings), "zstd")
+        self.assertEqual(negotiate("gzip;q=0.5, br", encodings), "br")
+        self.assertEqual(negotiate("*;q=0.1, gzip", ["br", "gzip"]), "gzip")
+        self.assertEqual(negotiate("*", ["br", "gzip"]), "br")
+        self.assertIsNone(negotiate("gzip;q=0, identity", ["gzip"]))
+        self.assertIsNone(negotiate("", encodings))
+
+    def test_large_page_is_compressed(self):
+        plain = self.client.get(BORROWING_URL, {"expand": "book"})
+        response = self.client.get(
+            BORROWING_URL, {"expand": "book"}, HTTP_ACCEPT_ENCODING="gzip"
+        )
+
+        self.assertNotIn("Content-Encoding", plain)
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response["Vary"])
+        self.assertEqual(int(response["Content-Length"]), len(response.content))
+        self.assertLess(len(response.content), len(plain.content) / 5)
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+
+    def test_small_body_is_not_compressed(self):
+        borrowing = Borrowing.objects.first()
+        response = self.client.get(
+            f"{BORROWING_URL}{borrowing.id}/", HTTP_ACCEPT_ENCODING="gzip"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn("Content-Encoding", response)
+
+    def test_streaming_export_is_compressed_per_chunk(self):
+        url = reverse("borrowing_app:borrowing-export")
+        plain = b"".join(self.client.get(url).streaming_content)
+        with patch(
+            "LibraryService.exports.stream_rows",
+            partial(stream_rows, chunk_size=10),
+        ):
+            response = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip")
+            chunks = list(response.streaming_content)
+
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertGreater(len(chunks), 5)
+        self.assertEqual(gzip.decompress(b"".join(chunks)), plain)
+        # Every chunk is flushed, so each one decompresses on arrival.
+        decompressor = zlib.decompressobj(31)
+        self.assertTrue(decompressor.decompress(chunks[0]))
+
+    def test_levels_are_configurable(self):
+        with self.settings(COMPRESSION_LEVELS={"gzip": 1}):
+            fast = self.client.get(BORROWING_URL, HTTP_ACCEPT_ENCODING="gzip")
+        with self.settings(COMPRESSION_LEVELS={"gzip": 9}):
+            best = self.client.get(BORROWING_URL, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertLess(len(best.content), len(fast.content))
+        self.assertEqual(
+            gzip.decompress(best.content), gzip.decompress(fast.content)
+        )
+
+    def test_asgi_chain_stays_async(self):
+        self.assertNotIsInstance(ASGIHandler()._middleware_chain, SyncToAsync)
+
+    @override_settings(ROOT_URLCONF="LibraryService.async_urls")
+    async def test_async_responses_are_compressed(self):
+        url = reverse("async-book-list")
+        await Book.objects.abulk_create(
+            Book(
+                title=f"Book {number}",
+                author="Author",
+                inventory=1,
+                daily_fee=Decimal("1.00"),
+            )
+            for number in range(30)
+        )
+        plain = await self.async_client.get(url)
+        response = await self.async_client.get(
+            url, headers={"accept-encoding": "gzip"}
+        )
+
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(response.content), plain.content)
@@ -0,0 +1,53 @@
+from decimal import Decimal
+
+from asgiref.sync import SyncToAsync
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from books_app.models import Book
+
+
+class QueryCountMiddlewareTests(TestCase):
+    def setUp(self):
+        self.book = Book.objects.create(
+            title="Test Book",
+            author="Author",
+            inventory=10,
+            daily_fee=Decimal("1.00"),
+        )
+
+    def test_sync_requests_are_counted(self):
+        with self.modify_settings(
+            MIDDLEWARE={"prepend": settings.QUERY_COUNT_MIDDLEWARE}
+        ):
+            response = self.client.get(
+                reverse("books_app:book-detail", args=[self.book.id])
+            )
+
+        self.assertGreater(int(response["X-Query-Count"]), 0)
+        self.assertEqual(
+            response["X-View"], "books_app.views.BookViewSet.retrieve"
+        )
+
+    def test_asgi_chain_stays_async(self):
+        with self.settings(MIDDLEWARE=[settings.QUERY_COUNT_MIDDLEWARE]):
+            handler = ASGIHandler()
+        self.assertNotIsInstance(handler._middleware_chain, SyncToAsync)
+
+    @override_settings(ROOT_URLCONF="LibraryService.async_urls")
+    async def test_async_requests_are_counted(self):
+        with self.modify_settings(
+            MIDDLEWARE={"prepend": settings.QUERY_COUNT_MIDDLEWARE}
+        ):
+            response = await self.async_client.get(
+                reverse("async-book-detail", args=[self.book.id])
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(int(response["X-Query-Count"]), 0)
+        self.assertEqual(
+            response["X-View"],
+            "books_app.async_views.AsyncBookDetailView.get",
+        )
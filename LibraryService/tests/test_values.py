@@ -0,0 +1,101 @@
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+
+from LibraryService.values import ValuesPlan
+from books_app.models import Book
+from borrowing_app.models import Borrowing
+from borrowing_app.serializers import BorrowingListSerializer
+from borrowing_app.views import select_fieldset
+from payment_app.models import Payment
+from payment_app.serializers import PaymentListSerializer, PaymentSerializer
+
+User = get_user_model()
+
+
+class ValuesPlanTests(TestCase):
+    """The .values() read path against the DRF serializers it replaces"""
+
+    def setUp(self):
+        user = User.objects.create_user(
+            email="test@test.test", password="passwordQq1"
+        )
+        book = Book.objects.create(
+            title="Test Book",
+            author="Author",
+            cover=Book.CoverType.SOFT,
+            inventory=10,
+            daily_fee=Decimal("1.5"),
+        )
+        borrowings = [
+            Borrowing.objects.create(
+                user=user,
+                book=book,
+                expected_return_date=date.today() + timedelta(days=days),
+            )
+            for days in range(4)
+        ]
+        Borrowing.objects.filter(pk=borrowings[1].pk).update(
+            actual_return_date=date.today()
+        )
+        Payment.objects.create(borrowing=borrowings[1], money_to_pay="3")
+        Payment.objects.create(
+            borrowing=borrowings[2],
+            status=Payment.Status.PAID,
+            type=Payment.Type.FINE,
+            money_to_pay="0.10",
+            session_id="cs_test",
+            session_url="https://checkout.stripe.com/cs_test",
+            session_expires_at=datetime(2026, 1, 1, 12, tzinfo=timezone.utc),
+        )
+
+    def assertSameData(self, serializer_class, queryset, **kwargs):
+        plan = ValuesPlan(serializer_class(**kwargs))
+        queryset = queryset.order_by("id")
+        self.assertEqual(
+            JSONRenderer().render(
+                plan.to_representation(plan.values(queryset))
+            ),
+            JSONRenderer().render(
+                serializer_class(queryset, many=True, **kwargs).data
+            ),
+        )
+
+    def test_borrowings_match(self):
+        for fields, expand in (
+            (None, {}),
+            (None, {"book": {}, "user": {}, "payment": {}}),
+            (["id", "payment"], {"payment": {}}),
+            (["expected_return_date", "actual_return_date"], {}),
+        ):
+            with self.subTest(fields=fields, expand=expand):
+                self.assertSameData(
+                    BorrowingListSerializer,
+                    select_fieldset(Borrowing.objects.all(), fields, expand),
+                    fields=fields,
+                    expand=expand,
+                )
+
+    def test_payments_match(self):
+        expanded = {"borrowing": {"book": {}, "user": {}}}
+        for serializer_class in (PaymentSerializer, PaymentListSerializer):
+            for expand in ({}, expanded):
+                with self.subTest(serializer_class=serializer_class):
+                    self.assertSameData(
+                        serializer_class, Payment.objects.all(), expand=expand
+                    )
+
+    def test_instance_fields_are_rejected(self):
+        class MethodSerializer(serializers.ModelSerializer):
+            title = serializers.SerializerMethodField()
+
+            class Meta:
+                model = Book
+                fields = ("id", "title")
+
+        with self.assertRaises(TypeError):
+            ValuesPlan(MethodSerializer())
@@ -0,0 +1,133 @@
+"""
+Sliding window rate throttles counted in Redis.
+
+DRF's throttles keep a list of every request timestamp per client in the
+cache and read and rewrite it on each request, racing with other workers.
+These count requests of the current and the previous fixed window in two
+integer keys instead. A Lua script estimates the sliding window as the
+current count plus the previous one weighted by how much of it still
+overlaps the window, and records the request, atomically and in a single
+round trip. Other cache backends fall back to DRF's implementation.
+"""
+
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.core.cache.backends.redis import RedisCache
+from rest_framework import throttling
+
+SLIDING_WINDOW_SCRIPT = """
+local limit = tonumber(ARGV[1])
+local current = tonumber(redis.call("GET", KEYS[1]) or "0")
+local previous = tonumber(redis.call("GET", KEYS[2]) or "0")
+if previous * tonumber(ARGV[2]) + current >= limit then
+    return {0, current, previous}
+end
+current = redis.call("INCR", KEYS[1])
+if current == 1 then
+    redis.call("EXPIRE", KEYS[1], ARGV[3])
+end
+return {1, current, previous}
+"""
+
+_script = None
+
+
+def _sliding_window_script(client):
+    # Calls EVALSHA, loading the script when Redis doesn't know it yet.
+    global _script
+    if _script is None:
+        _script = client.register_script(SLIDING_WINDOW_SCRIPT)
+    return _script
+
+
+def reset_throttle(scope: str, ident) -> None:
+    """Forget the requests ``ident`` made in ``scope``, e.g. "user" or a pk"""
+    backend = caches[DEFAULT_CACHE_ALIAS]
+    key = throttling.SimpleRateThrottle.cache_format % {
+        "scope": scope,
+        "ident": ident,
+    }
+    if not isinstance(backend, RedisCache):
+        backend.delete(key)
+        return
+    # One counter per window.
+    client = backend._cache.get_client(write=True)
+    keys = list(client.scan_iter(backend.make_key(f"{key}:*")))
+    if keys:
+        client.delete(*keys)
+
+
+class SlidingWindowMixin:
+    """
+    Put before a DRF ``SimpleRateThrottle`` to count its requests in Redis.
+
+    Keeps the throttle's scope, rate and cache key, only the counting
+    changes. The estimate assumes the previous window's requests were
+    spread evenly, so a burst at its very end is forgiven a little early.
+    """
+
+    def allow_request(self, request, view) -> bool:
+        backend = self.get_backend()
+        if self.rate is None or not isinstance(backend, RedisCache):
+            return super().allow_request(request, view)
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        self.now = self.timer()
+        window, self.elapsed = divmod(self.now, self.duration)
+        keys = [
+            backend.make_and_validate_key(f"{self.key}:{int(number)}")
+            for number in (window, window - 1)
+        ]
+        client = backend._cache.get_client(keys[0], write=True)
+        allowed, *self.counts = _sliding_window_script(client)(
+            keys=keys,
+            args=[
+                self.num_requests,
+                repr(1 - self.elapsed / self.duration),
+                # The counter is still read as the previous window.
+                2 * self.duration,
+            ],
+            client=client,
+        )
+        return bool(allowed)
+
+    def get_backend(self):
+        # DRF's throttles hold the default cache through its thread proxy.
+        if self.cache is throttling.default_cache:
+            return caches[DEFAULT_CACHE_ALIAS]
+        return self.cache
+
+    def wait(self) -> float | None:
+        if not hasattr(self, "counts"):
+            return super().wait()
+
+        current, previous = self.counts
+        remaining = self.duration - self.elapsed
+        if current >= self.num_requests or not previous:
+            return remaining
+        # The previous window's share shrinks until a request fits.
+        overlap = 1 - (self.num_requests - 1 - current) / previous
+        return min(max(self.duration * overlap - self.elapsed, 0), remaining)
+
+
+class AnonRateThrottle(SlidingWindowMixin, throttling.AnonRateThrottle):
+    pass
+
+
+class UserRateThrottle(SlidingWindowMixin, throttling.UserRateThrottle):
+    pass
+
+
+class ScopedRateThrottle(SlidingWindowMixin, throttling.ScopedRateThrottle):
+    """Per-view limits, set ``throttle_scope`` and its rate in settings"""
+
+    def allow_request(self, request, view) -> bool:
+        # DRF only learns the rate from the view, when the request comes.
+        self.scope = getattr(view, self.scope_attr, None)
+        if not self.scope:
+            return True
+        self.rate = self.get_rate()
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        return super().allow_request(request, view)
@@ -0,0 +1,157 @@
+"""
+A ``.values()`` read path for ModelSerializers.
+
+DRF builds a model instance per row and walks every serializer field,
+attribute lookups and ``to_representation`` included. ``ValuesPlan``
+compiles the shape of an instantiated serializer once: the ``.values()``
+lookups it needs, nested serializers joined through ``__`` lookups, and a
+generated function turning a flat row into the same dict. Fields whose
+representation needs the model instance (``SerializerMethodField``,
+``source="*"``, many-related fields) are rejected when compiling.
+"""
+
+from datetime import date
+
+from django.db.models import QuerySet
+from rest_framework import serializers
+from rest_framework.settings import ISO_8601, api_settings
+
+# Need the instance, or a queryset per row.
+INSTANCE_FIELDS = (
+    serializers.ListSerializer,
+    serializers.ManyRelatedField,
+    serializers.SerializerMethodField,
+)
+# The database already returns these in their representation's type.
+PASS_THROUGH_FIELDS = (
+    serializers.BooleanField,
+    serializers.CharField,
+    serializers.ChoiceField,
+    serializers.IntegerField,
+    serializers.PrimaryKeyRelatedField,
+)
+
+
+def _converter(field: serializers.Field):
+    """``None`` when the value is its own representation"""
+    if isinstance(field, serializers.PrimaryKeyRelatedField):
+        return None if field.pk_field is None else field.to_representation
+    if isinstance(field, PASS_THROUGH_FIELDS):
+        return None
+    if type(field) is serializers.DateField:
+        output_format = getattr(field, "format", api_settings.DATE_FORMAT)
+        if output_format is not None and output_format.lower() == ISO_8601:
+            return date.isoformat
+    return field.to_representation
+
+
+class ValuesPlan:
+    """
+    The ``.values()`` lookups and row transform of a serializer instance.
+
+    Compile from the instance a view would use, after ``fields`` and
+    ``expand`` are applied, so only what is rendered is selected.
+    """
+
+    def __init__(self, serializer: serializers.Serializer):
+        if isinstance(serializer, serializers.ListSerializer):
+            serializer = serializer.child
+        self.lookups: list[str] = []
+        self.converters: dict[str, object] = {}
+        source = self._compile(serializer, "", 1)
+        namespace = dict(self.converters)
+        exec(f"def transform(row):\n    return {source}\n", namespace)
+        self.transform = namespace["transform"]
+
+    def _lookup(self, lookup: str) -> str:
+        if lookup not in self.lookups:
+            self.lookups.append(lookup)
+        return f"row[{lookup!r}]"
+
+    def _compile(
+        self, serializer: serializers.Serializer, prefix: str, depth: int
+    ) -> str:
+        items = []
+        for field in serializer._readable_fields:
+            if isinstance(field, INSTANCE_FIELDS) or field.source == "*":
+                raise TypeError(
+                    f"{type(serializer).__name__}.{field.field_name} can't "
+                    "be read from .values() rows"
+                )
+            lookup = prefix + "__".join(field.source_attrs)
+
+            if isinstance(field, serializers.BaseSerializer):
+                pk = field.Meta.model._meta.pk.name
+                nested = self._compile(field, f"{lookup}__", depth + 1)
+                # Every column is NULL when the relation is missing.
+                value = (
+                    f"None if {self._lookup(f'{lookup}__{pk}')} is None "
+                    f"else {nested}"
+                )
+            else:
+                converter = _converter(field)
+                value = self._lookup(lookup)
+                if converter is not None:
+                    name = f"convert_{len(self.converters)}"
+                    self.converters[name] = converter
+                    value = f"None if {value} is None else {name}({value})"
+            items.append(f"{field.field_name!r}: ({value})")
+
+        indent = "\n" + "    " * (depth + 1)
+        closing = "\n" + "    " * depth
+        return "{" + indent + ("," + indent).join(items) + closing + "}"
+
+    def values(self, queryset: QuerySet, *extra: str) -> QuerySet:
+        """``queryset`` as rows, ``extra`` lookups kept for e.g. a cursor"""
+        extra = [name for name in extra if name not in self.lookups]
+        return queryset.values(*self.lookups, *extra)
+
+    def to_representation(self, rows) -> list[dict]:
+        return list(map(self.transform, rows))
+
+
+class ValuesSerializer:
+    """The read-only ``data`` of a ``ValuesPlan`` over rows, or one row"""
+
+    def __init__(self, plan: ValuesPlan, instance, many: bool = False):
+        self.plan = plan
+        self.instance = instance
+        self.many = many
+
+    @property
+    def data(self):
+        if self.many:
+            return self.plan.to_representation(self.instance)
+        return self.plan.transform(self.instance)
+
+
+class ValuesViewMixin:
+    """
+    Serve the list and retrieve actions from ``.values()`` rows.
+
+    Drop in before a viewset whose serializers for those actions are plain
+    ModelSerializers. The plan is compiled from the serializer the view
+    would have used, so responses stay the same.
+    """
+
+    values_actions = ("list", "retrieve")
+
+    def get_values_plan(self) -> ValuesPlan:
+        if not hasattr(self, "_values_plan"):
+            self._values_plan = ValuesPlan(super().get_serializer())
+        return self._values_plan
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.action not in self.values_actions:
+            return queryset
+        # Keyset cursors are built from the ordering columns of the last row.
+        field_names = getattr(self.paginator, "field_names", list)
+        return self.get_values_plan().values(queryset, *field_names())
+
+    def get_serializer(self, *args, **kwargs):
+        if self.action not in self.values_actions or not args:
+            return super().get_serializer(*args, **kwargs)
+        return ValuesSerializer(
+            self.get_values_plan(), args[0], many=kwargs.get("many", False)
+        )
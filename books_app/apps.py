@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class BooksAppConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "books_app"
+
+    def ready(self):
+        from books_app import signals  # noqa: F401
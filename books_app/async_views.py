@@ -0,0 +1,58 @@
+from asgiref.sync import sync_to_async
+
+from LibraryService.async_views import AsyncAPIView, not_found
+from LibraryService.conditional import aconditional_response
+from LibraryService.pagination import AsyncLimitOffsetPagination
+from books_app.cache import acached_catalog_data, catalog_version
+from books_app.models import Book
+from books_app.search import search_books
+from books_app.serializers import BookListSerializer, BookSerializer
+
+
+class AsyncCatalogView(AsyncAPIView):
+    async def conditional(self, request, key, render):
+        """Serve ``key`` from the catalog cache, with ETag and 304s"""
+
+        async def respond():
+            return self.render(await acached_catalog_data(key, render))
+
+        return await aconditional_response(
+            request, [await sync_to_async(catalog_version)()], respond
+        )
+
+
+class AsyncBookListView(AsyncCatalogView):
+    """Async twin of ``BookViewSet.list``, sharing its catalog cache"""
+
+    async def get(self, request):
+        async def render():
+            queryset = Book.objects.all()
+            search = request.query_params.get("search")
+            if search:
+                queryset = search_books(queryset, search)
+
+            paginator = AsyncLimitOffsetPagination()
+            page = await paginator.apaginate_queryset(queryset, request)
+            if page is None:
+                return BookListSerializer(
+                    [book async for book in queryset], many=True
+                ).data
+            data = BookListSerializer(page, many=True).data
+            return paginator.get_paginated_response(data).data
+
+        return await self.conditional(
+            request, f"list:{request.build_absolute_uri()}", render
+        )
+
+
+class AsyncBookDetailView(AsyncCatalogView):
+    """Async twin of ``BookViewSet.retrieve``, sharing its cached entries"""
+
+    async def get(self, request, pk):
+        async def render():
+            book = await Book.objects.filter(pk=pk).afirst()
+            if book is None:
+                raise not_found(Book)
+            return BookSerializer(book).data
+
+        return await self.conditional(request, f"detail:{pk}", render)
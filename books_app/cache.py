@@ -0,0 +1,84 @@
+import hashlib
+from typing import Awaitable, Callable
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from rest_framework.response import Response
+
+from LibraryService.conditional import get_versions, invalidate_versions
+
+CATALOG_CACHE_TIMEOUT = 60 * 60
+CATALOG_VERSION_KEY = "books:catalog:version"
+CATALOG_HITS_KEY = "books:catalog:hits"
+CATALOG_MISSES_KEY = "books:catalog:misses"
+
+
+def catalog_version() -> int:
+    return get_versions([CATALOG_VERSION_KEY])[0]
+
+
+def invalidate_catalog() -> None:
+    """Drop every cached catalog page, now and once the transaction commits"""
+    invalidate_versions([CATALOG_VERSION_KEY])
+
+
+def _count(key: str) -> None:
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, timeout=None)
+        cache.incr(key)
+
+
+def catalog_cache_stats() -> dict:
+    stats = cache.get_many([CATALOG_HITS_KEY, CATALOG_MISSES_KEY])
+    hits = stats.get(CATALOG_HITS_KEY, 0)
+    misses = stats.get(CATALOG_MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": round(hits / total, 4) if total else None,
+    }
+
+
+def _cache_key(key: str, version: int) -> str:
+    digest = hashlib.md5(key.encode()).hexdigest()
+    return f"books:catalog:{version}:{digest}"
+
+
+def cached_catalog_response(
+    key: str, render: Callable[[], Response]
+) -> Response:
+    """Serve ``key`` from the cache or render it and store the data"""
+    # Read the version before the database so a concurrent write can only
+    # leave stale data under a version that is already outdated.
+    cache_key = _cache_key(key, catalog_version())
+
+    data = cache.get(cache_key)
+    if data is not None:
+        _count(CATALOG_HITS_KEY)
+        return Response(data)
+
+    _count(CATALOG_MISSES_KEY)
+    response = render()
+    if response.status_code == 200:
+        cache.set(cache_key, response.data, CATALOG_CACHE_TIMEOUT)
+    return response
+
+
+async def acached_catalog_data(
+    key: str, render: Callable[[], Awaitable[dict]]
+) -> dict:
+    """``cached_catalog_response`` for async views, ``render`` returns data"""
+    cache_key = _cache_key(key, await sync_to_async(catalog_version)())
+
+    data = await cache.aget(cache_key)
+    if data is not None:
+        await sync_to_async(_count)(CATALOG_HITS_KEY)
+        return data
+
+    await sync_to_async(_count)(CATALOG_MISSES_KEY)
+    data = await render()
+    await cache.aset(cache_key, data, CATALOG_CACHE_TIMEOUT)
+    return data
@@ -0,0 +1,138 @@
+import csv
+import json
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, Iterator
+
+from django.db import transaction
+from rest_framework import serializers
+
+from books_app.cache import invalidate_catalog
+from books_app.models import Book
+
+FILE_FORMATS = ("csv", "jsonl")
+UNIQUE_FIELDS = ("title", "author", "cover")
+UPDATE_FIELDS = ("inventory", "daily_fee")
+
+
+class BookImportSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Book
+        fields = UNIQUE_FIELDS + UPDATE_FIELDS
+        # Existing editions are not an error here, the upsert updates them.
+        validators = []
+
+
+@dataclass
+class ImportReport:
+    processed: int = 0
+    imported: int = 0
+    failed: int = 0
+    errors: list[dict] = field(default_factory=list)
+    max_errors: int = 100
+
+    def add_error(self, line: int, errors) -> None:
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"line": line, "errors": errors})
+
+    def as_dict(self) -> dict:
+        return {
+            "processed": self.processed,
+            "imported": self.imported,
+            "failed": self.failed,
+            "errors": self.errors,
+        }
+
+
+def detect_file_format(name: str | None) -> str | None:
+    """Guess the format from a file name or a content type"""
+    name = (name or "").lower()
+    if name.endswith("csv"):
+        return "csv"
+    if name.endswith(("jsonl", "ndjson", "json-lines", "json-seq")):
+        return "jsonl"
+    return None
+
+
+def read_rows(
+    lines: Iterable[str], file_format: str
+) -> Iterator[tuple[int, dict | None, str | None]]:
+    """Yield ``(line number, row, parse error)`` one line at a time"""
+    if file_format == "csv":
+        reader = csv.DictReader(lines)
+        for row in reader:
+            yield reader.line_num, row, None
+        return
+
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as error:
+            yield line_number, None, f"Invalid JSON: {error}"
+            continue
+        if not isinstance(row, dict):
+            yield line_number, None, "Expected a JSON object"
+            continue
+        yield line_number, row, None
+
+
+def _upsert(chunk: dict[tuple, Book]) -> None:
+    with transaction.atomic():
+        Book.objects.bulk_create(
+            chunk.values(),
+            update_conflicts=True,
+            unique_fields=UNIQUE_FIELDS,
+            update_fields=UPDATE_FIELDS,
+        )
+        invalidate_catalog()
+
+
+def import_books(
+    lines: Iterable[str],
+    file_format: str,
+    chunk_size: int = 1000,
+    on_progress: Callable[[ImportReport], None] | None = None,
+) -> ImportReport:
+    """
+    Upsert books from CSV or JSON Lines into the catalog.
+
+    Rows are validated one by one and written in chunks with
+    ``INSERT ... ON CONFLICT (title, author, cover) DO UPDATE``, so memory
+    use depends on ``chunk_size`` only, not on the size of the input.
+    """
+    report = ImportReport()
+    # Building serializer fields is the expensive part, do it once.
+    serializer = BookImportSerializer()
+    # Keyed by edition: one statement must not upsert the same row twice.
+    chunk: dict[tuple, Book] = {}
+
+    for line, row, parse_error in read_rows(lines, file_format):
+        report.processed += 1
+        if parse_error:
+            report.add_error(line, parse_error)
+            continue
+
+        try:
+            book = Book(**serializer.run_validation(row))
+        except serializers.ValidationError as error:
+            report.add_error(line, error.detail)
+            continue
+
+        chunk[tuple(getattr(book, name) for name in UNIQUE_FIELDS)] = book
+
+        if len(chunk) >= chunk_size:
+            _upsert(chunk)
+            report.imported += len(chunk)
+            chunk = {}
+            if on_progress:
+                on_progress(report)
+
+    if chunk:
+        _upsert(chunk)
+        report.imported += len(chunk)
+    if on_progress:
+        on_progress(report)
+
+    return report
@@ -0,0 +1,95 @@
+import random
+import time
+from statistics import median
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Q
+
+from books_app.models import Book
+from books_app.search import search_books
+
+WORDS = (
+    "kobzar", "shadow", "garden", "winter", "stone", "river", "empire",
+    "night", "secret", "island", "letters", "forest", "glass", "machine",
+    "silence", "harbor", "mirror", "journey", "ashes", "crown",
+)
+AUTHORS = (
+    "Taras Shevchenko", "Lesya Ukrainka", "Ivan Franko", "J.K. Rowling",
+    "Mykola Gogol", "Serhiy Zhadan", "Andrey Kurkov", "Ursula Le Guin",
+)
+
+
+class Command(BaseCommand):
+    """Compare the full-text index against icontains scans on the book table"""
+
+    help = "Benchmark ?search= on books: full-text index vs icontains."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "terms",
+            nargs="*",
+            default=["shadow", "garden river", "franko"],
+            help="Search terms to benchmark.",
+        )
+        parser.add_argument(
+            "--seed-books",
+            type=int,
+            default=0,
+            help="Insert this many synthetic books before benchmarking.",
+        )
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--page-size", type=int, default=50)
+
+    def handle(self, *args, **options):
+        if options["seed_books"]:
+            self.seed_books(options["seed_books"])
+
+        self.stdout.write(
+            f"Database: {connection.vendor}, books: {Book.objects.count()}"
+        )
+        for term in options["terms"]:
+            indexed = self.measure(
+                lambda: search_books(Book.objects.all(), term),
+                options["repeat"],
+                options["page_size"],
+            )
+            scanned = self.measure(
+                lambda: Book.objects.filter(
+                    Q(title__icontains=term) | Q(author__icontains=term)
+                ),
+                options["repeat"],
+                options["page_size"],
+            )
+            self.stdout.write(
+                f"{term!r}: index {indexed:.2f} ms, "
+                f"icontains {scanned:.2f} ms (median of {options['repeat']})"
+            )
+
+    @staticmethod
+    def measure(make_queryset, repeat: int, page_size: int) -> float:
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            queryset = make_queryset()
+            queryset.count()
+            list(queryset[:page_size])
+            timings.append((time.perf_counter() - started) * 1000)
+        return median(timings)
+
+    def seed_books(self, count: int, chunk_size: int = 5000) -> None:
+        rng = random.Random(count)
+        created = 0
+        while created < count:
+            size = min(chunk_size, count - created)
+            Book.objects.bulk_create(
+                Book(
+                    title=" ".join(rng.sample(WORDS, 3)).title(),
+                    author=rng.choice(AUTHORS),
+                    inventory=rng.randint(0, 50),
+                    daily_fee=f"{rng.randint(10, 500) / 100:.2f}",
+                )
+                for _ in range(size)
+            )
+            created += size
+        self.stdout.write(self.style.SUCCESS(f"Seeded {count} books"))
@@ -0,0 +1,95 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection, transaction
+
+from books_app.models import Book
+
+
+def conditional_update(book_id: int) -> bool:
+    return Book.objects.checkout(book_id)
+
+
+def select_for_update(book_id: int) -> bool:
+    with transaction.atomic():
+        book = Book.objects.select_for_update().get(pk=book_id)
+        if book.inventory <= 0:
+            return False
+        book.inventory -= 1
+        book.save(update_fields=["inventory"])
+        return True
+
+
+STRATEGIES = {
+    "conditional-update": conditional_update,
+    "select-for-update": select_for_update,
+}
+
+
+class Command(BaseCommand):
+    """Hammer one book with concurrent checkouts using each strategy"""
+
+    help = (
+        "Benchmark concurrent checkouts: conditional UPDATE vs "
+        "select_for_update. Needs Postgres or a file based SQLite database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=16)
+        parser.add_argument("--checkouts", type=int, default=2000)
+        parser.add_argument(
+            "--inventory",
+            type=int,
+            default=None,
+            help="Initial inventory, defaults to 3/4 of --checkouts.",
+        )
+
+    def handle(self, *args, **options):
+        inventory = options["inventory"]
+        if inventory is None:
+            inventory = options["checkouts"] * 3 // 4
+
+        self.stdout.write(
+            f"Database: {connection.vendor}, threads: {options['threads']}, "
+            f"checkouts: {options['checkouts']}, inventory: {inventory}"
+        )
+        for name, strategy in STRATEGIES.items():
+            self.run(name, strategy, inventory, options)
+
+    def run(self, name, strategy, inventory, options) -> None:
+        book = Book.objects.create(
+            title=f"Benchmark {name}",
+            author="Benchmark",
+            inventory=inventory,
+            daily_fee="1.00",
+        )
+
+        def attempt(_):
+            try:
+                return strategy(book.id)
+            except OperationalError:
+                # Lock timeouts / serialization failures under contention.
+                return None
+            finally:
+                connection.close()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options["threads"]) as pool:
+            results = list(pool.map(attempt, range(options["checkouts"])))
+        elapsed = time.perf_counter() - started
+
+        book.refresh_from_db()
+        granted = results.count(True)
+        failed = results.count(None)
+        exact = granted + book.inventory == inventory
+        style = self.style.SUCCESS if exact else self.style.ERROR
+        self.stdout.write(
+            style(
+                f"{name}: {options['checkouts'] / elapsed:.0f} checkouts/s, "
+                f"granted {granted}, left {book.inventory}, "
+                f"failed {failed}, "
+                f"{'exact' if exact else 'INCONSISTENT'}"
+            )
+        )
+        book.delete()
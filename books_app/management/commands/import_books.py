@@ -0,0 +1,62 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from books_app.importers import (
+    FILE_FORMATS,
+    ImportReport,
+    detect_file_format,
+    import_books,
+)
+
+
+class Command(BaseCommand):
+    """Stream a CSV or JSON Lines catalog feed into the books table"""
+
+    help = (
+        "Upsert books from a CSV or JSON Lines file (use - for stdin). "
+        "Rows are matched on title, author and cover."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument(
+            "--format",
+            choices=FILE_FORMATS,
+            help="Input format, guessed from the file extension by default.",
+        )
+        parser.add_argument("--chunk-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        file_format = options["format"] or detect_file_format(path)
+        if file_format is None:
+            raise CommandError(
+                "Cannot guess the input format, pass --format csv or jsonl."
+            )
+
+        if path == "-":
+            report = self.run(sys.stdin, file_format, options["chunk_size"])
+        else:
+            with open(path, newline="", encoding="utf-8") as lines:
+                report = self.run(lines, file_format, options["chunk_size"])
+
+        for error in report.errors:
+            self.stderr.write(f"Line {error['line']}: {error['errors']}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Done: {report.imported} imported, {report.failed} failed, "
+                f"{report.processed} rows processed."
+            )
+        )
+
+    def run(self, lines, file_format: str, chunk_size: int) -> ImportReport:
+        return import_books(
+            lines,
+            file_format,
+            chunk_size=chunk_size,
+            on_progress=lambda report: self.stdout.write(
+                f"{report.processed} rows processed, "
+                f"{report.imported} imported, {report.failed} failed"
+            ),
+        )
@@ -0,0 +1,51 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.db import migrations
+
+from books_app.search import (
+    SQLITE_FTS_TABLE,
+    book_search_vector,
+    install_sqlite_fts_triggers,
+)
+
+POSTGRES_INDEX_NAME = "book_search_vector_idx"
+
+
+def create_search_index(apps, schema_editor):
+    Book = apps.get_model("books_app", "Book")
+    vendor = schema_editor.connection.vendor
+
+    if vendor == "postgresql":
+        schema_editor.add_index(
+            Book, GinIndex(book_search_vector(), name=POSTGRES_INDEX_NAME)
+        )
+    elif vendor == "sqlite":
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {SQLITE_FTS_TABLE} "
+            f"USING fts5(title, author, content='books_app_book', "
+            f"content_rowid='id')"
+        )
+        install_sqlite_fts_triggers(schema_editor)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+
+    if vendor == "postgresql":
+        schema_editor.execute(f"DROP INDEX IF EXISTS {POSTGRES_INDEX_NAME}")
+    elif vendor == "sqlite":
+        for suffix in ("ai", "ad", "au"):
+            schema_editor.execute(
+                f"DROP TRIGGER IF EXISTS {SQLITE_FTS_TABLE}_{suffix}"
+            )
+        schema_editor.execute(f"DROP TABLE IF EXISTS {SQLITE_FTS_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("books_app", "0002_alter_book_inventory"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
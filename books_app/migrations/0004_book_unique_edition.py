@@ -0,0 +1,65 @@
+# Generated by Django 5.0.6 on 2026-10-18 01:51
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+from books_app.search import install_sqlite_fts_triggers
+
+
+def merge_duplicate_editions(apps, schema_editor):
+    """Fold copies of an edition into its oldest row before it is unique"""
+    Book = apps.get_model("books_app", "Book")
+    Borrowing = apps.get_model("borrowing_app", "Borrowing")
+
+    editions = (
+        Book.objects.values("title", "author", "cover")
+        .annotate(rows=Count("id"), keep=Min("id"), total=Sum("inventory"))
+        .filter(rows__gt=1)
+    )
+    for edition in editions:
+        copies = Book.objects.filter(
+            title=edition["title"],
+            author=edition["author"],
+            cover=edition["cover"],
+        ).exclude(pk=edition["keep"])
+        Borrowing.objects.filter(book__in=copies).update(book=edition["keep"])
+        Book.objects.filter(pk=edition["keep"]).update(
+            inventory=edition["total"]
+        )
+        copies.delete()
+
+    # PostgreSQL won't alter a table with deferred foreign key checks
+    # still pending from the deletes.
+    schema_editor.connection.check_constraints()
+
+
+def reinstall_sqlite_fts_triggers(apps, schema_editor):
+    # Adding the constraint remakes the table on SQLite, dropping triggers.
+    if schema_editor.connection.vendor == "sqlite":
+        install_sqlite_fts_triggers(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("books_app", "0003_book_search_index"),
+        ("borrowing_app", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_editions, migrations.RunPython.noop
+        ),
+        migrations.RunPython(
+            migrations.RunPython.noop, reinstall_sqlite_fts_triggers
+        ),
+        migrations.AddConstraint(
+            model_name="book",
+            constraint=models.UniqueConstraint(
+                fields=("title", "author", "cover"), name="unique_book_edition"
+            ),
+        ),
+        migrations.RunPython(
+            reinstall_sqlite_fts_triggers, migrations.RunPython.noop
+        ),
+    ]
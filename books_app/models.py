@@ -2,6 +2,45 @@ from decimal import Decimal
 
 from django.core.validators import MinValueValidator
 from django.db import models
+from django.db.models import Case, F, Q, Value, When
+
+from books_app.cache import invalidate_catalog
+
+
+class BookQuerySet(models.QuerySet):
+    def checkout(self, book_id: int, quantity: int = 1) -> bool:
+        """Take copies off the shelf, False when there are not enough left"""
+        return self.checkout_many({book_id: quantity})
+
+    def checkout_many(self, quantities: dict[int, int]) -> bool:
+        """
+        Take copies of several books off the shelf in one UPDATE.
+
+        Returns False when any of the books ran short, in which case the
+        others may already be decremented: call it inside a transaction
+        and roll back on False.
+        """
+        enough_left = Q()
+        for book_id, quantity in quantities.items():
+            enough_left |= Q(pk=book_id, inventory__gte=quantity)
+
+        updated = self.filter(enough_left).update(
+            inventory=F("inventory") - Case(
+                *(
+                    When(pk=book_id, then=Value(quantity))
+                    for book_id, quantity in quantities.items()
+                ),
+                output_field=models.PositiveIntegerField(),
+            )
+        )
+        if updated:
+            invalidate_catalog()
+        return updated == len(quantities)
+
+    def checkin(self, book_id: int, quantity: int = 1) -> None:
+        """Put returned copies back on the shelf"""
+        self.filter(pk=book_id).update(inventory=F("inventory") + quantity)
+        invalidate_catalog()
 
 
 class Book(models.Model):
@@ -21,8 +60,16 @@ class Book(models.Model):
         max_digits=7, decimal_places=2, validators=[MinValueValidator(Decimal("0.00"))]
     )
 
+    objects = BookQuerySet.as_manager()
+
     class Meta:
         ordering = ["title"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["title", "author", "cover"],
+                name="unique_book_edition",
+            ),
+        ]
         verbose_name = "Book"
         verbose_name_plural = "Books"
 
@@ -0,0 +1,86 @@
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connection
+from django.db.models import Q, QuerySet
+
+SEARCH_CONFIG = "simple"
+SQLITE_FTS_TABLE = "books_app_book_fts"
+
+SQLITE_FTS_TRIGGERS = (
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {SQLITE_FTS_TABLE}_ai
+    AFTER INSERT ON books_app_book BEGIN
+        INSERT INTO {SQLITE_FTS_TABLE}(rowid, title, author)
+        VALUES (new.id, new.title, new.author);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {SQLITE_FTS_TABLE}_ad
+    AFTER DELETE ON books_app_book BEGIN
+        INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}, rowid, title, author)
+        VALUES ('delete', old.id, old.title, old.author);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {SQLITE_FTS_TABLE}_au
+    AFTER UPDATE OF title, author ON books_app_book BEGIN
+        INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}, rowid, title, author)
+        VALUES ('delete', old.id, old.title, old.author);
+        INSERT INTO {SQLITE_FTS_TABLE}(rowid, title, author)
+        VALUES (new.id, new.title, new.author);
+    END
+    """,
+)
+
+
+def book_search_vector() -> SearchVector:
+    """The expression covered by the Postgres GIN index, keep them identical"""
+    return SearchVector("title", "author", config=SEARCH_CONFIG)
+
+
+def install_sqlite_fts_triggers(schema_editor) -> None:
+    """(Re)create the FTS5 sync triggers, SQLite drops them on table remakes"""
+    for statement in SQLITE_FTS_TRIGGERS:
+        schema_editor.execute(statement)
+    schema_editor.execute(
+        f"INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}) VALUES ('rebuild')"
+    )
+
+
+def _fts5_match_expression(term: str) -> str:
+    # Quote every token so user input can never be parsed as FTS5 syntax.
+    return " ".join(f'"{token}"' for token in re.findall(r"\w+", term))
+
+
+def search_books(queryset: QuerySet, term: str) -> QuerySet:
+    """Filter books by title/author and order them by relevance"""
+    vendor = connection.vendor
+
+    if vendor == "postgresql":
+        vector = book_search_vector()
+        query = SearchQuery(term, config=SEARCH_CONFIG)
+        return (
+            queryset.annotate(search=vector, rank=SearchRank(vector, query))
+            .filter(search=query)
+            .order_by("-rank", "title")
+        )
+
+    if vendor == "sqlite":
+        match = _fts5_match_expression(term)
+        if not match:
+            return queryset.none()
+        # A real join against the FTS5 table, bm25() is only available there.
+        return queryset.extra(
+            select={"rank": f"bm25({SQLITE_FTS_TABLE}, 2.0, 1.0)"},
+            tables=[SQLITE_FTS_TABLE],
+            where=[
+                f"{SQLITE_FTS_TABLE}.rowid = books_app_book.id",
+                f"{SQLITE_FTS_TABLE} MATCH %s",
+            ],
+            params=[match],
+        ).order_by("rank", "title")
+
+    return queryset.filter(
+        Q(title__icontains=term) | Q(author__icontains=term)
+    )
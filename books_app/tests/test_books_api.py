@@ -1,13 +1,28 @@
+from threading import Thread
+
+from datetime import date
+
 from django.contrib.admin.sites import site
-from django.test import TestCase
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, override_settings
+from LibraryService.conditional import fresh_version
+from LibraryService.testing import QueryBudgetMixin
+from LibraryService.values import ValuesPlan
+from books_app.cache import CATALOG_VERSION_KEY
 from books_app.models import Book
+from books_app.views import BookViewSet
 from decimal import Decimal
 from django.core.exceptions import ValidationError
 from books_app.serializers import BookSerializer, BookListSerializer
 from django.contrib.auth import get_user_model
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APITestCase, APIClient
 from django.urls import reverse
+from django.utils.http import http_date
 
 User = get_user_model()
 
@@ -101,6 +116,18 @@ class BookSerializerTest(TestCase):
         self.assertEqual(data["inventory"], self.book_attributes["inventory"])
         self.assertEqual(data["daily_fee"], str(self.book_attributes["daily_fee"]))
 
+    def test_values_plan_matches_serializers(self):
+        """Test that .values() rows render exactly like the serializers."""
+        Book.objects.create(title="Zero", author="", cover=Book.CoverType.HARD, inventory=0, daily_fee="0")
+        Book.objects.create(title="Ключ", author="Автор", cover=Book.CoverType.HARD, inventory=7, daily_fee="12.5")
+        queryset = Book.objects.order_by("id")
+        for serializer_class in (BookSerializer, BookListSerializer):
+            plan = ValuesPlan(serializer_class())
+            self.assertEqual(
+                JSONRenderer().render(plan.to_representation(plan.values(queryset))),
+                JSONRenderer().render(serializer_class(queryset, many=True).data),
+            )
+
 
 # UnauthenticatedBookAPITests
 class UnauthenticatedBookAPITests(APITestCase):
@@ -154,8 +181,360 @@ class AuthenticatedBookAPITests(APITestCase):
         response = self.client.get(self.list_url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+    def test_editions_are_unique(self):
+        """Test that creating or renaming a book into an existing edition is rejected."""
+        Book.objects.create(title="New Book", author="Author", cover="SOFT", inventory=1, daily_fee="0.02")
+        other = Book.objects.create(title="Other Book", author="Author", cover="SOFT", inventory=1, daily_fee="0.02")
+        data = {"title": "New Book", "author": "Author", "cover": "SOFT", "inventory": 2, "daily_fee": "0.02"}
+
+        response = self.client.post(self.list_url, data)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("non_field_errors", response.data)
+
+        response = self.client.put(self.detail_url(other.id), data)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        data["cover"] = "HARD"
+        response = self.client.post(self.list_url, data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
     def test_retrieve_book(self):
         """Test that authenticated users can retrieve a book by its ID."""
         book = Book.objects.create(title="New Book", author="Author", cover="SOFT", inventory=1, daily_fee="0.02")
         response = self.client.get(self.detail_url(book.id))
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+# BookSearchAPITests
+class BookSearchAPITests(APITestCase):
+    def setUp(self):
+        """Set up a small catalog for full-text search."""
+        self.client = APIClient()
+        self.list_url = reverse('books_app:book-list')
+        self.kobzar = Book.objects.create(title="Kobzar", author="Taras Shevchenko", cover="HARD", inventory=3, daily_fee="1.00")
+        self.potter = Book.objects.create(title="Harry Potter", author="J.K. Rowling", cover="SOFT", inventory=3, daily_fee="1.00")
+        Book.objects.create(title="Haidamaky", author="Taras Shevchenko", cover="SOFT", inventory=3, daily_fee="1.00")
+
+    def search(self, term):
+        response = self.client.get(self.list_url, {"search": term})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [book["id"] for book in response.data["results"]]
+
+    def test_search_by_title_and_author(self):
+        """Test that search matches words from both title and author."""
+        self.assertEqual(self.search("potter"), [self.potter.id])
+        self.assertEqual(len(self.search("shevchenko")), 2)
+        self.assertEqual(self.search("kobzar shevchenko"), [self.kobzar.id])
+
+    def test_search_follows_updates_and_deletes(self):
+        """Test that the search index stays in sync with the book table."""
+        self.potter.title = "Fantastic Beasts"
+        self.potter.save()
+        self.assertEqual(self.search("potter"), [])
+        self.assertEqual(self.search("beasts"), [self.potter.id])
+
+        self.potter.delete()
+        self.assertEqual(self.search("beasts"), [])
+
+    def test_search_ignores_query_syntax(self):
+        """Test that operators in user input are treated as plain words."""
+        self.assertEqual(self.search('"kobzar* OR'), [])
+        self.assertEqual(self.search("***"), [])
+
+
+# BookCacheAPITests
+class BookCacheAPITests(APITestCase):
+    def setUp(self):
+        """Set up a book and an admin client for cache invalidation."""
+        self.client = APIClient()
+        self.admin = User.objects.create_superuser(email="admin@test.com", password="testpassword")
+        self.book = Book.objects.create(title="Kobzar", author="Taras Shevchenko", cover="HARD", inventory=3, daily_fee="1.00")
+        self.list_url = reverse('books_app:book-list')
+        self.detail_url = reverse('books_app:book-detail', args=[self.book.id])
+
+    def test_repeated_reads_skip_the_database(self):
+        """Test that a second identical read is served from the cache."""
+        self.client.get(self.list_url)
+        self.client.get(self.detail_url)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.list_url).status_code, status.HTTP_200_OK)
+            self.assertEqual(self.client.get(self.detail_url).data["title"], "Kobzar")
+
+    def test_writes_invalidate_cached_pages(self):
+        """Test that create/update/destroy are visible on the next read."""
+        self.assertEqual(self.client.get(self.list_url).data["count"], 1)
+
+        self.client.force_authenticate(self.admin)
+        self.client.patch(self.detail_url, {"title": "Haidamaky"})
+        self.client.post(self.list_url, {"title": "New Book", "author": "Author", "cover": "SOFT", "inventory": 1, "daily_fee": "0.02"})
+        self.client.force_authenticate(None)
+
+        self.assertEqual(self.client.get(self.detail_url).data["title"], "Haidamaky")
+        self.assertEqual(self.client.get(self.list_url).data["count"], 2)
+
+    @override_settings(ALLOWED_HOSTS=["public.example.com", "internal"])
+    def test_pages_are_cached_per_host(self):
+        """Test that a cached page never links to another host."""
+        Book.objects.create(title="Haidamaky", author="Taras Shevchenko", cover="SOFT", inventory=1, daily_fee="1.00")
+        url = f"{self.list_url}?limit=1"
+
+        public = self.client.get(url, HTTP_HOST="public.example.com")
+        internal = self.client.get(url, HTTP_HOST="internal")
+        self.assertTrue(public.data["next"].startswith("http://public.example.com/"))
+        self.assertTrue(internal.data["next"].startswith("http://internal/"))
+
+    def test_cache_stats_admin_only(self):
+        """Test that hit/miss counters are exposed to admins only."""
+        url = reverse('books_app:book-cache-stats')
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.client.get(self.detail_url)
+        self.client.get(self.detail_url)
+        self.client.force_authenticate(self.admin)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertGreaterEqual(response.data["hits"], 1)
+        self.assertGreaterEqual(response.data["misses"], 1)
+
+
+# BookConditionalGetTests
+class BookConditionalGetTests(APITestCase):
+    def setUp(self):
+        """Set up a book and an admin client for conditional requests."""
+        self.client = APIClient()
+        self.admin = User.objects.create_superuser(email="admin@test.com", password="testpassword")
+        self.book = Book.objects.create(title="Kobzar", author="Taras Shevchenko", cover="HARD", inventory=3, daily_fee="1.00")
+        self.list_url = reverse('books_app:book-list')
+        self.detail_url = reverse('books_app:book-detail', args=[self.book.id])
+
+    def test_unchanged_catalog_is_not_modified(self):
+        """Test that a matching ETag or date gets a 304 without queries."""
+        # Last written in an earlier second, so the date is reliable.
+        cache.set(CATALOG_VERSION_KEY, fresh_version() - 2_000_000, None)
+        for url in (self.list_url, self.detail_url):
+            response = self.client.get(url)
+            with self.assertNumQueries(0):
+                revalidated = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+                self.assertEqual(revalidated.status_code, status.HTTP_304_NOT_MODIFIED)
+                self.assertEqual(revalidated.content, b"")
+                self.assertEqual(revalidated["ETag"], response["ETag"])
+
+                revalidated = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"])
+                self.assertEqual(revalidated.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_write_in_the_current_second_has_no_date(self):
+        """Test that If-Modified-Since is not trusted within the write's second."""
+        # Ahead by a second, so the clock can't leave it behind mid-test.
+        cache.set(CATALOG_VERSION_KEY, fresh_version() + 1_000_000, None)
+        response = self.client.get(self.list_url)
+        self.assertNotIn("Last-Modified", response)
+
+        revalidated = self.client.get(self.list_url, HTTP_IF_MODIFIED_SINCE=http_date())
+        self.assertEqual(revalidated.status_code, status.HTTP_200_OK)
+
+    def test_writes_change_the_etag(self):
+        """Test that a book update makes revalidation download again."""
+        etag = self.client.get(self.list_url)["ETag"]
+        self.client.force_authenticate(self.admin)
+        self.client.patch(self.detail_url, {"title": "Haidamaky"})
+        self.client.force_authenticate(None)
+
+        response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(response.data["results"][0]["title"], "Haidamaky")
+
+
+# AsyncBookAPITests
+@override_settings(ROOT_URLCONF="LibraryService.async_urls")
+class AsyncBookAPITests(APITestCase):
+    def setUp(self):
+        """Set up a small catalog read through both view flavours."""
+        self.client = APIClient()
+        self.kobzar = Book.objects.create(title="Kobzar", author="Taras Shevchenko", cover="HARD", inventory=3, daily_fee="1.00")
+        Book.objects.create(title="Harry Potter", author="J.K. Rowling", cover="SOFT", inventory=3, daily_fee="1.00")
+
+    def test_async_views_answer_like_sync_views(self):
+        """Test that the async list, search and detail match the sync ones."""
+        for params in ({}, {"limit": 1, "offset": 1}, {"search": "shevchenko"}):
+            response = self.client.get(reverse('async-book-list'), params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            # Page links point back at the async view.
+            async_body = response.content.decode().replace("/api/async/", "/api/")
+            self.assertEqual(async_body, self.client.get(reverse('books_app:book-list'), params).content.decode())
+
+        response = self.client.get(reverse('async-book-detail', args=[self.kobzar.id]))
+        self.assertEqual(response.content, self.client.get(reverse('books_app:book-detail', args=[self.kobzar.id])).content)
+
+    def test_async_views_revalidate_like_sync_views(self):
+        """Test that the async views answer a matching ETag with a 304."""
+        for url in (reverse('async-book-list'), reverse('async-book-detail', args=[self.kobzar.id])):
+            response = self.client.get(url)
+            self.assertIn("no-cache", response["Cache-Control"])
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_async_views_are_off_by_default(self):
+        """Test that the async views are only routed with ASYNC_VIEWS."""
+        with override_settings(ROOT_URLCONF="LibraryService.urls"):
+            response = self.client.get("/api/async/books/")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_async_detail_not_found(self):
+        """Test that a missing book answers with DRF's 404 body."""
+        response = self.client.get(reverse('async-book-detail', args=[0]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(response.json(), {"detail": "No Book matches the given query."})
+
+    def test_async_views_are_read_only(self):
+        """Test that writes are not allowed on the async views."""
+        response = self.client.post(reverse('async-book-list'), {"title": "New Book"})
+        self.assertEqual(response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+
+# BookInventoryConcurrencyTests
+class BookInventoryConcurrencyTests(TransactionTestCase):
+    threads = 8
+    attempts_per_thread = 10
+
+    def run_concurrently(self, target):
+        def worker():
+            try:
+                target()
+            finally:
+                connection.close()
+
+        threads = [Thread(target=worker) for _ in range(self.threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def test_concurrent_checkouts_never_oversell(self):
+        """Test that concurrent checkouts hand out exactly the inventory."""
+        book = Book.objects.create(title="Kobzar", author="Taras Shevchenko", inventory=25, daily_fee="1.00")
+        results = []
+
+        def checkout():
+            for _ in range(self.attempts_per_thread):
+                results.append(Book.objects.checkout(book.id))
+
+        self.run_concurrently(checkout)
+
+        book.refresh_from_db()
+        self.assertEqual(results.count(True), 25)
+        self.assertEqual(book.inventory, 0)
+
+    def test_concurrent_checkins_are_not_lost(self):
+        """Test that concurrent returns all land on the inventory."""
+        book = Book.objects.create(title="Kobzar", author="Taras Shevchenko", inventory=0, daily_fee="1.00")
+
+        def checkin():
+            for _ in range(self.attempts_per_thread):
+                Book.objects.checkin(book.id)
+
+        self.run_concurrently(checkin)
+
+        book.refresh_from_db()
+        self.assertEqual(book.inventory, self.threads * self.attempts_per_thread)
+
+
+# BookEditionMigrationTests
+class BookEditionMigrationTests(TransactionTestCase):
+    before = [("books_app", "0003_book_search_index"), ("borrowing_app", "0004_outboxmessage")]
+    after = [("books_app", "0004_book_unique_edition"), ("borrowing_app", "0004_outboxmessage")]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        call_command("migrate", verbosity=0)
+
+    def test_duplicate_editions_are_merged(self):
+        """Test that duplicates are folded into one row, keeping borrowings and inventory."""
+        apps = self.migrate(self.before)
+        Book = apps.get_model("books_app", "Book")
+        Borrowing = apps.get_model("borrowing_app", "Borrowing")
+        user = apps.get_model("user", "User").objects.create(email="reader@test.com")
+        edition = {"title": "Kobzar", "author": "Taras Shevchenko", "cover": "HARD", "daily_fee": "1.00"}
+        kept = Book.objects.create(inventory=2, **edition)
+        copy = Book.objects.create(inventory=3, **edition)
+        other = Book.objects.create(**{**edition, "cover": "SOFT"}, inventory=1)
+        borrowing = Borrowing.objects.create(book=copy, user=user, expected_return_date=date(2030, 1, 1))
+
+        apps = self.migrate(self.after)
+        Book = apps.get_model("books_app", "Book")
+        self.assertEqual(
+            dict(Book.objects.values_list("id", "inventory")),
+            {kept.id: 5, other.id: 1},
+        )
+        self.assertEqual(
+            apps.get_model("borrowing_app", "Borrowing").objects.get(pk=borrowing.pk).book_id,
+            kept.id,
+        )
+
+
+# BookImportAPITests
+class BookImportAPITests(APITestCase):
+    def setUp(self):
+        """Set up an admin client and an existing edition to upsert."""
+        self.client = APIClient()
+        self.admin = User.objects.create_superuser(email="admin@test.com", password="testpassword")
+        self.client.force_authenticate(self.admin)
+        self.url = reverse('books_app:book-import-catalog')
+        self.book = Book.objects.create(title="Kobzar", author="Taras Shevchenko", cover="HARD", inventory=3, daily_fee="1.00")
+
+    def test_import_csv_upserts_books(self):
+        """Test that CSV rows update existing editions and add new ones."""
+        body = (
+            "title,author,cover,inventory,daily_fee\n"
+            "Kobzar,Taras Shevchenko,HARD,7,1.50\n"
+            "Haidamaky,Taras Shevchenko,SOFT,2,0.75\n"
+            "Broken,Author,SOFT,-1,1.00\n"
+        )
+        response = self.client.post(self.url, body, content_type="text/csv")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["imported"], 2)
+        self.assertEqual(response.data["failed"], 1)
+        self.assertEqual(response.data["errors"][0]["line"], 4)
+
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 7)
+        self.assertEqual(self.book.daily_fee, Decimal("1.50"))
+        self.assertEqual(Book.objects.count(), 2)
+
+    def test_import_jsonl_reports_bad_lines(self):
+        """Test that JSON Lines are imported and broken lines reported."""
+        body = (
+            '{"title": "Zakhar Berkut", "author": "Ivan Franko", "inventory": 4, "daily_fee": "1.00"}\n'
+            "not json\n"
+        )
+        response = self.client.post(self.url, body, content_type="application/x-ndjson")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["imported"], 1)
+        self.assertEqual(response.data["errors"][0]["line"], 2)
+        self.assertTrue(Book.objects.filter(title="Zakhar Berkut", cover="SOFT").exists())
+
+    def test_import_admin_only(self):
+        """Test that regular users cannot import books."""
+        self.client.force_authenticate(User.objects.create_user(email="user@test.com", password="testpassword"))
+        response = self.client.post(self.url, "title\n", content_type="text/csv")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+# BookQueryBudgetTests
+class BookQueryBudgetTests(QueryBudgetMixin, APITestCase):
+    def populate(self, size):
+        """Top the catalog up to ``size`` books."""
+        existing = Book.objects.count()
+        Book.objects.bulk_create(
+            Book(title=f"Book {number}", author="Author", inventory=1, daily_fee="1.00")
+            for number in range(existing, size)
+        )
+
+    def test_book_list_budget(self):
+        """Test that listing books does not run a query per book."""
+        self.assertWithinQueryBudget(reverse('books_app:book-list'), BookViewSet, "list", self.populate)
@@ -1,8 +1,29 @@
-from drf_spectacular.utils import extend_schema_view, extend_schema, OpenApiResponse
-from rest_framework import viewsets
+import codecs
+from functools import partial
 
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import (
+    extend_schema_view,
+    extend_schema,
+    OpenApiParameter,
+    OpenApiResponse,
+)
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+
+from LibraryService.conditional import conditional_response
+from LibraryService.values import ValuesViewMixin
+from books_app.cache import (
+    cached_catalog_response,
+    catalog_cache_stats,
+    catalog_version,
+)
+from books_app.importers import FILE_FORMATS, detect_file_format, import_books
 from books_app.models import Book
 from books_app.permissions import IsAdminOrReadOnly
+from books_app.search import search_books
 from books_app.serializers import BookSerializer, BookListSerializer
 
 
@@ -10,6 +31,17 @@ from books_app.serializers import BookSerializer, BookListSerializer
     list=extend_schema(
         summary="Retrieve a list of books",
         description="Retrieve a list of all books. Accessible by anyone.",
+        parameters=[
+            OpenApiParameter(
+                name="search",
+                description=(
+                    "Full-text search by title and author, results are "
+                    "ordered by relevance (ex. ?search=rowling potter)"
+                ),
+                required=False,
+                type=OpenApiTypes.STR,
+            ),
+        ],
         responses={200: BookListSerializer(many=True)}
     ),
     retrieve=extend_schema(
@@ -38,13 +70,112 @@ from books_app.serializers import BookSerializer, BookListSerializer
         responses={204: OpenApiResponse(description="No Content")}
     )
 )
-class BookViewSet(viewsets.ModelViewSet):
+class BookViewSet(ValuesViewMixin, viewsets.ModelViewSet):
     queryset = Book.objects.all()
     serializer_class = BookSerializer
     permission_classes = [IsAdminOrReadOnly]
+    query_budget = {"list": 2, "retrieve": 1}
+
+    def get_queryset(self):
+        queryset = self.queryset
+
+        if self.action == "list":
+            search = self.request.query_params.get("search")
+            if search:
+                queryset = search_books(queryset, search)
+
+        return queryset
 
     def get_serializer_class(self):
         if self.action == "list":
             return BookListSerializer
 
         return BookSerializer
+
+    def list(self, request, *args, **kwargs):
+        return conditional_response(
+            request,
+            [catalog_version()],
+            partial(
+                cached_catalog_response,
+                # Pages link to their neighbours with absolute URLs.
+                f"list:{request.build_absolute_uri()}",
+                partial(super().list, request, *args, **kwargs),
+            ),
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return conditional_response(
+            request,
+            [catalog_version()],
+            partial(
+                cached_catalog_response,
+                f"detail:{kwargs['pk']}",
+                partial(super().retrieve, request, *args, **kwargs),
+            ),
+        )
+
+    @extend_schema(
+        summary="Book catalog cache statistics",
+        description="Hit/miss counters of the catalog cache. Accessible only by admin users.",
+        responses={200: OpenApiTypes.OBJECT},
+    )
+    @action(
+        detail=False,
+        methods=["get"],
+        url_path="cache-stats",
+        permission_classes=[IsAdminUser],
+    )
+    def cache_stats(self, request):
+        return Response(catalog_cache_stats())
+
+    @extend_schema(
+        summary="Import books from CSV or JSON Lines",
+        description=(
+            "Stream a catalog feed in the request body and upsert it into "
+            "the books table, matching on title, author and cover. The "
+            "format comes from ?file_format= (csv or jsonl) or the "
+            "Content-Type. Accessible only by admin users."
+        ),
+        parameters=[
+            OpenApiParameter(
+                name="file_format",
+                description="Body format, csv or jsonl (ex. ?file_format=csv)",
+                required=False,
+                type=OpenApiTypes.STR,
+                enum=FILE_FORMATS,
+            ),
+        ],
+        request={
+            "text/csv": OpenApiTypes.BINARY,
+            "application/x-ndjson": OpenApiTypes.BINARY,
+        },
+        responses={200: OpenApiTypes.OBJECT},
+    )
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="import",
+        permission_classes=[IsAdminUser],
+    )
+    def import_catalog(self, request):
+        file_format = request.query_params.get(
+            "file_format"
+        ) or detect_file_format(request.content_type)
+        if file_format not in FILE_FORMATS:
+            return Response(
+                {"detail": "Send text/csv or application/x-ndjson."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        # Read the body line by line instead of parsing request.data.
+        lines = codecs.iterdecode(request.stream or (), "utf-8")
+        try:
+            report = import_books(lines, file_format)
+        except UnicodeDecodeError:
+            return Response(
+                {"detail": "The request body must be UTF-8 encoded."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        return Response(report.as_dict())
@@ -1,5 +1,6 @@
 from django.contrib import admin
 
-from borrowing_app.models import Borrowing
+from borrowing_app.models import Borrowing, OutboxMessage
 
 admin.site.register(Borrowing)
+admin.site.register(OutboxMessage)
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class BorrowingAppConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "borrowing_app"
+
+    def ready(self):
+        from borrowing_app import signals  # noqa: F401
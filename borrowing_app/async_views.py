@@ -0,0 +1,72 @@
+from asgiref.sync import sync_to_async
+
+from LibraryService.async_views import AsyncAPIView, not_found
+from LibraryService.conditional import aconditional_response
+from LibraryService.fieldsets import request_fieldset
+from borrowing_app.cache import borrowing_versions
+from borrowing_app.filters import filter_borrowings
+from borrowing_app.models import Borrowing
+from borrowing_app.serializers import BorrowingListSerializer
+from borrowing_app.views import BorrowingPagination, select_fieldset
+
+
+class AsyncBorrowingViewMixin:
+    login_required = True
+
+    def get_queryset(self, request):
+        self.fields, self.expand = request_fieldset(
+            request, BorrowingListSerializer
+        )
+        return filter_borrowings(
+            select_fieldset(
+                Borrowing.objects.all(), self.fields, self.expand
+            ),
+            request,
+        )
+
+    def serialize(self, instance, **kwargs):
+        return BorrowingListSerializer(
+            instance, fields=self.fields, expand=self.expand, **kwargs
+        ).data
+
+    async def conditional(self, request, render):
+        """Answer with ``render``'s data, or a 304 like the sync views"""
+
+        async def respond():
+            return self.render(await render())
+
+        return await aconditional_response(
+            request,
+            await sync_to_async(borrowing_versions)(request.user),
+            respond,
+            private=True,
+        )
+
+
+class AsyncBorrowingListView(AsyncBorrowingViewMixin, AsyncAPIView):
+    """Async twin of ``BorrowingViewSet.list``, keyset cursors included"""
+
+    async def get(self, request):
+        async def render():
+            paginator = BorrowingPagination()
+            page = await paginator.apaginate_queryset(
+                self.get_queryset(request), request
+            )
+            data = self.serialize(page, many=True)
+            return paginator.get_paginated_response(data).data
+
+        return await self.conditional(request, render)
+
+
+class AsyncBorrowingDetailView(AsyncBorrowingViewMixin, AsyncAPIView):
+    """Async twin of ``BorrowingViewSet.retrieve``"""
+
+    async def get(self, request, pk):
+        async def render():
+            queryset = self.get_queryset(request)
+            borrowing = await queryset.filter(pk=pk).afirst()
+            if borrowing is None:
+                raise not_found(Borrowing)
+            return self.serialize(borrowing)
+
+        return await self.conditional(request, render)
@@ -0,0 +1,30 @@
+from LibraryService.conditional import get_versions, invalidate_versions
+from books_app.cache import CATALOG_VERSION_KEY
+
+BORROWINGS_VERSION_KEY = "borrowings:version"
+USER_BORROWINGS_VERSION_KEY = "borrowings:version:user:{}"
+
+
+def borrowing_versions(user) -> list[int]:
+    """
+    Versions of what a borrowing list or detail shows ``user``.
+
+    Staff see everyone's borrowings, the others their own. Books are nested
+    with their inventory, so the catalog version is part of it too.
+    """
+    scope = (
+        BORROWINGS_VERSION_KEY
+        if user.is_staff
+        else USER_BORROWINGS_VERSION_KEY.format(user.pk)
+    )
+    return get_versions([scope, CATALOG_VERSION_KEY])
+
+
+def invalidate_borrowings(*user_ids) -> None:
+    """Retire the borrowing lists of these users and the staff's"""
+    invalidate_versions(
+        [
+            BORROWINGS_VERSION_KEY,
+            *(USER_BORROWINGS_VERSION_KEY.format(pk) for pk in set(user_ids)),
+        ]
+    )
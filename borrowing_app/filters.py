@@ -0,0 +1,53 @@
+from django.db.models import QuerySet
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import OpenApiParameter
+from rest_framework.request import Request
+
+BORROWING_FILTER_PARAMETERS = [
+    OpenApiParameter(
+        name="is_active",
+        description=(
+            "Filter borrowing list by actual return date"
+            "(ex. ?is_active=true)"
+        ),
+        required=False,
+        type=OpenApiTypes.BOOL,
+    ),
+    OpenApiParameter(
+        name="user_id",
+        description=(
+            "Filter borrowing list by user id, only for admins"
+            "(ex. ?user_id=5)"
+        ),
+        required=False,
+        type=OpenApiTypes.INT,
+    ),
+]
+
+
+def filter_borrowings(
+    queryset: QuerySet, request: Request, prefix: str = ""
+) -> QuerySet:
+    """
+    Apply the borrowing visibility rules and the ``user_id`` / ``is_active``
+    filters. ``prefix`` points at the borrowing from a related model,
+    e.g. ``"borrowing__"`` for payments.
+    """
+    user = request.user
+
+    if not user.is_staff:
+        queryset = queryset.filter(**{f"{prefix}user": user})
+    else:
+        user_id = request.query_params.get("user_id")
+        if user_id:
+            queryset = queryset.filter(**{f"{prefix}user__id": user_id})
+
+    is_active = request.query_params.get("is_active")
+    if is_active is not None:
+        open_loans = {f"{prefix}actual_return_date__isnull": True}
+        if is_active.lower() == "true":
+            queryset = queryset.filter(**open_loans)
+        elif is_active.lower() == "false":
+            queryset = queryset.exclude(**open_loans)
+
+    return queryset
@@ -0,0 +1,54 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from LibraryService.loadtest import loadtest, query_latency
+
+READ_MIX = {"books": 2, "book_detail": 2, "borrowings": 3}
+
+
+class Command(BaseCommand):
+    """Compare the sync read views on WSGI with the async ones on ASGI"""
+
+    help = (
+        "Load test the book and borrowing reads twice at the same "
+        "concurrency: the DRF views on a fixed pool of WSGI threads, then "
+        "the async views on one ASGI event loop. Prints both JSON reports. "
+        "Use a scratch database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=64)
+        parser.add_argument("--duration", type=float, default=15)
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=8,
+            help="WSGI server threads, like gunicorn --threads.",
+        )
+        parser.add_argument(
+            "--query-latency",
+            type=float,
+            default=2,
+            help="Milliseconds added to every query, 0 for a local database.",
+        )
+
+    def handle(self, *args, **options):
+        reports = {}
+        for server in ("wsgi", "asgi"):
+            with query_latency(options["query_latency"] / 1000):
+                reports[server] = loadtest(
+                    concurrency=options["concurrency"],
+                    duration=options["duration"],
+                    mix=READ_MIX,
+                    asgi=server == "asgi",
+                    workers=options["workers"],
+                    # A kept-alive connection would pin a WSGI thread to
+                    # one client and starve the others.
+                    keep_alive=False,
+                )
+            self.stderr.write(
+                f"{server}: {reports[server]['throughput_rps']} req/s, "
+                f"p99 {reports[server]['latency_ms']['p99']} ms"
+            )
+        self.stdout.write(json.dumps(reports, indent=2))
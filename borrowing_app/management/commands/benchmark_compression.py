@@ -0,0 +1,103 @@
+import json
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from rest_framework.test import APIClient
+
+from LibraryService.compression import ENCODERS
+
+PAGES = {
+    "books": "/api/books/",
+    "borrowings": "/api/borrowings/",
+    "borrowings_expanded": "/api/borrowings/?expand=book,user,payment",
+    "payments_expanded": (
+        "/api/payments/?expand=borrowing.book,borrowing.user"
+    ),
+    "borrowings_export": "/api/borrowings/export/?file_format=ndjson",
+}
+LEVELS = {"gzip": (1, 6, 9), "br": (1, 4, 11), "zstd": (1, 3, 19)}
+BENCHMARK_EMAIL = "benchmark-staff@example.com"
+
+
+class Command(BaseCommand):
+    """Measure the CPU cost and the bytes saved of each response encoding"""
+
+    help = (
+        "Render realistic API pages (500 row lists, expanded and not, and "
+        "a borrowing export) and compress each with every available "
+        "encoding at a few levels. Reports the compressed size, the ratio "
+        "and the compression time per page. zstd and br are measured when "
+        "their packages are installed. Use a scratch database filled by "
+        "generate_dataset, a staff user is added to it."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=10)
+        parser.add_argument(
+            "--export-bytes",
+            type=int,
+            default=1_000_000,
+            help="Bytes of the export stream to compress.",
+        )
+
+    def handle(self, *args, **options):
+        staff, _ = get_user_model().objects.get_or_create(
+            email=BENCHMARK_EMAIL, defaults={"is_staff": True}
+        )
+        client = APIClient()
+        client.force_authenticate(staff)
+
+        report = {}
+        for name, url in PAGES.items():
+            body = self.render(client, url, options["export_bytes"])
+            report[name] = {"bytes": len(body), "encodings": {}}
+            for encoding, encoder_class in ENCODERS.items():
+                for level in LEVELS[encoding]:
+                    report[name]["encodings"][f"{encoding}-{level}"] = (
+                        self.measure(
+                            encoder_class(level), body, options["repeat"]
+                        )
+                    )
+            self.stderr.write(
+                f"{name}: {len(body)} bytes, "
+                + ", ".join(
+                    f"{key} {result['ratio']}x in {result['ms']} ms"
+                    for key, result in report[name]["encodings"].items()
+                )
+            )
+        self.stdout.write(json.dumps(report, indent=2))
+
+    @staticmethod
+    def render(client: APIClient, url: str, limit: int) -> bytes:
+        # Uncompressed, the test client sends no Accept-Encoding.
+        with override_settings(ALLOWED_HOSTS=["*"]):
+            response = client.get(url)
+        if response.status_code != 200:
+            raise CommandError(f"{url} answered {response.status_code}.")
+        if not response.streaming:
+            return response.content
+
+        body = b""
+        for chunk in response.streaming_content:
+            body += chunk
+            if len(body) >= limit:
+                break
+        return body[:limit]
+
+    @staticmethod
+    def measure(encoder, body: bytes, repeat: int) -> dict:
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            compressed = encoder.compress(body)
+            timings.append(time.perf_counter() - started)
+        seconds = min(timings)
+        return {
+            "bytes": len(compressed),
+            "saved": len(body) - len(compressed),
+            "ratio": round(len(body) / len(compressed), 2),
+            "ms": round(seconds * 1000, 3),
+            "mb_per_s": round(len(body) / seconds / 1e6, 1),
+        }
@@ -0,0 +1,123 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from LibraryService.fieldsets import select_expanded
+from LibraryService.values import ValuesPlan
+from books_app.models import Book
+from books_app.serializers import BookListSerializer
+from borrowing_app.models import Borrowing
+from borrowing_app.serializers import BorrowingListSerializer
+from borrowing_app.views import select_fieldset
+from payment_app.models import Payment
+from payment_app.serializers import PaymentListSerializer
+
+EXPANDED_BORROWING = {"book": {}, "user": {}, "payment": {}}
+EXPANDED_PAYMENT = {"borrowing": {"book": {}, "user": {}}}
+
+SHAPES = {
+    "books": (BookListSerializer, lambda: Book.objects.all(), {}),
+    "borrowings": (
+        BorrowingListSerializer,
+        lambda: select_fieldset(Borrowing.objects.all(), None, {}),
+        {"expand": {}},
+    ),
+    "borrowings_expanded": (
+        BorrowingListSerializer,
+        lambda: select_fieldset(
+            Borrowing.objects.all(), None, EXPANDED_BORROWING
+        ),
+        {"expand": EXPANDED_BORROWING},
+    ),
+    "payments": (PaymentListSerializer, lambda: Payment.objects.all(), {}),
+    "payments_expanded": (
+        PaymentListSerializer,
+        lambda: select_expanded(Payment.objects.all(), EXPANDED_PAYMENT),
+        {"expand": EXPANDED_PAYMENT},
+    ),
+}
+
+
+def best_rate(rows: int, timings: list[float]) -> int:
+    return round(rows / min(timings))
+
+
+class Command(BaseCommand):
+    """Compare the DRF serializers with their compiled .values() plans"""
+
+    help = (
+        "Serialize a page of books, borrowings and payments, plain and "
+        "expanded, with the DRF ModelSerializers and with the .values() "
+        "plans the list views use. Reports rows per second with the query "
+        "included and for the serialization alone. Reads existing rows, "
+        "fill a scratch database with generate_dataset first."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rows", type=int, default=500, help="Rows per page at most."
+        )
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **options):
+        rows, repeat = options["rows"], options["repeat"]
+        report = {}
+
+        for name, (serializer_class, queryset, kwargs) in SHAPES.items():
+            queryset = queryset().order_by("-id")[:rows]
+            plan = ValuesPlan(serializer_class(**kwargs))
+            instances = list(queryset.all())
+            values = list(plan.values(queryset))
+            if not instances:
+                raise CommandError(f"No rows for {name}.")
+
+            def drf():
+                # A fresh clone, an evaluated queryset caches its rows.
+                return serializer_class(
+                    list(queryset.all()), many=True, **kwargs
+                ).data
+
+            def compiled():
+                return plan.to_representation(plan.values(queryset))
+
+            if drf() != compiled():
+                raise CommandError(f"{name}: the outputs differ.")
+
+            measured = {
+                "drf": self.measure(drf, repeat),
+                "values": self.measure(compiled, repeat),
+                "drf_serialize_only": self.measure(
+                    lambda: serializer_class(
+                        instances, many=True, **kwargs
+                    ).data,
+                    repeat,
+                ),
+                "values_serialize_only": self.measure(
+                    lambda: plan.to_representation(values), repeat
+                ),
+            }
+            report[name] = {
+                key: best_rate(len(instances), timings)
+                for key, timings in measured.items()
+            }
+            report[name]["rows"] = len(instances)
+            report[name]["speedup"] = round(
+                report[name]["values"] / report[name]["drf"], 2
+            )
+            self.stderr.write(
+                f"{name}: {report[name]['drf']} -> "
+                f"{report[name]['values']} rows/s "
+                f"({report[name]['speedup']}x)"
+            )
+
+        self.stdout.write(json.dumps(report, indent=2))
+
+    @staticmethod
+    def measure(function, repeat: int) -> list[float]:
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            function()
+            timings.append(time.perf_counter() - started)
+        return timings
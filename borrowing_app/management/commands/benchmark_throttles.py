@@ -0,0 +1,161 @@
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.core.cache.backends.redis import RedisCache
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework import throttling
+
+from LibraryService import throttling as sliding_window
+from LibraryService.loadtest import percentile
+
+BACKENDS = {
+    "drf": throttling.UserRateThrottle,
+    "sliding_window": sliding_window.UserRateThrottle,
+}
+
+
+def client_request(ident: str):
+    user = SimpleNamespace(is_authenticated=True, pk=ident)
+    return SimpleNamespace(user=user)
+
+
+def microseconds(timings: list[float]) -> dict:
+    timings = sorted(timing * 1e6 for timing in timings)
+    return {
+        "p50": round(percentile(timings, 0.50), 1),
+        "p99": round(percentile(timings, 0.99), 1),
+        "mean": round(sum(timings) / len(timings), 1),
+    }
+
+
+class Command(BaseCommand):
+    """Compare DRF's cache throttle with the Redis sliding window one"""
+
+    help = (
+        "Throttle the same authenticated clients with DRF's UserRateThrottle "
+        "and the sliding window UserRateThrottle. Reports the latency of a "
+        "throttle check as the per-client history grows, the bytes stored "
+        "per client and how many requests get through when threads race "
+        "on one client. Needs the Redis cache."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=5000,
+            help="Requests per client in the latency run.",
+        )
+        parser.add_argument("--clients", type=int, default=4)
+        parser.add_argument(
+            "--rate",
+            default="18000/day",
+            help="Rate of the latency run, the user rate by default.",
+        )
+        parser.add_argument(
+            "--threads",
+            type=int,
+            default=8,
+            help="Threads racing on one client limited to 100 requests.",
+        )
+
+    def handle(self, *args, **options):
+        self.cache = caches[DEFAULT_CACHE_ALIAS]
+        if not isinstance(self.cache, RedisCache):
+            raise CommandError("The default cache must be Redis.")
+        self.redis = self.cache._cache.get_client(write=True)
+
+        report = {}
+        for name, throttle_class in BACKENDS.items():
+            report[name] = {
+                **self.measure_latency(
+                    name,
+                    throttle_class,
+                    options["rate"],
+                    options["clients"],
+                    options["requests"],
+                ),
+                "race": self.measure_race(
+                    name, throttle_class, options["threads"]
+                ),
+            }
+            self.stderr.write(
+                f"{name}: p50 {report[name]['latency_us']['p50']} us, "
+                f"{report[name]['bytes_per_client']} bytes per client, "
+                f"{report[name]['race']['admitted']} of "
+                f"{report[name]['race']['limit']} admitted"
+            )
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def keys(self, ident: str) -> list[bytes]:
+        return list(self.redis.scan_iter(f"*throttle_user_{ident}*"))
+
+    def clear(self, ident: str) -> None:
+        keys = self.keys(ident)
+        if keys:
+            self.redis.delete(*keys)
+
+    def measure_latency(
+        self, name, throttle_class, rate, clients, requests
+    ) -> dict:
+        throttle_class = type(
+            "BenchmarkThrottle", (throttle_class,), {"rate": rate}
+        )
+        idents = [f"benchmark-{name}-{number}" for number in range(clients)]
+        for ident in idents:
+            self.clear(ident)
+
+        timings = []
+        for ident in idents:
+            request = client_request(ident)
+            for _ in range(requests):
+                started = time.perf_counter()
+                throttle_class().allow_request(request, None)
+                timings.append(time.perf_counter() - started)
+
+        stored = 0
+        for ident in idents:
+            stored += sum(self.redis.strlen(key) for key in self.keys(ident))
+            self.clear(ident)
+
+        # The last requests of each client carry the longest history.
+        return {
+            "latency_us": microseconds(timings),
+            "latency_us_last_100": microseconds(
+                [
+                    timing
+                    for start in range(0, len(timings), requests)
+                    for timing in timings[start:start + requests][-100:]
+                ]
+            ),
+            "bytes_per_client": stored // clients,
+        }
+
+    def measure_race(self, name, throttle_class, threads) -> dict:
+        limit = 100
+        throttle_class = type(
+            "BenchmarkThrottle", (throttle_class,), {"rate": f"{limit}/day"}
+        )
+        ident = f"benchmark-{name}-race"
+        self.clear(ident)
+        request = client_request(ident)
+        admitted = []
+        start = threading.Barrier(threads)
+
+        def hammer():
+            start.wait()
+            count = 0
+            for _ in range(2 * limit // threads + 1):
+                count += throttle_class().allow_request(request, None)
+            admitted.append(count)
+
+        workers = [threading.Thread(target=hammer) for _ in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.clear(ident)
+        return {"limit": limit, "admitted": sum(admitted)}
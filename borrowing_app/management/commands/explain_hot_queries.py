@@ -0,0 +1,145 @@
+import time
+from datetime import date
+from statistics import median
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from LibraryService.dataset import generate_dataset
+from LibraryService.settings import DEBUG
+from borrowing_app.models import Borrowing
+from payment_app.models import Payment
+
+# (model, index name) pairs that serve the hot filters below.
+HOT_INDEXES = (
+    (Borrowing, "borrowing_user_date_id_idx"),
+    (Borrowing, "borrowing_open_due_idx"),
+    (Payment, "payment_pending_session_idx"),
+)
+
+
+def hot_queries(user_id: int) -> dict:
+    """The filters that run on every borrow, list and scheduled job"""
+    return {
+        "open loans of a user (?is_active=true)": Borrowing.objects.filter(
+            user_id=user_id, actual_return_date__isnull=True
+        ).order_by("-borrow_date", "-id")[:20],
+        "overdue digest": Borrowing.objects.filter(
+            expected_return_date__lte=date.today(),
+            actual_return_date__isnull=True,
+        )
+        .order_by("expected_return_date", "id")
+        .values_list("id", "user_id", "book_id", "expected_return_date"),
+        # Served by the borrowing user index and the payment one-to-one.
+        "pending payments of a user": Payment.objects.filter(
+            borrowing__user_id=user_id, status=Payment.Status.PENDING
+        ).values_list("id")[:1],
+        "payment reconciliation chunk": Payment.objects.filter(
+            status=Payment.Status.PENDING,
+            session_id__isnull=False,
+            id__gt=0,
+        )
+        .order_by("id")
+        .values_list("id", "session_id")[:500],
+    }
+
+
+class Command(BaseCommand):
+    """Compare the plans of the hot filters without and with their indexes"""
+
+    help = (
+        "Print EXPLAIN (ANALYZE on Postgres) and timings of the hot "
+        "borrowing and payment filters. With --drop-indexes they are first "
+        "run with the hot indexes dropped, which needs DJANGO_DEBUG and a "
+        "scratch database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--seed-borrowings",
+            type=int,
+            default=0,
+            help=(
+                "Generate a dataset with this many borrowings first, "
+                "see the generate_dataset command."
+            ),
+        )
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument(
+            "--drop-indexes",
+            action="store_true",
+            help=(
+                "Also run the filters without the hot indexes. They are "
+                "dropped from the database and restored afterwards."
+            ),
+        )
+
+    def handle(self, *args, **options):
+        if options["drop_indexes"] and not DEBUG:
+            raise CommandError(
+                "--drop-indexes alters the schema, it only runs with "
+                "DJANGO_DEBUG on a scratch database."
+            )
+
+        count = options["seed_borrowings"]
+        if count:
+            generate_dataset(
+                users=max(count // 20, 1),
+                books=max(count // 100, 1),
+                borrowings=count,
+                progress=self.stdout.write,
+            )
+
+        user_id = (
+            Borrowing.objects.order_by("-id")
+            .values_list("user_id", flat=True)
+            .first()
+        )
+        if user_id is None:
+            self.stderr.write("No borrowings, pass --seed-borrowings.")
+            return
+
+        self.stdout.write(
+            f"Database: {connection.vendor}, "
+            f"borrowings: {Borrowing.objects.count()}, "
+            f"payments: {Payment.objects.count()}"
+        )
+        if options["drop_indexes"]:
+            self.report_without_indexes(user_id, options["repeat"])
+        self.report("WITH hot indexes", user_id, options["repeat"])
+
+    def report_without_indexes(self, user_id: int, repeat: int) -> None:
+        indexes = [
+            (model, next(i for i in model._meta.indexes if i.name == name))
+            for model, name in HOT_INDEXES
+        ]
+        removed = []
+        try:
+            for model, index in indexes:
+                with connection.schema_editor() as schema_editor:
+                    schema_editor.remove_index(model, index)
+                removed.append((model, index))
+            self.report("WITHOUT hot indexes", user_id, repeat)
+        finally:
+            # Whatever went wrong, put back every index that was dropped.
+            with connection.schema_editor() as schema_editor:
+                for model, index in removed:
+                    schema_editor.add_index(model, index)
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE")
+
+    def report(self, title: str, user_id: int, repeat: int) -> None:
+        self.stdout.write(self.style.MIGRATE_HEADING(f"\n== {title} =="))
+        # ANALYZE runs the query for real timings, only Postgres has it.
+        options = {"analyze": True} if connection.vendor == "postgresql" else {}
+        for name, queryset in hot_queries(user_id).items():
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                list(queryset.all())
+                timings.append((time.perf_counter() - started) * 1000)
+            self.stdout.write(
+                self.style.SUCCESS(f"\n{name}: {median(timings):.2f} ms")
+            )
+            self.stdout.write(queryset.explain(**options))
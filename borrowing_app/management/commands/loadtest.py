@@ -0,0 +1,78 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from LibraryService.loadtest import DEFAULT_MIX, loadtest, parse_mix
+
+
+class Command(BaseCommand):
+    """Drive the API with concurrent virtual users and report latencies"""
+
+    help = (
+        "Load test the books, borrowings, return, payments and token "
+        "endpoints. Without --url the project is served in process with "
+        "Stripe and Telegram stubbed; use a scratch database, load test "
+        "users, books and borrowings are written to it. Prints a JSON "
+        "report of throughput, p50/p95/p99 latency and queries per request."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=8)
+        parser.add_argument(
+            "--duration", type=float, default=30, help="Seconds to run."
+        )
+        parser.add_argument(
+            "--mix",
+            type=parse_mix,
+            default=DEFAULT_MIX,
+            help=(
+                "Scenario weights, e.g. books=40,borrow_return=10. "
+                f"Scenarios: {', '.join(DEFAULT_MIX)}."
+            ),
+        )
+        parser.add_argument(
+            "--url",
+            help=(
+                "Load test an already running server instead. Its load test "
+                "users must exist and query counts need QUERY_COUNT_HEADERS."
+            ),
+        )
+        parser.add_argument(
+            "--asgi",
+            action="store_true",
+            help="Serve the ASGI app and read through the async views.",
+        )
+        parser.add_argument(
+            "--conditional",
+            action="store_true",
+            help=(
+                "Keep responses with an ETag and revalidate them, reports "
+                "304s and the body bytes they saved."
+            ),
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            help="WSGI server threads, one per virtual user by default.",
+        )
+        parser.add_argument("--output", help="Also write the report here.")
+
+    def handle(self, *args, **options):
+        try:
+            report = loadtest(
+                concurrency=options["concurrency"],
+                duration=options["duration"],
+                mix=options["mix"],
+                base_url=options["url"],
+                asgi=options["asgi"],
+                workers=options["workers"],
+                conditional=options["conditional"],
+            )
+        except ValueError as error:
+            raise CommandError(error)
+
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                file.write(output)
+        self.stdout.write(output)
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.6 on 2026-10-18 04:02
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("borrowing_app", "0005_hot_filter_indexes"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="borrowing",
+            name="borrowing_open_user_idx",
+        ),
+    ]
@@ -24,6 +24,23 @@ class Borrowing(models.Model):
     class Meta:
         verbose_name = "borrowing"
         verbose_name_plural = "borrowings"
+        indexes = [
+            models.Index(
+                fields=["-borrow_date", "-id"],
+                name="borrowing_date_id_idx",
+            ),
+            models.Index(
+                fields=["user", "-borrow_date", "-id"],
+                name="borrowing_user_date_id_idx",
+            ),
+            # The overdue digest only ever looks at unreturned books. Open
+            # loans of a user are few, borrowing_user_date_id_idx finds them.
+            models.Index(
+                fields=["expected_return_date", "id"],
+                name="borrowing_open_due_idx",
+                condition=models.Q(actual_return_date__isnull=True),
+            ),
+        ]
 
     def __str__(self):
         return f"Book taken {self.borrow_date} to borrow {self.expected_return_date}"
@@ -54,3 +71,25 @@ class Borrowing(models.Model):
     @property
     def borrow_days(self) -> int:
         return (self.expected_return_date - self.borrow_date).days
+
+
+class OutboxMessage(models.Model):
+    """
+    A Telegram notification waiting to be sent.
+
+    Rows are written in the same transaction as the change they announce,
+    so rolled back changes are never announced and nothing is lost when the
+    broker is down. ``drain_outbox`` delivers them in id order.
+    """
+
+    message = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        ordering = ["id"]
+        verbose_name = "outbox message"
+        verbose_name_plural = "outbox messages"
+
+    def __str__(self):
+        return f"Outbox message #{self.id} created {self.created_at}"
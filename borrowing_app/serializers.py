@@ -1,15 +1,64 @@
+from collections import Counter
 from datetime import date
 
 from django.db import transaction
 from rest_framework import serializers
 
+from LibraryService.fieldsets import ExpandableSerializerMixin
+from LibraryService.settings import BORROWING_BATCH_MAX_SIZE, MAX_ACTIVE_LOANS
+from books_app.models import Book
 from books_app.serializers import BookSerializer
+from borrowing_app.cache import invalidate_borrowings
 from borrowing_app.models import Borrowing
 from payment_app.models import Payment
 from payment_app.serializers import PaymentSerializer
+from user.models import UserAccountSummary
 from user.serializers import UserSerializer
 
 
+OUT_OF_STOCK_MESSAGE = "There are no books left in inventory"
+MAX_ACTIVE_LOANS_MESSAGE = (
+    "You cannot have more than {} books borrowed at a time."
+)
+
+
+def validate_borrower(
+    user, expected_return_date: date, new_loans: int = 1
+) -> None:
+    summary = (
+        UserAccountSummary.objects.filter(pk=user.pk).first()
+        or UserAccountSummary(user=user)
+    )
+
+    if summary.pending_payments:
+        raise serializers.ValidationError(
+            "You have pending payments. Please settle them before borrowing new books."
+        )
+
+    if expected_return_date < date.today():
+        raise serializers.ValidationError(
+            "The expected return date cannot be in the past."
+        )
+
+    if (
+        MAX_ACTIVE_LOANS
+        and summary.active_borrowings + new_loans > MAX_ACTIVE_LOANS
+    ):
+        raise serializers.ValidationError(
+            MAX_ACTIVE_LOANS_MESSAGE.format(MAX_ACTIVE_LOANS)
+        )
+
+
+def reserve_loans(user, count: int) -> None:
+    """Count new loans on the account, re-checking the limit atomically"""
+    if not UserAccountSummary.objects.reserve_loans(
+        user.pk, count, MAX_ACTIVE_LOANS
+    ):
+        raise serializers.ValidationError(
+            MAX_ACTIVE_LOANS_MESSAGE.format(MAX_ACTIVE_LOANS)
+        )
+
+
 class BorrowingSerializer(serializers.ModelSerializer):
     class Meta:
         model = Borrowing
@@ -18,40 +67,118 @@ class BorrowingSerializer(serializers.ModelSerializer):
     @staticmethod
     def validate_book(value):
         if value.inventory <= 0:
-            raise serializers.ValidationError(
-                "There are no books left in inventory"
-            )
+            raise serializers.ValidationError(OUT_OF_STOCK_MESSAGE)
         return value
 
     def validate(self, data):
-        user = self.context['request'].user
-        pending_payments = Payment.objects.filter(borrowing__user=user, status=Payment.Status.PENDING).exists()
+        validate_borrower(
+            self.context['request'].user, data['expected_return_date']
+        )
+        return data
 
-        if pending_payments:
+    def create(self, validated_data):
+        with transaction.atomic():
+            # The inventory read in validate_book may be stale by now, the
+            # conditional UPDATE is what actually reserves the copy.
+            if not Book.objects.checkout(validated_data["book"].id):
+                raise serializers.ValidationError(
+                    {"book": [OUT_OF_STOCK_MESSAGE]}
+                )
+            reserve_loans(validated_data["user"], 1)
+            return Borrowing.objects.create(**validated_data)
+
+
+class BorrowingBatchSerializer(serializers.Serializer):
+    expected_return_date = serializers.DateField()
+    books = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        min_length=1,
+        max_length=BORROWING_BATCH_MAX_SIZE,
+        write_only=True,
+    )
+    borrow_date = serializers.DateField(read_only=True)
+    borrowings = serializers.ListField(
+        child=serializers.IntegerField(), read_only=True
+    )
+
+    def validate_books(self, value):
+        quantities = Counter(value)
+        books = Book.objects.in_bulk(quantities)
+
+        missing = sorted(set(quantities) - set(books))
+        if missing:
             raise serializers.ValidationError(
-                "You have pending payments. Please settle them before borrowing new books."
+                f"Invalid book ids: {', '.join(map(str, missing))}"
             )
 
-        if data['expected_return_date'] < date.today():
+        out_of_stock = [
+            books[book_id].title
+            for book_id, quantity in quantities.items()
+            if books[book_id].inventory < quantity
+        ]
+        if out_of_stock:
             raise serializers.ValidationError(
-                "The expected return date cannot be in the past."
+                f"{OUT_OF_STOCK_MESSAGE}: {', '.join(out_of_stock)}"
             )
 
+        self.books = books
+        return value
+
+    def validate(self, data):
+        validate_borrower(
+            self.context['request'].user,
+            data['expected_return_date'],
+            new_loans=len(data['books']),
+        )
         return data
 
     def create(self, validated_data):
-        with transaction.atomic():
-            book = validated_data["book"]
-            borrowing = Borrowing.objects.create(**validated_data)
-            book.inventory -= 1
-            book.save()
-            return borrowing
+        quantities = Counter(validated_data["books"])
 
-
-class BorrowingListSerializer(BorrowingSerializer):
-    user = UserSerializer(read_only=True)
-    book = BookSerializer(read_only=True)
-    payment = PaymentSerializer(read_only=True)
+        with transaction.atomic():
+            if not Book.objects.checkout_many(quantities):
+                # Another checkout won the race, the exception rolls back
+                # the books that were already decremented.
+                raise serializers.ValidationError(
+                    {"books": [OUT_OF_STOCK_MESSAGE]}
+                )
+            reserve_loans(validated_data["user"], len(validated_data["books"]))
+
+            borrowings = Borrowing.objects.bulk_create(
+                Borrowing(
+                    book=self.books[book_id],
+                    user=validated_data["user"],
+                    expected_return_date=validated_data["expected_return_date"],
+                )
+                for book_id in validated_data["books"]
+            )
+            invalidate_borrowings(validated_data["user"].pk)
+
+        return {
+            "expected_return_date": validated_data["expected_return_date"],
+            "borrow_date": borrowings[0].borrow_date,
+            "borrowings": [borrowing.id for borrowing in borrowings],
+        }
+
+
+class BorrowingListSerializer(
+    ExpandableSerializerMixin, serializers.ModelSerializer
+):
+    """
+    Borrowings as read, the book, user and payment by id unless expanded.
+
+    The payment id is the ``payment_id`` annotation, the reverse one-to-one
+    has no column on the borrowing.
+    """
+
+    payment = serializers.IntegerField(
+        source="payment_id", read_only=True, allow_null=True
+    )
+    expandable_fields = {
+        "book": BookSerializer,
+        "user": UserSerializer,
+        "payment": PaymentSerializer,
+    }
 
     class Meta:
         model = Borrowing
@@ -64,6 +191,7 @@ class BorrowingListSerializer(BorrowingSerializer):
             "user",
             "payment",
         )
+        read_only_fields = fields
 
 
 class BorrowingReturnSerializer(serializers.ModelSerializer):
@@ -83,8 +211,9 @@ class BorrowingReturnSerializer(serializers.ModelSerializer):
         )
 
     def validate(self, attrs):
-        borrowing = self.instance
-        if borrowing.payment.status == Payment.Status.PAID:
+        # No payment yet on the first return.
+        payment = getattr(self.instance, "payment", None)
+        if payment is not None and payment.status == Payment.Status.PAID:
             raise serializers.ValidationError(
                 "This borrowing has already been returned."
             )
@@ -92,9 +221,16 @@ class BorrowingReturnSerializer(serializers.ModelSerializer):
 
     def update(self, instance, validated_data):
         with transaction.atomic():
-            instance.actual_return_date = date.today()
-            instance.save()
-            book = instance.book
-            book.inventory += 1
-            book.save()
+            # Of concurrent or retried returns of a loan only the one that
+            # sets the date puts the book back and closes the loan.
+            returned = Borrowing.objects.filter(
+                pk=instance.pk, actual_return_date__isnull=True
+            ).update(actual_return_date=date.today())
+            if returned:
+                Book.objects.checkin(instance.book_id)
+                UserAccountSummary.objects.adjust(
+                    instance.user_id, active_borrowings=-1
+                )
+                invalidate_borrowings(instance.user_id)
+            instance.refresh_from_db(fields=["actual_return_date"])
             return instance
@@ -0,0 +1,34 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from borrowing_app.cache import invalidate_borrowings
+from borrowing_app.models import Borrowing
+from payment_app.models import Payment
+
+
+@receiver(post_save, sender=Borrowing)
+@receiver(post_delete, sender=Borrowing)
+def invalidate_borrowings_on_borrowing_change(sender, instance, **kwargs):
+    invalidate_borrowings(instance.user_id)
+
+
+@receiver(post_save, sender=Payment)
+@receiver(post_delete, sender=Payment)
+def invalidate_borrowings_on_payment_change(sender, instance, **kwargs):
+    if Payment.borrowing.is_cached(instance):
+        user_ids = [instance.borrowing.user_id]
+    else:
+        # Only the user id. Empty once the borrowing is deleted, its own
+        # signal has invalidated the user then.
+        user_ids = Borrowing.objects.filter(
+            pk=instance.borrowing_id
+        ).values_list("user_id", flat=True)
+    invalidate_borrowings(*user_ids)
+
+
+# Borrowings show their user's email and staff flag.
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def invalidate_borrowings_on_user_change(sender, instance, **kwargs):
+    invalidate_borrowings(instance.pk)
@@ -1,47 +1,260 @@
-from datetime import datetime, timedelta
+import logging
+import random
+from datetime import date, timedelta
+from itertools import islice
+from typing import Iterable, Iterator
+from uuid import uuid4
 
-import requests
 from celery import shared_task
 from decouple import config, Csv
+from django.core.cache import cache
+from django.db.models import F, Max, Q
 
-from borrowing_app.models import Borrowing
+from borrowing_app.models import Borrowing, OutboxMessage
+from borrowing_app.telegram import Delivery, get_dispatcher
+
+logger = logging.getLogger(__name__)
 
-TELEGRAM_API_KEY = config("TELEGRAM_API_KEY", None)
 TELEGRAM_CHAT_IDS = config("TELEGRAM_CHAT_IDS", cast=Csv())
+TELEGRAM_MESSAGE_LIMIT = 4096
+TELEGRAM_MAX_RETRIES = config("TELEGRAM_MAX_RETRIES", default=8, cast=int)
+
+OUTBOX_BATCH_SIZE = config("OUTBOX_BATCH_SIZE", default=100, cast=int)
+OUTBOX_MAX_ATTEMPTS = config("OUTBOX_MAX_ATTEMPTS", default=10, cast=int)
+OUTBOX_DRAIN_LOCK_KEY = "outbox:drain:lock"
+# Renewed before every message, so only a dead drainer lets it expire.
+OUTBOX_DRAIN_LOCK_TIMEOUT = 60
+
+OVERDUE_CHUNK_SIZE = 2000
+OVERDUE_MARK_KEY = "borrowing_overdue:mark"
+NO_OVERDUE_MESSAGE = "*No new borrowings overdue today!*"
+OVERDUE_HEADER = "*New overdue borrowings*:\n\n"
+OVERDUE_CONTINUED_HEADER = "*New overdue borrowings (continued)*:\n\n"
+
+
+class TelegramDeliveryError(Exception):
+    pass
 
 
 @shared_task
-def send_telegram_message(message) -> None:
-    url = f"https://api.telegram.org/bot{TELEGRAM_API_KEY}/sendMessage"
-    for CHAT_ID in TELEGRAM_CHAT_IDS:
-        payload = {
-            "chat_id": CHAT_ID,
-            "text": message,
-            "parse_mode": "Markdown",
-        }
-        response = requests.post(url, data=payload)
+def send_telegram_message(message) -> dict[str, str]:
+    """
+    Send ``message`` to every TELEGRAM_CHAT_IDS chat concurrently.
+
+    Chats that failed with a retryable error get their own retrying task,
+    so one slow or rate-limited chat never blocks or drops the others.
+    Returns the delivery state per chat.
+    """
+    states = {}
+    for delivery in get_dispatcher().broadcast(TELEGRAM_CHAT_IDS, message):
+        states[delivery.chat_id] = _handle_delivery(delivery, message)
+    return states
+
+
+@shared_task(bind=True, max_retries=TELEGRAM_MAX_RETRIES)
+def send_telegram_message_to_chat(self, chat_id, message) -> str:
+    delivery = get_dispatcher().send(chat_id, message)
+    if delivery.retryable:
+        raise self.retry(
+            countdown=_retry_countdown(delivery, self.request.retries),
+            exc=TelegramDeliveryError(delivery.error),
+        )
+    return _handle_delivery(delivery, message)
+
+
+def _retry_countdown(delivery: Delivery, retries: int) -> float:
+    if delivery.retry_after:
+        return delivery.retry_after
+    # Exponential backoff with jitter: ~1s, 2s, 4s ... capped at 5 minutes.
+    return min(2 ** retries, 300) * random.uniform(0.5, 1.5)
+
 
-        if response.status_code != 200:
-            raise Exception(f"Error sending message: {response.text}")
+def _handle_delivery(delivery: Delivery, message: str) -> str:
+    if delivery.delivered:
+        logger.info("Telegram message delivered to chat %s", delivery.chat_id)
+        return "delivered"
+
+    if delivery.retryable:
+        logger.warning(
+            "Telegram delivery to chat %s failed, retrying: %s",
+            delivery.chat_id,
+            delivery.error,
+        )
+        send_telegram_message_to_chat.apply_async(
+            (delivery.chat_id, message),
+            countdown=_retry_countdown(delivery, 0),
+        )
+        return "retrying"
+
+    logger.error(
+        "Telegram delivery to chat %s failed: %s",
+        delivery.chat_id,
+        delivery.error,
+    )
+    return "failed"
+
+
+def notify(*messages: str) -> None:
+    """
+    Queue Telegram messages in the outbox.
+
+    Call it inside the transaction that makes the change being announced,
+    the messages are sent by ``drain_outbox`` once it commits.
+    """
+    OutboxMessage.objects.bulk_create(
+        OutboxMessage(message=message) for message in messages
+    )
 
 
 @shared_task
-def borrowing_overdue() -> None:
-    borrowings = Borrowing.objects.select_related("user", "book").filter(
-        expected_return_date__lte=datetime.now().date() + timedelta(days=1),
+def drain_outbox(batch_size: int = OUTBOX_BATCH_SIZE) -> int:
+    """
+    Send queued outbox messages in id order, a batch at a time.
+
+    A lock in the cache lets a single drainer run at a time, so messages
+    never overtake each other; a run finding it taken returns at once.
+    Messages are sent outside any transaction and deleted once sent: a
+    crash resends them (at-least-once). A message that raises stops the
+    run and goes first on the next one, until it failed
+    OUTBOX_MAX_ATTEMPTS times. It is then left in the table, dead-lettered,
+    and later messages go on. Returns the number of messages sent.
+    """
+    token = uuid4().hex
+    if not cache.add(OUTBOX_DRAIN_LOCK_KEY, token, OUTBOX_DRAIN_LOCK_TIMEOUT):
+        return 0
+    try:
+        return _drain_outbox(batch_size, token)
+    finally:
+        if cache.get(OUTBOX_DRAIN_LOCK_KEY) == token:
+            cache.delete(OUTBOX_DRAIN_LOCK_KEY)
+
+
+def _renew_drain_lock(token: str) -> bool:
+    return cache.get(OUTBOX_DRAIN_LOCK_KEY) == token and cache.touch(
+        OUTBOX_DRAIN_LOCK_KEY, OUTBOX_DRAIN_LOCK_TIMEOUT
+    )
+
+
+def _drain_outbox(batch_size: int, token: str) -> int:
+    sent = 0
+    while True:
+        batch = list(
+            OutboxMessage.objects.filter(
+                attempts__lt=OUTBOX_MAX_ATTEMPTS
+            ).order_by("id")[:batch_size]
+        )
+        if not batch:
+            return sent
+
+        delivered = []
+        for outbox_message in batch:
+            if not _renew_drain_lock(token):
+                logger.warning("Outbox drain lock lost, stopping")
+                break
+            try:
+                send_telegram_message(outbox_message.message)
+            except Exception:
+                logger.exception(
+                    "Outbox message %s could not be sent", outbox_message.id
+                )
+                OutboxMessage.objects.filter(id=outbox_message.id).update(
+                    attempts=F("attempts") + 1
+                )
+                if outbox_message.attempts + 1 >= OUTBOX_MAX_ATTEMPTS:
+                    logger.error(
+                        "Outbox message %s dead-lettered after %s attempts",
+                        outbox_message.id,
+                        OUTBOX_MAX_ATTEMPTS,
+                    )
+                break
+            delivered.append(outbox_message.id)
+
+        OutboxMessage.objects.filter(id__in=delivered).delete()
+        sent += len(delivered)
+        if len(delivered) < len(batch):
+            return sent
+
+
+def render_overdue_borrowing(
+    email: str, title: str, expected_return_date: date
+) -> str:
+    return (
+        f"*User*: {email},\n"
+        f"*Book*: {title},\n"
+        f"*Expected return date*: {expected_return_date}\n\n"
+    )
+
+
+def split_messages(
+    header: str,
+    entries: Iterable[str],
+    continued_header: str = "",
+    limit: int = TELEGRAM_MESSAGE_LIMIT,
+) -> Iterator[str]:
+    """Pack entries into messages of at most ``limit`` characters"""
+    message = header
+    has_entries = False
+
+    for entry in entries:
+        if has_entries and len(message) + len(entry) > limit:
+            yield message
+            message = continued_header
+        message += entry[:limit - len(message)]
+        has_entries = True
+
+    if has_entries:
+        yield message
+
+
+@shared_task
+def borrowing_overdue() -> int:
+    """
+    Report borrowings that became overdue since the previous run.
+
+    The high-water mark under OVERDUE_MARK_KEY holds the due date and the
+    last borrowing id covered by the previous run, so only loans that fell
+    due since then, or were created or moved past the mark, are reported.
+    They are streamed from the database in chunks and queued in the outbox
+    as several messages that fit Telegram's size limit. Returns the number
+    of messages queued.
+    """
+    due_by = date.today() + timedelta(days=1)
+    last_id = Borrowing.objects.aggregate(last_id=Max("id"))["last_id"] or 0
+    mark = cache.get(OVERDUE_MARK_KEY)
+
+    borrowings = Borrowing.objects.filter(
+        id__lte=last_id,
+        expected_return_date__lte=due_by,
         actual_return_date__isnull=True,
     )
-    if not borrowings:
-        send_telegram_message.delay("*No borrowings overdue today!*")
-        return
-
-    message = "*Today's overdue borrowings*:\n\n"
-    for borrowing in borrowings:
-        message += (
-            f"*User*: {borrowing.user.email},\n"
-            f"*Book*: {borrowing.book.title},\n"
-            f"*Expected return date*: {borrowing.expected_return_date},\n"
-            f"*Actual return date*: {borrowing.actual_return_date}\n\n"
+    if mark:
+        borrowings = borrowings.filter(
+            Q(expected_return_date__gt=date.fromisoformat(mark["due_by"]))
+            | Q(id__gt=mark["last_id"])
         )
 
-    send_telegram_message.delay(message)
+    rows = (
+        borrowings.order_by("expected_return_date", "id")
+        .values_list("user__email", "book__title", "expected_return_date")
+        .iterator(chunk_size=OVERDUE_CHUNK_SIZE)
+    )
+    messages = split_messages(
+        OVERDUE_HEADER,
+        (render_overdue_borrowing(*row) for row in rows),
+        continued_header=OVERDUE_CONTINUED_HEADER,
+    )
+    sent = 0
+    while chunk := list(islice(messages, OUTBOX_BATCH_SIZE)):
+        notify(*chunk)
+        sent += len(chunk)
+
+    if not sent:
+        notify(NO_OVERDUE_MESSAGE)
+
+    # Only move the mark once everything is queued: a crashed run repeats.
+    cache.set(
+        OVERDUE_MARK_KEY,
+        {"due_by": due_by.isoformat(), "last_id": last_id},
+        timeout=None,
+    )
+    return sent
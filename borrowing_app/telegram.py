@@ -0,0 +1,231 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+import requests
+from decouple import config
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.core.cache.backends.redis import RedisCache
+from requests.adapters import HTTPAdapter
+
+TELEGRAM_API_KEY = config("TELEGRAM_API_KEY", None)
+TELEGRAM_API_URL = config("TELEGRAM_API_URL", default="https://api.telegram.org")
+TELEGRAM_MAX_CONCURRENCY = config("TELEGRAM_MAX_CONCURRENCY", default=8, cast=int)
+# Telegram allows a bot about 30 messages per second across all chats, the
+# budget is shared by every worker process through Redis.
+TELEGRAM_RATE_LIMIT = config("TELEGRAM_RATE_LIMIT", default=30, cast=float)
+TELEGRAM_TIMEOUT = config("TELEGRAM_TIMEOUT", default=10, cast=float)
+
+
+# Seconds to wait before sending, "0" to send now. Counts the messages of
+# the current second and honours a pause set by any process.
+RATE_LIMIT_SCRIPT = """
+local now = tonumber(ARGV[2])
+local paused_until = tonumber(redis.call("GET", KEYS[2]) or "0")
+if paused_until > now then
+    return tostring(paused_until - now)
+end
+local count = redis.call("INCR", KEYS[1])
+if count == 1 then
+    redis.call("EXPIRE", KEYS[1], 2)
+end
+if count > tonumber(ARGV[1]) then
+    return tostring(math.floor(now) + 1 - now)
+end
+return "0"
+"""
+PAUSE_SCRIPT = """
+local paused_until = tonumber(redis.call("GET", KEYS[1]) or "0")
+if tonumber(ARGV[1]) > paused_until then
+    redis.call("SET", KEYS[1], ARGV[1], "PX", ARGV[2])
+end
+"""
+
+_scripts = {}
+
+
+def _script(client, source: str):
+    # Calls EVALSHA, loading the script when Redis doesn't know it yet.
+    if source not in _scripts:
+        _scripts[source] = client.register_script(source)
+    return _scripts[source]
+
+
+class RateLimiter:
+    """Thread-safe token bucket, ``rate`` tokens per second"""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.rate, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if now >= self.paused_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = max(
+                    self.paused_until - now, (1 - self.tokens) / self.rate
+                )
+            time.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        """Hold every sender back, e.g. when Telegram answers 429"""
+        with self.lock:
+            self.paused_until = max(
+                self.paused_until, time.monotonic() + seconds
+            )
+
+
+class RedisRateLimiter:
+    """
+    ``rate`` messages per second across every process sharing the cache.
+
+    Sends are counted per second in Redis, a sender finding the second's
+    budget spent waits for the next one. ``pause`` holds back every
+    sender of every process.
+    """
+
+    timer = staticmethod(time.time)
+    sleep = staticmethod(time.sleep)
+
+    def __init__(self, rate: float, key: str = "telegram:rate"):
+        self.rate = rate
+        self.key = key
+        self.backend = caches[DEFAULT_CACHE_ALIAS]
+
+    def run(self, source: str, keys: list[str], args: list) -> str:
+        keys = [self.backend.make_and_validate_key(key) for key in keys]
+        client = self.backend._cache.get_client(keys[0], write=True)
+        return _script(client, source)(keys=keys, args=args, client=client)
+
+    def acquire(self) -> None:
+        while True:
+            now = self.timer()
+            wait = float(
+                self.run(
+                    RATE_LIMIT_SCRIPT,
+                    [f"{self.key}:{int(now)}", f"{self.key}:paused"],
+                    [self.rate, repr(now)],
+                )
+            )
+            if wait <= 0:
+                return
+            self.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        """Hold every sender back, e.g. when Telegram answers 429"""
+        self.run(
+            PAUSE_SCRIPT,
+            [f"{self.key}:paused"],
+            [repr(self.timer() + seconds), int(seconds * 1000) + 1000],
+        )
+
+
+def get_rate_limiter(rate: float):
+    """Shared through Redis, per process with other cache backends"""
+    if isinstance(caches[DEFAULT_CACHE_ALIAS], RedisCache):
+        return RedisRateLimiter(rate)
+    return RateLimiter(rate)
+
+
+@dataclass
+class Delivery:
+    chat_id: str
+    delivered: bool
+    status_code: int | None = None
+    retry_after: float | None = None
+    error: str | None = None
+
+    @property
+    def retryable(self) -> bool:
+        """Network errors, 429 and 5xx are worth retrying, other 4xx not"""
+        return not self.delivered and (
+            self.status_code is None
+            or self.status_code == 429
+            or self.status_code >= 500
+        )
+
+
+class TelegramDispatcher:
+    """
+    Sends bot messages over a pooled HTTP session.
+
+    A broadcast fans out to the chats on at most ``max_concurrency``
+    threads while a rate limiter shared by the worker processes keeps the
+    bot under Telegram's rate limit. A ``retry_after`` from Telegram
+    pauses every sender.
+    """
+
+    def __init__(
+        self,
+        api_key: str | None = TELEGRAM_API_KEY,
+        api_url: str = TELEGRAM_API_URL,
+        max_concurrency: int = TELEGRAM_MAX_CONCURRENCY,
+        rate_limit: float = TELEGRAM_RATE_LIMIT,
+        timeout: float = TELEGRAM_TIMEOUT,
+    ):
+        self.url = f"{api_url}/bot{api_key}/sendMessage"
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.mount(
+            api_url, HTTPAdapter(pool_maxsize=max_concurrency)
+        )
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency)
+        self.limiter = get_rate_limiter(rate_limit)
+
+    def send(self, chat_id: str, text: str) -> Delivery:
+        self.limiter.acquire()
+        payload = {"chat_id": chat_id, "text": text, "parse_mode": "Markdown"}
+        try:
+            response = self.session.post(
+                self.url, data=payload, timeout=self.timeout
+            )
+        except requests.RequestException as error:
+            return Delivery(chat_id, False, error=str(error))
+
+        if response.status_code == 200:
+            return Delivery(chat_id, True, status_code=200)
+
+        try:
+            body = response.json()
+        except ValueError:
+            body = {}
+        retry_after = (body.get("parameters") or {}).get("retry_after")
+        if retry_after:
+            self.limiter.pause(retry_after)
+
+        return Delivery(
+            chat_id,
+            False,
+            status_code=response.status_code,
+            retry_after=retry_after,
+            error=body.get("description") or response.text,
+        )
+
+    def broadcast(self, chat_ids: list[str], text: str) -> list[Delivery]:
+        return list(
+            self.executor.map(lambda chat_id: self.send(chat_id, text), chat_ids)
+        )
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher() -> TelegramDispatcher:
+    """One dispatcher per process, so connections are reused across tasks"""
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = TelegramDispatcher()
+        return _dispatcher
@@ -1,14 +1,51 @@
-from datetime import date, timedelta
+import io
+import json
+import random
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
 from decimal import Decimal
+from unittest.mock import patch
 
+import stripe
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from rest_framework import status
+from rest_framework import serializers, status
+from rest_framework.settings import api_settings
 from rest_framework.test import APIClient, APITestCase
 
-from borrowing_app.models import Borrowing
+from LibraryService.dataset import generate_dataset, generate_loans
+from LibraryService.loadtest import loadtest, parse_mix, percentile
+from LibraryService.testing import LocalHTTPStub, QueryBudgetMixin
+from LibraryService.throttling import (
+    UserRateThrottle,
+    reset_throttle,
+)
+from borrowing_app.cache import borrowing_versions
+from borrowing_app.models import Borrowing, OutboxMessage
+from borrowing_app.tasks import (
+    NO_OVERDUE_MESSAGE,
+    OUTBOX_DRAIN_LOCK_KEY,
+    OVERDUE_MARK_KEY,
+    TELEGRAM_MESSAGE_LIMIT,
+    borrowing_overdue,
+    drain_outbox,
+    send_telegram_message,
+    send_telegram_message_to_chat,
+)
+from borrowing_app.telegram import RedisRateLimiter, TelegramDispatcher
+from payment_app.tasks import create_payment_session
+from borrowing_app.serializers import BorrowingReturnSerializer
+from borrowing_app.views import BorrowingViewSet
 from books_app.models import Book
 from payment_app.models import Payment
+from payment_app.views import PaymentViewSet
+from user.models import UserAccountSummary
 
 User = get_user_model()
 BORROWING_URL = reverse("borrowing_app:borrowing-list")
@@ -30,6 +67,7 @@ class AuthenticatedBorrowingTests(APITestCase):
             email="test@test.test", password="passwordQq1"
         )
         self.client.force_authenticate(user=self.user)
+        reset_throttle("return_book", self.user.pk)
         self.book = Book.objects.create(
             title="Test Book",
             author="Author",
@@ -143,3 +181,1210 @@ class AuthenticatedBorrowingTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data), 1)
         self.assertEqual(response.data[0]["id"], borrowing.id)
+
+    def test_get_borrowings_keyset_pages(self):
+        borrowings = [
+            Borrowing.objects.create(
+                user=self.user,
+                book=self.book,
+                expected_return_date=date.today() + timedelta(days=7),
+            )
+            for _ in range(5)
+        ]
+        Borrowing.objects.filter(id=borrowings[0].id).update(
+            borrow_date=date.today() + timedelta(days=1)
+        )
+
+        seen = []
+        response = self.client.get(BORROWING_URL, {"cursor": "", "limit": 2})
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn("count", response.data)
+            seen.extend(row["id"] for row in response.data["results"])
+            if response.data["next"] is None:
+                break
+            response = self.client.get(response.data["next"])
+
+        expected = [borrowings[0].id] + [b.id for b in reversed(borrowings[1:])]
+        self.assertEqual(seen, expected)
+
+    def test_get_borrowings_invalid_cursor(self):
+        response = self.client.get(BORROWING_URL, {"cursor": "not-a-cursor"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_batch_borrow_success(self):
+        other_book = Book.objects.create(
+            title="Other Book",
+            author="Author",
+            cover=Book.CoverType.HARD,
+            inventory=2,
+            daily_fee=Decimal("2.00"),
+        )
+        payload = {
+            "expected_return_date": (date.today() + timedelta(days=7)).isoformat(),
+            "books": [self.book.id, other_book.id, other_book.id],
+        }
+        response = self.client.post(
+            reverse("borrowing_app:borrowing-batch-create"), payload, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data["borrowings"]), 3)
+
+        self.book.refresh_from_db()
+        other_book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 9)
+        self.assertEqual(other_book.inventory, 0)
+        self.assertEqual(
+            Borrowing.objects.filter(user=self.user, book=other_book).count(), 2
+        )
+
+    def test_batch_borrow_is_all_or_nothing(self):
+        other_book = Book.objects.create(
+            title="Other Book",
+            author="Author",
+            cover=Book.CoverType.HARD,
+            inventory=1,
+            daily_fee=Decimal("2.00"),
+        )
+        payload = {
+            "expected_return_date": (date.today() + timedelta(days=7)).isoformat(),
+            "books": [self.book.id, other_book.id, other_book.id],
+        }
+        response = self.client.post(
+            reverse("borrowing_app:borrowing-batch-create"), payload, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Borrowing.objects.exists())
+
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 10)
+
+    def test_batch_borrow_checkout_race_rolls_back(self):
+        other_book = Book.objects.create(
+            title="Other Book",
+            author="Author",
+            cover=Book.CoverType.HARD,
+            inventory=1,
+            daily_fee=Decimal("2.00"),
+        )
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                self.assertFalse(
+                    Book.objects.checkout_many({self.book.id: 1, other_book.id: 2})
+                )
+                raise RuntimeError
+
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 10)
+
+    def test_export_borrowings_staff_only(self):
+        response = self.client.get(reverse("borrowing_app:borrowing-export"))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_export_borrowings_csv_and_resume(self):
+        staff_user = User.objects.create_user(
+            email="staff@test.test", password="passwordQq1", is_staff=True
+        )
+        self.client.force_authenticate(user=staff_user)
+        borrowings = [
+            Borrowing.objects.create(
+                user=self.user,
+                book=self.book,
+                expected_return_date=date.today() + timedelta(days=7),
+            )
+            for _ in range(3)
+        ]
+        Payment.objects.create(borrowing=borrowings[0], money_to_pay="2.00")
+        url = reverse("borrowing_app:borrowing-export")
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(",")[:2], ["id", "borrow_date"])
+        self.assertEqual(len(lines), 4)
+        self.assertIn("PENDING", lines[1])
+
+        response = self.client.get(
+            url, {"file_format": "ndjson", "after_id": borrowings[0].id}
+        )
+        rows = [
+            json.loads(line)
+            for line in b"".join(response.streaming_content).splitlines()
+        ]
+        self.assertEqual([row["id"] for row in rows], [b.id for b in borrowings[1:]])
+        self.assertEqual(rows[0]["user__email"], self.user.email)
+
+    def test_export_payments_filters_by_user(self):
+        staff_user = User.objects.create_user(
+            email="staff@test.test", password="passwordQq1", is_staff=True
+        )
+        self.client.force_authenticate(user=staff_user)
+        borrowing = Borrowing.objects.create(
+            user=self.user,
+            book=self.book,
+            expected_return_date=date.today() + timedelta(days=7),
+        )
+        Payment.objects.create(borrowing=borrowing, money_to_pay="2.00")
+        url = reverse("payment_app:payment-export")
+
+        response = self.client.get(url, {"file_format": "ndjson", "user_id": self.user.id})
+        rows = b"".join(response.streaming_content).splitlines()
+        self.assertEqual(len(rows), 1)
+
+        response = self.client.get(url, {"file_format": "ndjson", "user_id": staff_user.id})
+        self.assertEqual(b"".join(response.streaming_content), b"")
+
+
+@override_settings(ROOT_URLCONF="LibraryService.async_urls")
+class AsyncBorrowingTests(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email="test@test.test", password="passwordQq1"
+        )
+        other = User.objects.create_user(
+            email="other@test.test", password="passwordQq1"
+        )
+        book = Book.objects.create(
+            title="Test Book",
+            author="Test Author",
+            cover="HARD",
+            inventory=5,
+            daily_fee=Decimal("1.00"),
+        )
+        self.borrowings = [
+            Borrowing.objects.create(
+                user=user,
+                book=book,
+                expected_return_date=date.today() + timedelta(days=7),
+            )
+            for user in (self.user, self.user, self.user, other)
+        ]
+        self.client.force_authenticate(user=self.user)
+
+    def test_unauthenticated(self):
+        self.client.force_authenticate(user=None)
+        response = self.client.get(reverse("async-borrowing-list"))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertIn("WWW-Authenticate", response)
+
+    def test_list_matches_sync_view(self):
+        for params in (
+            {},
+            {"is_active": "true"},
+            {"limit": 2},
+            {"fields": "id,book", "expand": "book,payment"},
+        ):
+            response = self.client.get(reverse("async-borrowing-list"), params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            # Page links point back at the async view.
+            self.assertEqual(
+                response.content.decode().replace("/api/async/", "/api/"),
+                self.client.get(BORROWING_URL, params).content.decode(),
+            )
+
+    def test_not_modified_until_a_borrowing_changes(self):
+        url = reverse("async-borrowing-list")
+        etag = self.client.get(url)["ETag"]
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertIn("private", response["Cache-Control"])
+
+        self.borrowings[0].save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_keyset_pages(self):
+        seen = []
+        response = self.client.get(
+            reverse("async-borrowing-list"), {"cursor": "", "limit": 2}
+        )
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            seen.extend(row["id"] for row in response.json()["results"])
+            if response.json()["next"] is None:
+                break
+            response = self.client.get(response.json()["next"])
+
+        self.assertEqual(seen, [b.id for b in reversed(self.borrowings[:3])])
+
+    def test_detail_is_limited_to_own_borrowings(self):
+        own, foreign = self.borrowings[0], self.borrowings[-1]
+        url = reverse("async-borrowing-detail", args=[own.id])
+        self.assertEqual(
+            self.client.get(url).content,
+            self.client.get(f"{BORROWING_URL}{own.id}/").content,
+        )
+
+        url = reverse("async-borrowing-detail", args=[foreign.id])
+        self.assertEqual(
+            self.client.get(url).status_code, status.HTTP_404_NOT_FOUND
+        )
+
+
+class BorrowingConditionalGetTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="test@test.test", password="passwordQq1"
+        )
+        self.other = User.objects.create_user(
+            email="other@test.test", password="passwordQq1"
+        )
+        self.staff = User.objects.create_user(
+            email="staff@test.test", password="passwordQq1", is_staff=True
+        )
+        self.book = Book.objects.create(
+            title="Test Book",
+            author="Author",
+            inventory=10,
+            daily_fee=Decimal("1.00"),
+        )
+        self.borrowing = self.borrow(self.user)
+
+    def borrow(self, user):
+        return Borrowing.objects.create(
+            user=user,
+            book=self.book,
+            expected_return_date=date.today() + timedelta(days=7),
+        )
+
+    def revalidate(self, user, etag, url=BORROWING_URL):
+        self.client.force_authenticate(user=user)
+        return self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def etag(self, user, url=BORROWING_URL):
+        self.client.force_authenticate(user=user)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("private", response["Cache-Control"])
+        return response["ETag"]
+
+    def test_unchanged_list_is_not_modified(self):
+        detail_url = f"{BORROWING_URL}{self.borrowing.id}/"
+        for url in (BORROWING_URL, detail_url):
+            etag = self.etag(self.user, url)
+            with self.assertNumQueries(0):
+                response = self.revalidate(self.user, etag, url)
+            self.assertEqual(
+                response.status_code, status.HTTP_304_NOT_MODIFIED
+            )
+
+    def test_etag_is_per_user(self):
+        etag = self.etag(self.user)
+        self.assertEqual(
+            self.revalidate(self.other, etag).status_code,
+            status.HTTP_200_OK,
+        )
+
+    def test_writes_change_the_etags_they_affect(self):
+        user_etag = self.etag(self.user)
+        staff_etag = self.etag(self.staff)
+
+        self.borrow(self.other)
+        self.assertEqual(
+            self.revalidate(self.user, user_etag).status_code,
+            status.HTTP_304_NOT_MODIFIED,
+        )
+        self.assertEqual(
+            self.revalidate(self.staff, staff_etag).status_code,
+            status.HTTP_200_OK,
+        )
+
+        Payment.objects.create(
+            borrowing=self.borrowing,
+            type=Payment.Type.PAYMENT,
+            money_to_pay=Decimal("1.00"),
+        )
+        response = self.revalidate(self.user, user_etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNotNone(response.data["results"][0]["payment"])
+
+    def test_payment_save_reads_only_the_user_id(self):
+        Payment.objects.create(
+            borrowing=self.borrowing, money_to_pay=Decimal("1.00")
+        )
+        payment = Payment.objects.get()
+        user_etag = self.etag(self.user)
+
+        with CaptureQueriesContext(connection) as queries:
+            payment.save()
+        self.assertEqual(len(queries), 2)
+        self.assertIn(
+            'SELECT "borrowing_app_borrowing"."user_id"', queries[1]["sql"]
+        )
+        self.assertEqual(
+            self.revalidate(self.user, user_etag).status_code,
+            status.HTTP_200_OK,
+        )
+
+
+class FieldsetTests(APITestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user(
+            email="staff@test.test", password="passwordQq1", is_staff=True
+        )
+        self.client.force_authenticate(user=self.staff)
+        self.book = Book.objects.create(
+            title="Test Book",
+            author="Author",
+            inventory=10,
+            daily_fee=Decimal("1.00"),
+        )
+        self.borrowing = Borrowing.objects.create(
+            user=self.staff,
+            book=self.book,
+            expected_return_date=date.today() + timedelta(days=7),
+        )
+        self.payment = Payment.objects.create(
+            borrowing=self.borrowing, money_to_pay=Decimal("1.00")
+        )
+
+    def get(self, url, params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response, [query["sql"] for query in queries]
+
+    def test_relations_are_ids_by_default(self):
+        response, queries = self.get(BORROWING_URL, {})
+        row = response.data["results"][0]
+        self.assertEqual(row["book"], self.book.id)
+        self.assertEqual(row["user"], self.staff.id)
+        self.assertEqual(row["payment"], self.payment.id)
+        self.assertNotIn('"books_app_book"', queries[-1])
+
+    def test_expand_nests_and_joins(self):
+        _, plain = self.get(BORROWING_URL, {})
+        response, queries = self.get(
+            BORROWING_URL, {"expand": "book,user,payment"}
+        )
+        row = response.data["results"][0]
+        self.assertEqual(row["book"]["title"], "Test Book")
+        self.assertEqual(row["user"]["email"], "staff@test.test")
+        self.assertEqual(row["payment"]["borrowing"], self.borrowing.id)
+        self.assertEqual(len(queries), len(plain))
+
+    def test_fields_leave_relations_out(self):
+        response, queries = self.get(
+            f"{BORROWING_URL}{self.borrowing.id}/",
+            {"fields": "id,expected_return_date", "expand": "book"},
+        )
+        self.assertEqual(
+            set(response.data), {"id", "expected_return_date"}
+        )
+        self.assertNotIn("JOIN", queries[-1])
+
+    def test_payment_borrowing_expands_nested(self):
+        _, plain = self.get(reverse("payment_app:payment-list"), {})
+        response, queries = self.get(
+            reverse("payment_app:payment-list"),
+            {"expand": "borrowing.book"},
+        )
+        borrowing = response.data["results"][0]["borrowing"]
+        self.assertEqual(borrowing["book"]["title"], "Test Book")
+        self.assertEqual(borrowing["user"], self.staff.id)
+        self.assertEqual(len(queries), len(plain))
+
+    def test_unknown_names_are_rejected(self):
+        for params in (
+            {"fields": "id,secret"},
+            {"expand": "borrow_date"},
+            {"expand": "book.author"},
+        ):
+            response = self.client.get(BORROWING_URL, params)
+            self.assertEqual(
+                response.status_code, status.HTTP_400_BAD_REQUEST
+            )
+
+
+class QueryBudgetTests(QueryBudgetMixin, APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.staff_user = User.objects.create_user(
+            email="staff@test.test", password="passwordQq1", is_staff=True
+        )
+        self.client.force_authenticate(user=self.staff_user)
+        self.book = Book.objects.create(
+            title="Test Book",
+            author="Author",
+            cover=Book.CoverType.SOFT,
+            inventory=10,
+            daily_fee=Decimal("1.00"),
+        )
+
+    def populate(self, size):
+        existing = Borrowing.objects.count()
+        borrowings = Borrowing.objects.bulk_create(
+            Borrowing(
+                user=self.staff_user,
+                book=self.book,
+                expected_return_date=date.today() + timedelta(days=7),
+            )
+            for _ in range(size - existing)
+        )
+        Payment.objects.bulk_create(
+            Payment(borrowing=borrowing, money_to_pay="1.00")
+            for borrowing in borrowings[::2]
+        )
+
+    def test_borrowing_list_budget(self):
+        self.assertWithinQueryBudget(
+            BORROWING_URL, BorrowingViewSet, "list", self.populate
+        )
+
+    def test_expanded_borrowing_list_budget(self):
+        self.assertWithinQueryBudget(
+            f"{BORROWING_URL}?expand=book,user,payment",
+            BorrowingViewSet,
+            "list",
+            self.populate,
+        )
+
+    def test_borrowing_retrieve_budget(self):
+        self.populate(1)
+        url = reverse(
+            "borrowing_app:borrowing-detail",
+            args=[Borrowing.objects.filter(payment__isnull=False).first().id],
+        )
+        self.assertWithinQueryBudget(
+            url, BorrowingViewSet, "retrieve", self.populate
+        )
+
+    def test_payment_list_budget(self):
+        self.assertWithinQueryBudget(
+            reverse("payment_app:payment-list"),
+            PaymentViewSet,
+            "list",
+            self.populate,
+        )
+
+    def test_expanded_payment_list_budget(self):
+        self.assertWithinQueryBudget(
+            reverse("payment_app:payment-list")
+            + "?expand=borrowing.book,borrowing.user",
+            PaymentViewSet,
+            "list",
+            self.populate,
+        )
+
+
+class ThrottleTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="test@test.test", password="passwordQq1"
+        )
+        reset_throttle("user", self.user.pk)
+        reset_throttle("return_book", self.user.pk)
+        self.now = 6000.0
+        self.throttle_class = type(
+            "TestThrottle",
+            (UserRateThrottle,),
+            {"rate": "10/min", "timer": lambda throttle: self.now},
+        )
+
+    def allowed(self, count):
+        request = APIClient().get("/").wsgi_request
+        request.user = self.user
+        throttles = [self.throttle_class() for _ in range(count)]
+        return [
+            throttle.allow_request(request, None) for throttle in throttles
+        ], throttles[-1]
+
+    def test_window_slides(self):
+        allowed, throttle = self.allowed(11)
+        self.assertEqual(allowed, [True] * 10 + [False])
+        self.assertEqual(throttle.wait(), 60)
+
+        # Half of the previous window still counts, 5 requests.
+        self.now += 90
+        allowed, throttle = self.allowed(6)
+        self.assertEqual(allowed, [True] * 5 + [False])
+        self.assertAlmostEqual(throttle.wait(), 6)
+
+        self.now += 6
+        self.assertEqual(self.allowed(1)[0], [True])
+
+    def test_concurrent_requests_never_exceed_the_limit(self):
+        request = APIClient().get("/").wsgi_request
+        request.user = self.user
+        admitted = []
+
+        def hammer():
+            for _ in range(5):
+                admitted.append(
+                    self.throttle_class().allow_request(request, None)
+                )
+
+        threads = [threading.Thread(target=hammer) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(admitted.count(True), 10)
+
+    @patch.dict(api_settings.DEFAULT_THROTTLE_RATES, return_book="1/hour")
+    def test_return_book_has_its_own_limit(self):
+        self.client.force_authenticate(user=self.user)
+        book = Book.objects.create(
+            title="Test Book",
+            author="Author",
+            inventory=10,
+            daily_fee=Decimal("1.00"),
+        )
+        borrowings = [
+            Borrowing.objects.create(
+                user=self.user,
+                book=book,
+                expected_return_date=date.today() + timedelta(days=7),
+            )
+            for _ in range(2)
+        ]
+        with patch("payment_app.tasks.create_payment_session.delay"):
+            responses = [
+                self.client.post(
+                    reverse(
+                        "borrowing_app:borrowing-return-book",
+                        args=[borrowing.id],
+                    ),
+                    HTTP_PREFER="respond-async",
+                )
+                for borrowing in borrowings
+            ]
+        self.assertEqual(responses[0].status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(
+            responses[1].status_code, status.HTTP_429_TOO_MANY_REQUESTS
+        )
+        self.assertIn("Retry-After", responses[1])
+        self.assertEqual(
+            self.client.get(BORROWING_URL).status_code, status.HTTP_200_OK
+        )
+
+
+class BorrowingOverdueTaskTests(TestCase):
+    def setUp(self):
+        cache.delete(OVERDUE_MARK_KEY)
+        self.addCleanup(cache.delete, OVERDUE_MARK_KEY)
+        self.user = User.objects.create_user(
+            email="test@test.test", password="passwordQq1"
+        )
+        self.book = Book.objects.create(
+            title="A rather long book title " * 8,
+            author="Author",
+            inventory=500,
+            daily_fee=Decimal("1.00"),
+        )
+
+    def create_overdue(self, count, days_ago=1):
+        return Borrowing.objects.bulk_create(
+            Borrowing(
+                user=self.user,
+                book=self.book,
+                expected_return_date=date.today() - timedelta(days=days_ago),
+            )
+            for _ in range(count)
+        )
+
+    def run_task(self):
+        borrowing_overdue()
+        messages = list(OutboxMessage.objects.values_list("message", flat=True))
+        OutboxMessage.objects.all().delete()
+        return messages
+
+    def test_digest_is_split_at_telegram_limit(self):
+        self.create_overdue(150)
+
+        messages = self.run_task()
+        self.assertGreater(len(messages), 1)
+        self.assertTrue(
+            all(len(message) <= TELEGRAM_MESSAGE_LIMIT for message in messages)
+        )
+        self.assertEqual(
+            sum(message.count("*User*") for message in messages), 150
+        )
+
+    def test_only_new_overdue_borrowings_are_reported(self):
+        self.create_overdue(3, days_ago=3)
+        self.assertEqual(self.run_task()[0].count("*User*"), 3)
+        self.assertEqual(self.run_task(), [NO_OVERDUE_MESSAGE])
+
+        self.create_overdue(2, days_ago=0)
+        self.assertEqual(self.run_task()[0].count("*User*"), 2)
+
+        old = Borrowing.objects.order_by("id").first()
+        Borrowing.objects.filter(id=old.id).update(
+            expected_return_date=date.today() + timedelta(days=2)
+        )
+        self.assertEqual(self.run_task(), [NO_OVERDUE_MESSAGE])
+
+
+class OutboxTests(TestCase):
+    def setUp(self):
+        cache.delete(OUTBOX_DRAIN_LOCK_KEY)
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email="test@test.test", password="passwordQq1"
+        )
+        self.client.force_authenticate(user=self.user)
+        self.book = Book.objects.create(
+            title="Test Book",
+            author="Author",
+            inventory=1,
+            daily_fee=Decimal("1.00"),
+        )
+        self.payload = {
+            "expected_return_date": (date.today() + timedelta(days=7)).isoformat(),
+            "book": self.book.id,
+        }
+
+    @patch("borrowing_app.tasks.send_telegram_message.delay")
+    def test_borrowing_is_announced_through_outbox(self, delay):
+        response = self.client.post(BORROWING_URL, self.payload)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        delay.assert_not_called()
+        message = OutboxMessage.objects.get().message
+        self.assertIn("*Borrowed book*: Test Book", message)
+
+    def test_failed_borrowing_is_not_announced(self):
+        self.book.inventory = 0
+        self.book.save()
+        self.client.post(BORROWING_URL, self.payload)
+        self.client.post(
+            reverse("borrowing_app:borrowing-batch-create"),
+            {**self.payload, "books": [self.book.id]},
+            format="json",
+        )
+        self.assertFalse(OutboxMessage.objects.exists())
+
+    @patch("borrowing_app.tasks.send_telegram_message")
+    def test_drain_sends_in_order_and_deletes(self, send):
+        OutboxMessage.objects.bulk_create(
+            OutboxMessage(message=str(number)) for number in range(5)
+        )
+
+        self.assertEqual(drain_outbox(batch_size=2), 5)
+        self.assertEqual(
+            [call.args[0] for call in send.call_args_list],
+            ["0", "1", "2", "3", "4"],
+        )
+        self.assertFalse(OutboxMessage.objects.exists())
+
+    @patch("borrowing_app.tasks.send_telegram_message")
+    def test_drain_stops_at_failing_message(self, send):
+        send.side_effect = [None, RuntimeError("broker down"), None, None]
+        OutboxMessage.objects.bulk_create(
+            OutboxMessage(message=str(number)) for number in range(3)
+        )
+
+        self.assertEqual(drain_outbox(), 1)
+        remaining = list(OutboxMessage.objects.values_list("message", "attempts"))
+        self.assertEqual(remaining, [("1", 1), ("2", 0)])
+
+        self.assertEqual(drain_outbox(), 2)
+        self.assertFalse(OutboxMessage.objects.exists())
+
+    @patch("borrowing_app.tasks.OUTBOX_MAX_ATTEMPTS", 2)
+    @patch("borrowing_app.tasks.send_telegram_message")
+    def test_drain_dead_letters_a_failing_message(self, send):
+        def fail_first(message):
+            if message == "0":
+                raise RuntimeError("bad message")
+
+        send.side_effect = fail_first
+        OutboxMessage.objects.bulk_create(
+            OutboxMessage(message=str(number)) for number in range(3)
+        )
+
+        self.assertEqual(drain_outbox(), 0)
+        self.assertEqual(drain_outbox(), 0)
+        self.assertEqual(drain_outbox(), 2)
+        remaining = list(OutboxMessage.objects.values_list("message", "attempts"))
+        self.assertEqual(remaining, [("0", 2)])
+
+    @patch("borrowing_app.tasks.send_telegram_message")
+    def test_drain_sends_outside_transactions(self, send):
+        depth = len(connection.atomic_blocks)
+        send.side_effect = lambda message: self.assertEqual(
+            len(connection.atomic_blocks), depth
+        )
+        OutboxMessage.objects.create(message="0")
+
+        self.assertEqual(drain_outbox(), 1)
+        self.assertIsNone(cache.get(OUTBOX_DRAIN_LOCK_KEY))
+
+    @patch("borrowing_app.tasks.send_telegram_message")
+    def test_one_drainer_at_a_time(self, send):
+        OutboxMessage.objects.create(message="0")
+        cache.set(OUTBOX_DRAIN_LOCK_KEY, "other drainer")
+        try:
+            self.assertEqual(drain_outbox(), 0)
+        finally:
+            cache.delete(OUTBOX_DRAIN_LOCK_KEY)
+        send.assert_not_called()
+        self.assertEqual(drain_outbox(), 1)
+
+
+def stripe_handler(method, path, body):
+    """Answer like Stripe's checkout session endpoints"""
+    expires_at = datetime.now(timezone.utc) + timedelta(hours=24)
+    return 200, {
+        "id": f"cs_test_{time.monotonic_ns()}",
+        "object": "checkout.session",
+        "url": "https://checkout.stripe.test/pay",
+        "expires_at": int(expires_at.timestamp()),
+        "payment_status": "unpaid",
+    }
+
+
+class BorrowingReturnTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="test@test.test", password="passwordQq1"
+        )
+        self.client.force_authenticate(user=self.user)
+        reset_throttle("return_book", self.user.pk)
+        self.book = Book.objects.create(
+            title="Test Book",
+            author="Author",
+            inventory=10,
+            daily_fee=Decimal("1.00"),
+        )
+        self.borrowing = Borrowing.objects.create(
+            user=self.user,
+            book=self.book,
+            expected_return_date=date.today() + timedelta(days=7),
+        )
+        self.url = reverse(
+            "borrowing_app:borrowing-return-book", args=[self.borrowing.id]
+        )
+        self.stripe = LocalHTTPStub(stripe_handler)
+        self.enterContext(self.stripe)
+        self.enterContext(patch("stripe.api_base", self.stripe.url))
+
+    @patch("payment_app.tasks.create_payment_session.delay")
+    def test_async_return_is_accepted_before_session(self, delay):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.url, HTTP_PREFER="respond-async")
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertIsNone(response.data["session_url"])
+        payment = Payment.objects.get(borrowing=self.borrowing)
+        self.assertTrue(
+            response["Location"].endswith(
+                reverse("payment_app:payment-detail", args=[payment.id])
+            )
+        )
+        delay.assert_called_once()
+        self.assertEqual(delay.call_args.args[0], payment.id)
+        self.assertEqual(self.stripe.requests, [])
+
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 11)
+
+    @patch("payment_app.tasks.create_payment_session.delay")
+    def test_retried_return_reuses_session(self, delay):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f"{self.url}?async=true")
+        success_url, cancel_url = delay.call_args.args[1:]
+        payment = Payment.objects.get(borrowing=self.borrowing)
+
+        session_url = create_payment_session(payment.id, success_url, cancel_url)
+        self.assertEqual(session_url, "https://checkout.stripe.test/pay")
+        self.assertEqual(len(self.stripe.requests), 1)
+        self.assertEqual(self.stripe.requests[0][1], "/v1/checkout/sessions")
+
+        create_payment_session(payment.id, success_url, cancel_url)
+        response = self.client.post(self.url)
+        self.assertEqual(response.status_code, status.HTTP_302_FOUND)
+        self.assertEqual(response.url, session_url)
+        self.assertEqual(len(self.stripe.requests), 1)
+
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 11)
+
+    def test_concurrent_returns_check_the_book_in_once(self):
+        stale = Borrowing.objects.get(pk=self.borrowing.pk)
+        self.client.post(self.url)
+        summary = UserAccountSummary.objects.get(user=self.user)
+        # A second request that loaded the loan before the first committed.
+        BorrowingReturnSerializer().update(stale, {})
+
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 11)
+        self.assertEqual(
+            UserAccountSummary.objects.get(user=self.user).active_borrowings,
+            summary.active_borrowings,
+        )
+        self.assertEqual(stale.actual_return_date, date.today())
+
+    def test_rejected_return_writes_nothing(self):
+        with patch.object(
+            BorrowingReturnSerializer,
+            "validate",
+            side_effect=serializers.ValidationError("Nope"),
+        ):
+            response = self.client.post(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Payment.objects.exists())
+        self.assertFalse(
+            UserAccountSummary.objects.filter(pending_payments__gt=0).exists()
+        )
+        self.borrowing.refresh_from_db()
+        self.assertIsNone(self.borrowing.actual_return_date)
+
+    def test_expired_session_gets_a_new_idempotency_key(self):
+        with patch(
+            "stripe.checkout.Session.create",
+            wraps=stripe.checkout.Session.create,
+        ) as create:
+            self.client.post(self.url)
+            # Expired, as the webhook and the reconciliation record it.
+            Payment.objects.filter(borrowing=self.borrowing).update(
+                session_id=None, session_url=None
+            )
+            self.client.post(self.url)
+
+        first, second = (
+            call.kwargs["idempotency_key"] for call in create.call_args_list
+        )
+        self.assertNotEqual(first, second)
+
+    def test_payment_paid_during_checkout_is_not_sent_to_pay(self):
+        create = stripe.checkout.Session.create
+
+        def pay_meanwhile(**kwargs):
+            session = create(**kwargs)
+            Payment.objects.filter(borrowing=self.borrowing).update(
+                status=Payment.Status.PAID
+            )
+            return session
+
+        with patch("stripe.checkout.Session.create", side_effect=pay_meanwhile):
+            response = self.client.post(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIsNone(
+            Payment.objects.get(borrowing=self.borrowing).session_url
+        )
+
+    def test_expired_session_is_replaced(self):
+        self.client.post(self.url)
+        payment = Payment.objects.get(borrowing=self.borrowing)
+        first_session = payment.session_id
+        payment.session_expires_at = datetime.now(timezone.utc)
+        payment.save()
+
+        response = self.client.post(self.url)
+        self.assertEqual(response.status_code, status.HTTP_302_FOUND)
+        payment.refresh_from_db()
+        self.assertNotEqual(payment.session_id, first_session)
+        self.assertEqual(len(self.stripe.requests), 2)
+
+
+def telegram_handler(replies, delay=0.0):
+    """Answer sendMessage per chat id from ``replies``, 200 by default"""
+
+    def handle(method, path, body):
+        time.sleep(delay)
+        chat_id = dict(
+            pair.split("=", 1) for pair in body.decode().split("&")
+        )["chat_id"]
+        return replies.get(chat_id, (200, {"ok": True}))
+
+    return handle
+
+
+class TelegramDispatcherTests(TestCase):
+    def test_broadcast_reports_every_chat(self):
+        replies = {
+            "2": (
+                429,
+                {
+                    "ok": False,
+                    "description": "Too Many Requests",
+                    "parameters": {"retry_after": 0.1},
+                },
+            ),
+            "3": (400, {"ok": False, "description": "chat not found"}),
+        }
+        with LocalHTTPStub(telegram_handler(replies)) as stub:
+            dispatcher = TelegramDispatcher("key", stub.url)
+            deliveries = dispatcher.broadcast(["1", "2", "3"], "Hello")
+
+        self.assertEqual(len(stub.requests), 3)
+        self.assertTrue(stub.requests[0][1].startswith("/botkey/sendMessage"))
+        self.assertEqual([d.chat_id for d in deliveries], ["1", "2", "3"])
+        self.assertTrue(deliveries[0].delivered)
+        self.assertTrue(deliveries[1].retryable)
+        self.assertEqual(deliveries[1].retry_after, 0.1)
+        self.assertFalse(deliveries[2].retryable)
+        self.assertEqual(deliveries[2].error, "chat not found")
+
+    def test_broadcast_is_concurrent_and_bounded(self):
+        active = peak = 0
+        lock = threading.Lock()
+        # No send is answered before four are in flight, sequential sends
+        # break the barrier and fail.
+        barrier = threading.Barrier(4, timeout=5)
+
+        def handle(method, path, body):
+            nonlocal active, peak
+            with lock:
+                active += 1
+                peak = max(peak, active)
+            try:
+                barrier.wait()
+            except threading.BrokenBarrierError:
+                return 500, {"ok": False, "description": "not concurrent"}
+            finally:
+                with lock:
+                    active -= 1
+            return 200, {"ok": True}
+
+        with LocalHTTPStub(handle) as stub:
+            dispatcher = TelegramDispatcher(
+                "key", stub.url, max_concurrency=4, rate_limit=1000
+            )
+            deliveries = dispatcher.broadcast([str(i) for i in range(12)], "Hi")
+
+        self.assertTrue(all(d.delivered for d in deliveries))
+        self.assertEqual(peak, 4)
+
+    def test_rate_limit_is_shared_across_processes(self):
+        now, sleeps = [1000.25], []
+
+        def sleep(seconds):
+            sleeps.append(seconds)
+            now[0] += seconds
+
+        # One limiter per worker process, sharing Redis.
+        limiters = []
+        for _ in range(2):
+            limiter = RedisRateLimiter(3, key="test:telegram:rate")
+            limiter.timer = lambda: now[0]
+            limiter.sleep = sleep
+            limiters.append(limiter)
+        cache.delete_many(
+            ["test:telegram:rate:1000", "test:telegram:rate:1001",
+             "test:telegram:rate:paused"]
+        )
+
+        for limiter in limiters * 2:
+            limiter.acquire()
+        self.assertEqual(len(sleeps), 1)
+        self.assertAlmostEqual(sleeps[0], 0.75)
+
+        limiters[0].pause(5)
+        limiters[1].acquire()
+        self.assertAlmostEqual(sleeps[1], 5)
+
+    def test_network_error_is_retryable(self):
+        dispatcher = TelegramDispatcher("key", "http://127.0.0.1:9", timeout=1)
+        delivery = dispatcher.send("1", "Hi")
+        self.assertFalse(delivery.delivered)
+        self.assertTrue(delivery.retryable)
+
+
+class SendTelegramMessageTaskTests(TestCase):
+    def run_with_stub(self, task, *args, replies=None):
+        with LocalHTTPStub(telegram_handler(replies or {})) as stub:
+            dispatcher = TelegramDispatcher("key", stub.url)
+            with patch(
+                "borrowing_app.tasks.get_dispatcher", return_value=dispatcher
+            ):
+                return task(*args), stub
+
+    @patch("borrowing_app.tasks.TELEGRAM_CHAT_IDS", ["1", "2", "3"])
+    def test_failed_chats_are_retried_separately(self):
+        replies = {
+            "2": (429, {"ok": False, "parameters": {"retry_after": 7}}),
+            "3": (403, {"ok": False, "description": "bot was blocked"}),
+        }
+        with patch(
+            "borrowing_app.tasks.send_telegram_message_to_chat.apply_async"
+        ) as retry:
+            states, stub = self.run_with_stub(
+                send_telegram_message, "Hello", replies=replies
+            )
+
+        self.assertEqual(
+            states, {"1": "delivered", "2": "retrying", "3": "failed"}
+        )
+        retry.assert_called_once_with(("2", "Hello"), countdown=7)
+
+    def test_chat_task_retries_until_delivered(self):
+        replies = {"1": (502, {"ok": False, "description": "Bad Gateway"})}
+        with patch.object(
+            send_telegram_message_to_chat, "retry", side_effect=RuntimeError
+        ) as retry, self.assertRaises(RuntimeError):
+            self.run_with_stub(
+                send_telegram_message_to_chat, "1", "Hi", replies=replies
+            )
+        self.assertLessEqual(retry.call_args.kwargs["countdown"], 1.5)
+
+        state, stub = self.run_with_stub(send_telegram_message_to_chat, "1", "Hi")
+        self.assertEqual(state, "delivered")
+
+
+class LoadTestTests(TransactionTestCase):
+    def test_percentile_is_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 0.50), 50)
+        self.assertEqual(percentile(values, 0.99), 99)
+        self.assertEqual(percentile([7], 0.95), 7)
+
+    def test_parse_mix(self):
+        self.assertEqual(
+            parse_mix("books=3, borrow_return"), {"books": 3, "borrow_return": 1}
+        )
+
+    def test_in_process_run_reports_every_endpoint(self):
+        report = loadtest(
+            concurrency=2,
+            duration=1,
+            mix={"books": 1, "borrow_return": 1, "payments": 1},
+        )
+
+        self.assertGreater(report["requests"], 0)
+        self.assertIn("GET /api/books/", report["endpoints"])
+        self.assertIn("POST /api/users/token/", report["login"]["endpoints"])
+        books = report["endpoints"]["GET /api/books/"]
+        # The shared in-memory SQLite test database locks whole tables, a
+        # read can fail while a return is written.
+        self.assertIn("200", books["statuses"])
+        self.assertGreater(books["queries_per_request"], 0)
+        self.assertLessEqual(
+            books["latency_ms"]["p50"], books["latency_ms"]["p99"]
+        )
+
+    def test_conditional_run_reports_saved_bytes(self):
+        report = loadtest(
+            concurrency=1,
+            duration=1,
+            mix={"books": 1, "borrowings": 1},
+            conditional=True,
+        )
+
+        self.assertGreater(report["not_modified"], 0)
+        self.assertGreater(report["bytes_saved"], 0)
+        self.assertIn("304", report["endpoints"]["GET /api/books/"]["statuses"])
+
+
+class GenerateDatasetTests(TestCase):
+    def test_dataset_is_consistent(self):
+        staff = get_user_model()(is_staff=True)
+        versions = borrowing_versions(staff)
+
+        created = generate_dataset(
+            users=20,
+            books=10,
+            borrowings=500,
+            today=date(2026, 1, 31),
+            chunk_size=64,
+        )
+
+        self.assertEqual(Borrowing.objects.count(), 500)
+        self.assertEqual(created["payments"], Payment.objects.count())
+        # Returned loans are paid for, open ones are not.
+        self.assertFalse(
+            Payment.objects.filter(
+                borrowing__actual_return_date__isnull=True
+            ).exists()
+        )
+        self.assertEqual(
+            Borrowing.objects.filter(actual_return_date__isnull=False).count(),
+            created["payments"],
+        )
+        self.assertTrue(
+            Borrowing.objects.filter(
+                actual_return_date__isnull=True,
+                expected_return_date__lt=date(2026, 1, 31),
+            ).exists()
+        )
+        open_loans = Borrowing.objects.filter(
+            actual_return_date__isnull=True
+        ).count()
+        self.assertEqual(
+            sum(
+                UserAccountSummary.objects.values_list(
+                    "active_borrowings", flat=True
+                )
+            ),
+            open_loans,
+        )
+
+        fine = (
+            Payment.objects.filter(type=Payment.Type.FINE)
+            .select_related("borrowing__book")
+            .first()
+        )
+        self.assertEqual(fine.money_to_pay, fine.borrowing.fine_payable)
+        # The cached catalog and borrowing lists are retired.
+        self.assertNotEqual(borrowing_versions(staff)[0], versions[0])
+        self.assertNotEqual(borrowing_versions(staff)[1], versions[1])
+
+        with self.assertRaises(CommandError):
+            call_command("generate_dataset", users=1, books=1, borrowings=1)
+
+    def test_same_seed_same_loans(self):
+        def loans(seed):
+            return list(
+                generate_loans(
+                    random.Random(seed),
+                    200,
+                    user_ids=[1, 2, 3],
+                    daily_fees={1: Decimal("1.50"), 2: Decimal("0.25")},
+                    today=date(2026, 1, 31),
+                    first_id=1,
+                )
+            )
+
+        self.assertEqual(loans(7), loans(7))
+        self.assertNotEqual(loans(7), loans(8))
+
+
+class ExplainHotQueriesTests(TransactionTestCase):
+    def setUp(self):
+        user = get_user_model().objects.create_user(
+            email="test@test.test", password="passwordQq1"
+        )
+        book = Book.objects.create(
+            title="Test Book",
+            author="Author",
+            inventory=10,
+            daily_fee=Decimal("1.00"),
+        )
+        Borrowing.objects.create(
+            user=user, book=book, expected_return_date=date.today()
+        )
+
+    def borrowing_indexes(self):
+        with connection.cursor() as cursor:
+            return set(
+                connection.introspection.get_constraints(
+                    cursor, Borrowing._meta.db_table
+                )
+            )
+
+    def test_indexes_are_only_dropped_with_debug(self):
+        with self.assertRaises(CommandError):
+            call_command("explain_hot_queries", drop_indexes=True)
+
+    @patch("borrowing_app.management.commands.explain_hot_queries.DEBUG", True)
+    def test_dropped_indexes_are_restored_on_error(self):
+        indexes = self.borrowing_indexes()
+        self.assertIn("borrowing_open_due_idx", indexes)
+
+        with patch(
+            "borrowing_app.management.commands.explain_hot_queries"
+            ".Command.report",
+            side_effect=RuntimeError,
+        ):
+            with self.assertRaises(RuntimeError):
+                call_command(
+                    "explain_hot_queries", drop_indexes=True, stdout=io.StringIO()
+                )
+
+        self.assertEqual(self.borrowing_indexes(), indexes)
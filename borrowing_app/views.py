@@ -1,3 +1,7 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models import F, QuerySet
 from django.shortcuts import redirect
 from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import (
@@ -13,49 +17,110 @@ from rest_framework.mixins import (
     ListModelMixin,
     RetrieveModelMixin,
 )
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.reverse import reverse
+from rest_framework.settings import api_settings
 from rest_framework.viewsets import GenericViewSet
 
+from LibraryService.conditional import conditional_response
+from LibraryService.exports import (
+    EXPORT_PARAMETERS,
+    export_response,
+    parse_export_params,
+)
+from LibraryService.fieldsets import (
+    FIELDSET_PARAMETERS,
+    FieldsetViewMixin,
+    select_expanded,
+)
+from LibraryService.pagination import KeysetPagination
+from LibraryService.throttling import ScopedRateThrottle
+from LibraryService.values import ValuesViewMixin
+from borrowing_app.cache import borrowing_versions
+from borrowing_app.filters import (
+    BORROWING_FILTER_PARAMETERS,
+    filter_borrowings,
+)
 from borrowing_app.models import Borrowing
 from borrowing_app.serializers import (
     BorrowingSerializer,
+    BorrowingBatchSerializer,
     BorrowingListSerializer,
     BorrowingReturnSerializer,
 )
+from payment_app.checkout import checkout_urls, has_valid_session
 from payment_app.models import Payment
+from payment_app.serializers import PaymentSerializer
+from payment_app.tasks import create_payment_session
 from payment_app.views import PaymentViewSet
-from .tasks import send_telegram_message
+from user.models import UserAccountSummary
+from .tasks import notify
+
+
+def prefers_async(request) -> bool:
+    """``?async=true`` or an RFC 7240 ``Prefer: respond-async`` header"""
+    if request.query_params.get("async", "").lower() in ("1", "true", "yes"):
+        return True
+    prefer = request.headers.get("Prefer", "")
+    return "respond-async" in (token.strip() for token in prefer.split(","))
+
+
+class BorrowingPagination(KeysetPagination):
+    ordering = ("-borrow_date", "-id")
+
+
+def select_fieldset(
+    queryset: QuerySet, fields: list[str] | None, expand: dict
+) -> QuerySet:
+    """Join what ``BorrowingListSerializer`` expands, nothing else"""
+    queryset = select_expanded(queryset, expand)
+    if "payment" not in expand and (fields is None or "payment" in fields):
+        queryset = queryset.annotate(payment_id=F("payment__id"))
+    return queryset
+
+
+BORROWING_EXPORT_FIELDS = (
+    "id",
+    "borrow_date",
+    "expected_return_date",
+    "actual_return_date",
+    "book_id",
+    "book__title",
+    "user_id",
+    "user__email",
+    "payment__id",
+    "payment__status",
+    "payment__type",
+    "payment__money_to_pay",
+)
 
 
 @extend_schema_view(
     list=extend_schema(
         summary="Retrieve a list of borrowings",
-        description="Retrieve a list of all books. Accessible by authenticated user.",
-        parameters=[
-            OpenApiParameter(
-                name="is_active",
-                description=(
-                    "Filter borrowing list by actual return date"
-                    "(ex. ?is_active=true)"
-                ),
-                required=False,
-                type=OpenApiTypes.BOOL,
-            ),
-            OpenApiParameter(
-                name="user_id",
-                description=(
-                    "Filter borrowing list by user id, only for admins"
-                    "(ex. ?user_id=5)"
-                ),
-                required=False,
-                type=OpenApiTypes.INT,
-            ),
-        ],
+        description=(
+            "Retrieve a list of borrowings. The book, user and payment are "
+            "ids unless listed in ?expand=. Accessible by authenticated user."
+        ),
+        parameters=BORROWING_FILTER_PARAMETERS + FIELDSET_PARAMETERS,
         responses={200: BorrowingListSerializer(many=True)},
         examples=[
             OpenApiExample(
                 "Borrowing list example",
+                value={
+                    "id": 1,
+                    "borrow_date": "2024-06-18",
+                    "expected_return_date": "2024-06-18",
+                    "actual_return_date": "2024-06-18",
+                    "book": 1,
+                    "user": 1,
+                    "payment": 1,
+                },
+            ),
+            OpenApiExample(
+                "Expanded borrowing list example",
+                description="?expand=book,user,payment",
                 value={
                     "id": 1,
                     "borrow_date": "2024-06-18",
@@ -90,6 +155,7 @@ from .tasks import send_telegram_message
     retrieve=extend_schema(
         summary="Retrieve a single borrowing",
         description="Retrieve the details of a specific borrowing by its ID. Accessible by authenticated user.",
+        parameters=FIELDSET_PARAMETERS,
         responses={200: BorrowingListSerializer}
     ),
     create=extend_schema(
@@ -99,55 +165,168 @@ from .tasks import send_telegram_message
     ),
 )
 class BorrowingViewSet(
-    CreateModelMixin, ListModelMixin, RetrieveModelMixin, GenericViewSet
+    ValuesViewMixin,
+    FieldsetViewMixin,
+    CreateModelMixin,
+    ListModelMixin,
+    RetrieveModelMixin,
+    GenericViewSet,
 ):
     queryset = Borrowing.objects.all()
     serializer_class = BorrowingSerializer
     permission_classes = (IsAuthenticated,)
+    pagination_class = BorrowingPagination
+    query_budget = {"list": 2, "retrieve": 1}
+    throttle_scope = None
 
     def get_queryset(self):
-        queryset = self.queryset.select_related("user", "book")
-        user = self.request.user
-
-        if not user.is_staff:
-            queryset = queryset.filter(user=user)
+        if self.action in self.fieldset_actions:
+            # Not for return_book, it may create the payment after the
+            # borrowing is loaded.
+            queryset = select_fieldset(self.queryset, *self.get_fieldset())
         else:
-            user_id = self.request.query_params.get("user_id")
-            if user_id:
-                queryset = queryset.filter(user__id=user_id)
-
-        is_active = self.request.query_params.get("is_active")
-        if is_active is not None:
-            if is_active.lower() == "true":
-                queryset = queryset.filter(actual_return_date__isnull=True)
-            elif is_active.lower() == "false":
-                queryset = queryset.exclude(actual_return_date__isnull=True)
-
-        return queryset
+            queryset = self.queryset.select_related("user", "book")
+        return filter_borrowings(queryset, self.request)
 
     def get_serializer_class(self):
         if self.action in ("list", "retrieve"):
             return BorrowingListSerializer
         elif self.action == "return_book":
             return BorrowingReturnSerializer
+        elif self.action == "batch_create":
+            return BorrowingBatchSerializer
         return self.serializer_class
 
+    def list(self, request, *args, **kwargs):
+        return conditional_response(
+            request,
+            borrowing_versions(request.user),
+            partial(super().list, request, *args, **kwargs),
+            private=True,
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return conditional_response(
+            request,
+            borrowing_versions(request.user),
+            partial(super().retrieve, request, *args, **kwargs),
+            private=True,
+        )
+
+    @transaction.atomic
     def perform_create(self, serializer):
         instance = serializer.save(user=self.request.user)
 
-        message = (
+        notify(
             f"*User*: {self.request.user},\n"
             f"*Borrowed book*: {instance.book.title},\n"
             f"*On date*: {instance.borrow_date},\n"
             f"*With expected return on*: {instance.expected_return_date}."
         )
-        send_telegram_message.delay(message)
+
+    @extend_schema(
+        summary="Borrow several books at once",
+        description=(
+            "Borrow a list of books in one request and one transaction. "
+            "Either every book is borrowed or none. Repeat an id to borrow "
+            "several copies. Accessible by authenticated user."
+        ),
+        request=BorrowingBatchSerializer,
+        responses={201: BorrowingBatchSerializer},
+        examples=[
+            OpenApiExample(
+                "Batch request example",
+                value={"expected_return_date": "2024-06-25", "books": [1, 2, 2]},
+                request_only=True,
+            ),
+            OpenApiExample(
+                "Batch response example",
+                value={
+                    "expected_return_date": "2024-06-25",
+                    "borrow_date": "2024-06-18",
+                    "borrowings": [7, 8, 9],
+                },
+                response_only=True,
+            ),
+        ],
+    )
+    @action(detail=False, methods=["post"], url_path="batch")
+    def batch_create(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        with transaction.atomic():
+            serializer.save(user=request.user)
+
+            titles = ", ".join(
+                serializer.books[book_id].title
+                for book_id in serializer.validated_data["books"]
+            )
+            batch = serializer.instance
+            notify(
+                f"*User*: {request.user},\n"
+                f"*Borrowed books* ({len(batch['borrowings'])}): {titles},\n"
+                f"*On date*: {batch['borrow_date']},\n"
+                f"*With expected return on*: {batch['expected_return_date']}."
+            )
+
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @extend_schema(
+        summary="Export borrowings",
+        description=(
+            "Stream the full borrowing history as CSV or NDJSON, ordered by "
+            "id. Accepts the same filters as the list. Accessible only by "
+            "admin users."
+        ),
+        parameters=BORROWING_FILTER_PARAMETERS + EXPORT_PARAMETERS,
+        responses={200: OpenApiTypes.BINARY},
+    )
+    @action(
+        detail=False,
+        methods=["get"],
+        url_path="export",
+        permission_classes=[IsAdminUser],
+    )
+    def export(self, request):
+        try:
+            file_format, after_id = parse_export_params(request.query_params)
+        except ValueError as error:
+            return Response(
+                {"detail": str(error)}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return export_response(
+            filter_borrowings(Borrowing.objects.all(), request),
+            BORROWING_EXPORT_FIELDS,
+            file_format,
+            "borrowings",
+            after_id=after_id,
+        )
 
     @extend_schema(
         summary="Return a borrowed book",
-        description="Mark a book as returned and process the payment for the borrowing.",
+        description=(
+            "Mark a book as returned and process the payment for the "
+            "borrowing. By default redirects to the Stripe checkout. With "
+            "?async=true or a 'Prefer: respond-async' header the return is "
+            "answered 202 right away and the checkout session is created in "
+            "the background: poll the payment from the Location header until "
+            "its session_url is set."
+        ),
         request=BorrowingReturnSerializer,
-        responses={200: BorrowingReturnSerializer},
+        parameters=[
+            OpenApiParameter(
+                name="async",
+                description="Create the checkout session in the background",
+                required=False,
+                type=OpenApiTypes.BOOL,
+            ),
+        ],
+        responses={
+            200: BorrowingReturnSerializer,
+            202: PaymentSerializer,
+        },
         examples=[
             OpenApiExample("Request body example", value={}),
             OpenApiExample(
@@ -172,6 +351,11 @@ class BorrowingViewSet(
         detail=True,
         methods=["post"],
         permission_classes=[IsAuthenticated],
+        throttle_classes=[
+            *api_settings.DEFAULT_THROTTLE_CLASSES,
+            ScopedRateThrottle,
+        ],
+        throttle_scope="return_book",
         url_path="return",
     )
     def return_book(self, request, pk=None):
@@ -179,6 +363,11 @@ class BorrowingViewSet(
         serializer = BorrowingReturnSerializer(
             borrowing, data=request.data, partial=True
         )
+        # Before anything is written, a rejected return changes nothing.
+        if not serializer.is_valid():
+            return Response(
+                serializer.errors, status=status.HTTP_400_BAD_REQUEST
+            )
         if borrowing.expiated:
             payment_type = Payment.Type.FINE
             money_to_pay = borrowing.fine_payable
@@ -186,12 +375,19 @@ class BorrowingViewSet(
             payment_type = Payment.Type.PAYMENT
             money_to_pay = borrowing.payable
 
-        payment, created = Payment.objects.get_or_create(
-            borrowing_id=borrowing.id,
-            defaults={"money_to_pay": money_to_pay, "type": payment_type},
-        )
+        with transaction.atomic():
+            payment, created = Payment.objects.get_or_create(
+                borrowing_id=borrowing.id,
+                defaults={"money_to_pay": money_to_pay, "type": payment_type},
+            )
+            if created:
+                UserAccountSummary.objects.adjust(
+                    borrowing.user_id,
+                    pending_payments=1,
+                    outstanding_amount=payment.money_to_pay,
+                )
 
-        if serializer.is_valid():
+            # A retried return doesn't put the book back twice.
             serializer.save()
 
             if not created and payment.status == Payment.Status.PAID:
@@ -200,15 +396,31 @@ class BorrowingViewSet(
                     status=status.HTTP_400_BAD_REQUEST,
                 )
 
-            checkout_session = PaymentViewSet.create_stripe_session(
-                payment, request
-            )
-
-            if isinstance(checkout_session, Response):
-                return checkout_session
+            if prefers_async(request) and not has_valid_session(payment):
+                success_url, cancel_url = checkout_urls(payment, request)
+                transaction.on_commit(
+                    lambda: create_payment_session.delay(
+                        payment.id, success_url, cancel_url
+                    )
+                )
+                return Response(
+                    PaymentSerializer(payment).data,
+                    status=status.HTTP_202_ACCEPTED,
+                    headers={
+                        "Location": reverse(
+                            "payment_app:payment-detail",
+                            kwargs={"pk": payment.pk},
+                            request=request,
+                        ),
+                        "Retry-After": "1",
+                    },
+                )
 
-            return redirect(
-                checkout_session.url, status=status.HTTP_307_TEMPORARY_REDIRECT
-            )
+        # Outside the transaction, the return is kept even if Stripe fails.
+        checkout = PaymentViewSet.create_stripe_session(payment, request)
+        if isinstance(checkout, Response):
+            return checkout
 
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        return redirect(
+            checkout.session_url, status=status.HTTP_307_TEMPORARY_REDIRECT
+        )
@@ -0,0 +1,98 @@
+from datetime import datetime, timedelta, timezone
+
+import stripe
+from django.http import HttpRequest
+from django.utils import timezone as django_timezone
+from rest_framework.reverse import reverse
+
+from LibraryService.settings import STRIPE_API_BASE, STRIPE_SECRET_KEY
+from borrowing_app.cache import invalidate_borrowings
+from payment_app.models import Payment
+
+stripe.api_key = STRIPE_SECRET_KEY
+stripe.api_base = STRIPE_API_BASE
+
+# A session about to expire is not worth sending the user to.
+SESSION_MIN_TTL = timedelta(minutes=5)
+
+
+def checkout_urls(payment: Payment, request: HttpRequest) -> tuple[str, str]:
+    """Absolute success and cancel urls, so a worker can create the session"""
+    return (
+        request.build_absolute_uri(
+            reverse("payment_app:payment-success", kwargs={"pk": payment.pk})
+        ),
+        request.build_absolute_uri(
+            reverse("payment_app:payment-cancel", kwargs={"pk": payment.pk})
+        ),
+    )
+
+
+def has_valid_session(payment: Payment) -> bool:
+    return bool(
+        payment.session_url
+        and payment.session_expires_at
+        and payment.session_expires_at > django_timezone.now() + SESSION_MIN_TTL
+    )
+
+
+def create_checkout_session(
+    payment: Payment, success_url: str, cancel_url: str
+) -> Payment:
+    """
+    Give ``payment`` a Stripe checkout session, reusing a still valid one.
+
+    The idempotency key is derived from the session being replaced, so two
+    workers racing for the same payment end up with the same session. When
+    the payment stopped being PENDING meanwhile the new session is not
+    stored and the payment is returned as it is in the database.
+    """
+    if has_valid_session(payment):
+        return payment
+
+    # The expiry outlives the expired session's id and url, so a payment
+    # never asks twice for a session with the same key.
+    replaces = (
+        int(payment.session_expires_at.timestamp())
+        if payment.session_expires_at
+        else "none"
+    )
+
+    session = stripe.checkout.Session.create(
+        payment_method_types=["card"],
+        line_items=[
+            {
+                "price_data": {
+                    "currency": "usd",
+                    "product_data": {
+                        "name": payment.borrowing.book.title,
+                    },
+                    "unit_amount": int(payment.money_to_pay * 100),
+                },
+                "quantity": 1,
+            }
+        ],
+        mode="payment",
+        success_url=success_url,
+        cancel_url=cancel_url,
+        idempotency_key=f"payment-{payment.pk}-replaces-{replaces}",
+    )
+
+    payment.session_id = session.id
+    payment.session_url = session.url
+    payment.session_expires_at = datetime.fromtimestamp(
+        session.expires_at, tz=timezone.utc
+    )
+    # Only if nobody paid in the meantime.
+    updated = Payment.objects.filter(
+        pk=payment.pk, status=Payment.Status.PENDING
+    ).update(
+        session_id=payment.session_id,
+        session_url=payment.session_url,
+        session_expires_at=payment.session_expires_at,
+    )
+    if not updated:
+        payment.refresh_from_db()
+        return payment
+    invalidate_borrowings(payment.borrowing.user_id)
+    return payment
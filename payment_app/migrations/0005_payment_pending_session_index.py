@@ -0,0 +1,24 @@
+# Generated by Django 5.0.6 on 2026-10-18 02:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("borrowing_app", "0005_hot_filter_indexes"),
+        ("payment_app", "0004_stripe_event"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="payment",
+            index=models.Index(
+                condition=models.Q(
+                    ("session_id__isnull", False), ("status", "PENDING")
+                ),
+                fields=["id"],
+                name="payment_pending_session_idx",
+            ),
+        ),
+    ]
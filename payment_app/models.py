@@ -28,7 +28,10 @@ class Payment(models.Model):
     )
 
     session_url = models.URLField(max_length=512, blank=True, null=True)
-    session_id = models.CharField(max_length=512, blank=True, null=True)
+    session_id = models.CharField(
+        max_length=512, blank=True, null=True, db_index=True
+    )
+    session_expires_at = models.DateTimeField(blank=True, null=True)
 
     money_to_pay = models.DecimalField(
         max_digits=10,
@@ -36,5 +39,46 @@ class Payment(models.Model):
         validators=[MinValueValidator(Decimal("0.00"))],
     )
 
+    class Meta:
+        indexes = [
+            # Pending payments are few next to paid ones, the hourly
+            # reconciliation walks them in id order.
+            models.Index(
+                fields=["id"],
+                name="payment_pending_session_idx",
+                condition=models.Q(
+                    status="PENDING", session_id__isnull=False
+                ),
+            ),
+        ]
+
     def __str__(self):
         return f"Payment: {self.id}; Pay: {self.money_to_pay};"
+
+
+class StripeEvent(models.Model):
+    """
+    A Stripe webhook event, stored once per Stripe event id.
+
+    The webhook only records events, ``process_stripe_events`` applies
+    them to payments in batches.
+    """
+
+    event_id = models.CharField(max_length=255, unique=True)
+    type = models.CharField(max_length=255)
+    session_id = models.CharField(max_length=512)
+    payload = models.JSONField()
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["id"],
+                name="stripe_event_pending_idx",
+                condition=models.Q(processed_at__isnull=True),
+            ),
+        ]
+
+    def __str__(self):
+        return f"Stripe event: {self.event_id}; Type: {self.type};"
@@ -0,0 +1,145 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+
+import stripe
+from django.core.cache import cache
+from django.db import transaction
+
+from borrowing_app.cache import invalidate_borrowings
+from payment_app.models import Payment
+from payment_app.webhooks import PAID_STATUSES, record_paid
+
+logger = logging.getLogger(__name__)
+
+PAID = "paid"
+EXPIRED = "expired"
+OPEN = "open"
+FAILED = "failed"
+
+# Last payment id of the latest settled chunk, so a killed run resumes there.
+RECONCILE_CURSOR_KEY = "payments:reconcile:cursor"
+
+
+@dataclass
+class ReconcileSummary:
+    scanned: int = 0
+    paid: int = 0
+    expired: int = 0
+    open: int = 0
+    failed: int = 0
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+def session_state(session_id: str) -> str:
+    """Ask Stripe where a checkout session stands"""
+    try:
+        session = stripe.checkout.Session.retrieve(session_id)
+    except stripe.InvalidRequestError as error:
+        if error.code == "resource_missing":
+            # Unknown to Stripe, e.g. created with other keys: start over.
+            return EXPIRED
+        # Bad parameters or API version, or keys of the wrong mode: a
+        # configuration problem, the session may well exist.
+        logger.error("Could not retrieve session %s: %s", session_id, error)
+        return FAILED
+    except stripe.StripeError as error:
+        logger.warning("Could not retrieve session %s: %s", session_id, error)
+        return FAILED
+
+    if session.payment_status in PAID_STATUSES:
+        return PAID
+    if session.status == "expired":
+        return EXPIRED
+    return OPEN
+
+
+def _apply(states: dict[int, tuple[str, str]]) -> None:
+    """Save the paid and expired states of one chunk"""
+    states = {
+        payment_id: (session_id, state)
+        for payment_id, (session_id, state) in states.items()
+        if state in (PAID, EXPIRED)
+    }
+    if not states:
+        return
+
+    with transaction.atomic():
+        payments = list(
+            Payment.objects.select_for_update()
+            .select_related("borrowing__book", "borrowing__user")
+            .filter(id__in=states, status=Payment.Status.PENDING)
+        )
+        paid, expired = [], []
+        for payment in payments:
+            session_id, state = states[payment.id]
+            # A return may have replaced the session since it was fetched.
+            if payment.session_id != session_id:
+                continue
+            if state == PAID:
+                payment.status = Payment.Status.PAID
+                paid.append(payment)
+            elif state == EXPIRED:
+                # The next return creates a new session, the expiry is
+                # kept for its idempotency key.
+                payment.session_id = None
+                payment.session_url = None
+                expired.append(payment)
+
+        Payment.objects.bulk_update(paid, ["status"])
+        Payment.objects.bulk_update(expired, ["session_id", "session_url"])
+        invalidate_borrowings(
+            *(payment.borrowing.user_id for payment in expired)
+        )
+        record_paid(paid)
+
+
+def reconcile_payments(
+    chunk_size: int = 500, max_concurrency: int = 8
+) -> ReconcileSummary:
+    """
+    Check every PENDING payment that has a session against Stripe.
+
+    Payments are read in id order a chunk at a time (keyset, no OFFSET),
+    their sessions retrieved on at most ``max_concurrency`` threads and the
+    outcome written with ``bulk_update`` in one short transaction per
+    chunk, so no lock is held while Stripe is queried.
+
+    The keyset cursor is stored in the cache after every chunk: a run that
+    is killed midway is resumed by the next one, which then only reports
+    the payments it scanned itself. A finished run clears it.
+    """
+    summary = ReconcileSummary()
+    last_id = cache.get(RECONCILE_CURSOR_KEY, 0)
+
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        while True:
+            chunk = list(
+                Payment.objects.filter(
+                    status=Payment.Status.PENDING,
+                    session_id__isnull=False,
+                    id__gt=last_id,
+                )
+                .order_by("id")
+                .values_list("id", "session_id")[:chunk_size]
+            )
+            if not chunk:
+                cache.delete(RECONCILE_CURSOR_KEY)
+                return summary
+            last_id = chunk[-1][0]
+
+            session_ids = [session_id for _, session_id in chunk]
+            states = {
+                payment_id: (session_id, state)
+                for (payment_id, session_id), state in zip(
+                    chunk, executor.map(session_state, session_ids)
+                )
+            }
+            _apply(states)
+            cache.set(RECONCILE_CURSOR_KEY, last_id, timeout=None)
+
+            summary.scanned += len(chunk)
+            for _, state in states.values():
+                setattr(summary, state, getattr(summary, state) + 1)
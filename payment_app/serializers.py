@@ -1,18 +1,62 @@
 from rest_framework import serializers
 
+from LibraryService.fieldsets import ExpandableSerializerMixin
+from books_app.serializers import BookSerializer
+from borrowing_app.models import Borrowing
 from payment_app.models import Payment
+from user.serializers import UserSerializer
 
 
-class PaymentSerializer(serializers.ModelSerializer):
+class PaymentBorrowingSerializer(
+    ExpandableSerializerMixin, serializers.ModelSerializer
+):
+    """The borrowing a payment is for, nested by ``?expand=borrowing``"""
+
+    expandable_fields = {"book": BookSerializer, "user": UserSerializer}
+
+    class Meta:
+        model = Borrowing
+        fields = (
+            "id",
+            "borrow_date",
+            "expected_return_date",
+            "actual_return_date",
+            "book",
+            "user",
+        )
+
+
+class PaymentSerializer(
+    ExpandableSerializerMixin, serializers.ModelSerializer
+):
+    expandable_fields = {"borrowing": PaymentBorrowingSerializer}
 
     class Meta:
         model = Payment
-        fields = "__all__"
-        read_only_fields = ("status", "type", "session_url", "session_id")
+        fields = (
+            "id",
+            "status",
+            "type",
+            "borrowing",
+            "session_url",
+            "session_id",
+            "session_expires_at",
+            "money_to_pay",
+        )
+        read_only_fields = (
+            "status",
+            "type",
+            "session_url",
+            "session_id",
+            "session_expires_at",
+        )
 
 
-class PaymentListSerializer(serializers.ModelSerializer):
+class PaymentListSerializer(
+    ExpandableSerializerMixin, serializers.ModelSerializer
+):
+    expandable_fields = {"borrowing": PaymentBorrowingSerializer}
 
     class Meta:
         model = Payment
-        fields = ("id", "status", "type", "money_to_pay")
+        fields = ("id", "status", "type", "money_to_pay", "borrowing")
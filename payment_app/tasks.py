@@ -0,0 +1,75 @@
+import logging
+
+import stripe
+from celery import shared_task
+from django.core.cache import cache
+
+from LibraryService.settings import STRIPE_MAX_CONCURRENCY
+from payment_app.checkout import create_checkout_session
+from payment_app.models import Payment
+from payment_app.reconcile import reconcile_payments
+from payment_app.webhooks import process_events
+
+logger = logging.getLogger(__name__)
+
+# Set while a processing run is queued, so a burst schedules a single run.
+STRIPE_EVENTS_SCHEDULED_KEY = "payments:stripe_events:scheduled"
+STRIPE_EVENTS_DELAY = 1
+
+
+@shared_task(
+    autoretry_for=(
+        stripe.APIConnectionError,
+        stripe.APIError,
+        stripe.RateLimitError,
+    ),
+    retry_backoff=True,
+    max_retries=6,
+)
+def create_payment_session(
+    payment_id: int, success_url: str, cancel_url: str
+) -> str | None:
+    """Create the checkout session of a returned borrowing in the background"""
+    payment = (
+        Payment.objects.select_related("borrowing__book")
+        .filter(pk=payment_id, status=Payment.Status.PENDING)
+        .first()
+    )
+    if payment is None:
+        logger.info("Payment %s is gone or already paid", payment_id)
+        return None
+
+    return create_checkout_session(payment, success_url, cancel_url).session_url
+
+
+def schedule_stripe_events() -> None:
+    """Queue a processing run unless one is already waiting"""
+    if cache.add(STRIPE_EVENTS_SCHEDULED_KEY, True, timeout=60):
+        process_stripe_events.apply_async(countdown=STRIPE_EVENTS_DELAY)
+
+
+@shared_task
+def process_stripe_events(batch_size: int = 500) -> int:
+    """Apply every pending Stripe webhook event, return how many"""
+    # Events recorded from now on need a run of their own.
+    cache.delete(STRIPE_EVENTS_SCHEDULED_KEY)
+    processed = 0
+    while True:
+        count = process_events(batch_size)
+        processed += count
+        if count < batch_size:
+            return processed
+
+
+@shared_task
+def reconcile_pending_payments(chunk_size: int = 500) -> dict:
+    """
+    Settle PENDING payments whose webhook never arrived.
+
+    Paid sessions mark their payment PAID, expired ones are dropped and
+    recreated on the next return. A killed run is picked up where it
+    stopped by the next one. Returns and logs the summary.
+    """
+    summary = reconcile_payments(chunk_size, STRIPE_MAX_CONCURRENCY).as_dict()
+    logger.info("Pending payments reconciled: %s", summary)
+    return summary
@@ -0,0 +1,291 @@
+import hashlib
+import hmac
+import json
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.settings import api_settings
+from rest_framework.test import APITestCase
+
+from LibraryService.testing import LocalHTTPStub
+from LibraryService.throttling import reset_throttle
+from books_app.models import Book
+from borrowing_app.models import Borrowing, OutboxMessage
+from payment_app import reconcile
+from payment_app.models import Payment, StripeEvent
+from payment_app.reconcile import RECONCILE_CURSOR_KEY, reconcile_payments
+from payment_app.tasks import STRIPE_EVENTS_SCHEDULED_KEY, process_stripe_events
+
+User = get_user_model()
+WEBHOOK_URL = reverse("payment_app:stripe-webhook")
+WEBHOOK_SECRET = "whsec_test"
+
+
+def sign(payload: str, secret: str = WEBHOOK_SECRET) -> str:
+    timestamp = int(time.time())
+    signature = hmac.new(
+        secret.encode(), f"{timestamp}.{payload}".encode(), hashlib.sha256
+    ).hexdigest()
+    return f"t={timestamp},v1={signature}"
+
+
+@patch("payment_app.webhooks.STRIPE_WEBHOOK_SECRET", WEBHOOK_SECRET)
+@patch("payment_app.tasks.process_stripe_events.apply_async")
+class StripeWebhookTests(APITestCase):
+    def setUp(self):
+        cache.delete(STRIPE_EVENTS_SCHEDULED_KEY)
+        self.addCleanup(cache.delete, STRIPE_EVENTS_SCHEDULED_KEY)
+        self.user = User.objects.create_user(
+            email="test@test.test", password="passwordQq1"
+        )
+        book = Book.objects.create(
+            title="Test Book",
+            author="Author",
+            inventory=10,
+            daily_fee=Decimal("1.00"),
+        )
+        self.payments = [
+            Payment.objects.create(
+                borrowing=Borrowing.objects.create(
+                    user=self.user,
+                    book=book,
+                    expected_return_date=date.today() + timedelta(days=7),
+                ),
+                money_to_pay=Decimal("4.00"),
+                session_id=f"cs_test_{number}",
+                session_url="https://checkout.stripe.test/pay",
+            )
+            for number in range(3)
+        ]
+
+    def post_event(self, event_id, event_type, session_id, **session):
+        payload = json.dumps(
+            {
+                "id": event_id,
+                "type": event_type,
+                "data": {"object": {"id": session_id, **session}},
+            }
+        )
+        return self.client.post(
+            WEBHOOK_URL,
+            payload,
+            content_type="application/json",
+            HTTP_STRIPE_SIGNATURE=sign(payload),
+        )
+
+    def test_invalid_signature_is_rejected(self, apply_async):
+        payload = json.dumps({"id": "evt_1", "type": "checkout.session.completed"})
+        response = self.client.post(
+            WEBHOOK_URL,
+            payload,
+            content_type="application/json",
+            HTTP_STRIPE_SIGNATURE=sign(payload, secret="whsec_other"),
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(StripeEvent.objects.exists())
+
+    def test_unconfigured_secret_rejects_every_event(self, apply_async):
+        payload = json.dumps({"id": "evt_1", "type": "checkout.session.completed"})
+        for secret in (None, ""):
+            with self.subTest(secret=secret), patch(
+                "payment_app.webhooks.STRIPE_WEBHOOK_SECRET", secret
+            ):
+                response = self.client.post(
+                    WEBHOOK_URL,
+                    payload,
+                    content_type="application/json",
+                    HTTP_STRIPE_SIGNATURE=sign(payload, secret=""),
+                )
+                self.assertEqual(
+                    response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE
+                )
+        self.assertFalse(StripeEvent.objects.exists())
+
+    @patch.dict(api_settings.DEFAULT_THROTTLE_RATES, anon="1/hour")
+    def test_webhook_is_not_throttled(self, apply_async):
+        reset_throttle("anon", "127.0.0.1")
+        self.addCleanup(reset_throttle, "anon", "127.0.0.1")
+        for number in range(3):
+            response = self.post_event(
+                f"evt_{number}", "checkout.session.expired", f"cs_test_{number}"
+            )
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_burst_is_stored_once_and_processed_in_one_batch(self, apply_async):
+        for _ in range(2):
+            response = self.post_event(
+                "evt_1",
+                "checkout.session.completed",
+                "cs_test_0",
+                payment_status="paid",
+            )
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.post_event("evt_2", "checkout.session.expired", "cs_test_1")
+        self.post_event("evt_3", "customer.created", "cus_1")
+
+        self.assertEqual(StripeEvent.objects.count(), 2)
+        apply_async.assert_called_once()
+        # Nothing is applied inline.
+        self.payments[0].refresh_from_db()
+        self.assertEqual(self.payments[0].status, Payment.Status.PENDING)
+
+        with self.assertNumQueries(10):
+            self.assertEqual(process_stripe_events(), 2)
+
+        paid, expired, untouched = self.payments
+        for payment in self.payments:
+            payment.refresh_from_db()
+        self.assertEqual(paid.status, Payment.Status.PAID)
+        self.assertIsNone(expired.session_id)
+        self.assertIsNone(expired.session_url)
+        self.assertEqual(untouched.session_id, "cs_test_2")
+        self.assertFalse(
+            StripeEvent.objects.filter(processed_at__isnull=True).exists()
+        )
+        self.assertIn(
+            f"*Payment id*: {paid.id}", OutboxMessage.objects.get().message
+        )
+
+    def test_success_answers_from_database(self, apply_async):
+        self.client.force_authenticate(user=self.user)
+        url = reverse("payment_app:payment-success", args=[self.payments[0].id])
+
+        with patch("stripe.checkout.Session.retrieve") as retrieve:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+            self.post_event(
+                "evt_1",
+                "checkout.session.completed",
+                "cs_test_0",
+                payment_status="paid",
+            )
+            process_stripe_events()
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        retrieve.assert_not_called()
+
+
+def stripe_sessions_handler(method, path, body):
+    """Session state follows the id: cs_paid_1, cs_expired_2, cs_gone_3..."""
+    session_id = path.rsplit("/", 1)[-1]
+    state = session_id.split("_")[1]
+    if state == "gone":
+        return 404, {
+            "error": {
+                "type": "invalid_request_error",
+                "code": "resource_missing",
+                "message": f"No such checkout.session: '{session_id}'",
+            }
+        }
+    if state == "invalid":
+        return 400, {
+            "error": {
+                "type": "invalid_request_error",
+                "message": "Invalid API version.",
+            }
+        }
+    if state == "down":
+        return 500, {"error": {"type": "api_error", "message": "Oops"}}
+    return 200, {
+        "id": session_id,
+        "object": "checkout.session",
+        "status": {"paid": "complete"}.get(state, state),
+        "payment_status": "paid" if state == "paid" else "unpaid",
+    }
+
+
+class ReconcilePaymentsTests(APITestCase):
+    def setUp(self):
+        user = User.objects.create_user(
+            email="test@test.test", password="passwordQq1"
+        )
+        book = Book.objects.create(
+            title="Test Book",
+            author="Author",
+            inventory=10,
+            daily_fee=Decimal("1.00"),
+        )
+        states = [
+            "paid", "expired", "open", "gone", "down", "paid", "open", "invalid"
+        ]
+        self.payments = {}
+        for number, state in enumerate(states):
+            self.payments[state, number] = Payment.objects.create(
+                borrowing=Borrowing.objects.create(
+                    user=user,
+                    book=book,
+                    expected_return_date=date.today() + timedelta(days=7),
+                ),
+                money_to_pay=Decimal("4.00"),
+                session_id=f"cs_{state}_{number}",
+                session_url="https://checkout.stripe.test/pay",
+            )
+        self.stripe = LocalHTTPStub(stripe_sessions_handler)
+        self.enterContext(self.stripe)
+        self.enterContext(patch("stripe.api_base", self.stripe.url))
+        cache.delete(RECONCILE_CURSOR_KEY)
+
+    def test_killed_run_is_resumed_after_the_last_chunk(self):
+        apply = reconcile._apply
+        calls = []
+
+        def killed_at_second_chunk(states):
+            calls.append(states)
+            if len(calls) == 2:
+                raise SystemExit
+            apply(states)
+
+        with patch("payment_app.reconcile._apply", killed_at_second_chunk):
+            with self.assertRaises(SystemExit):
+                reconcile_payments(chunk_size=3)
+        self.assertEqual(len(self.stripe.requests), 6)
+
+        summary = reconcile_payments(chunk_size=3)
+
+        # The first chunk is not fetched again, the killed one is.
+        self.assertEqual(summary.scanned, 5)
+        self.assertEqual(len(self.stripe.requests), 11)
+        self.assertIsNone(cache.get(RECONCILE_CURSOR_KEY))
+        self.assertEqual(reconcile_payments().scanned, 4)
+
+    def test_pending_payments_are_settled_in_chunks(self):
+        Payment.objects.create(
+            borrowing=Borrowing.objects.create(
+                user=User.objects.get(),
+                book=Book.objects.get(),
+                expected_return_date=date.today(),
+            ),
+            money_to_pay=Decimal("4.00"),
+        )
+
+        summary = reconcile_payments(chunk_size=3, max_concurrency=4)
+
+        self.assertEqual(
+            summary.as_dict(),
+            {"scanned": 8, "paid": 2, "expired": 2, "open": 2, "failed": 2},
+        )
+        self.assertEqual(len(self.stripe.requests), 8)
+        statuses = {
+            key: Payment.objects.get(id=payment.id)
+            for key, payment in self.payments.items()
+        }
+        self.assertEqual(statuses["paid", 0].status, Payment.Status.PAID)
+        self.assertEqual(statuses["paid", 5].status, Payment.Status.PAID)
+        self.assertIsNone(statuses["expired", 1].session_id)
+        self.assertIsNone(statuses["gone", 3].session_url)
+        self.assertEqual(statuses["open", 2].session_id, "cs_open_2")
+        self.assertEqual(statuses["down", 4].session_id, "cs_down_4")
+        # Only a missing session is taken as expired.
+        self.assertEqual(statuses["invalid", 7].session_id, "cs_invalid_7")
+        self.assertEqual(OutboxMessage.objects.count(), 2)
+
+        # Settled payments are not fetched again.
+        self.assertEqual(reconcile_payments().scanned, 4)
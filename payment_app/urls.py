@@ -1,13 +1,15 @@
 from django.urls import path, include
 from rest_framework import routers
 
-from payment_app.views import PaymentViewSet
+from payment_app.views import PaymentViewSet, StripeWebhookView
 
 router = routers.DefaultRouter()
 
 router.register("", PaymentViewSet, basename="payment")
 
 urlpatterns = [
+    # Before the router, its detail route would match "webhook/" too.
+    path("webhook/", StripeWebhookView.as_view(), name="stripe-webhook"),
     path("", include(router.urls)),
 ]
 
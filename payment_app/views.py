@@ -1,3 +1,5 @@
+import logging
+
 import stripe
 from django.http import HttpRequest
 from drf_spectacular.types import OpenApiTypes
@@ -9,34 +11,68 @@ from drf_spectacular.utils import (
 )
 from rest_framework import viewsets, mixins, status
 from rest_framework.decorators import action
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
-from rest_framework.reverse import reverse
-from stripe.checkout import Session
+from rest_framework.views import APIView
 
-from LibraryService.settings import STRIPE_SECRET_KEY
-from borrowing_app.tasks import send_telegram_message
+from LibraryService.exports import (
+    EXPORT_PARAMETERS,
+    export_response,
+    parse_export_params,
+)
+from LibraryService.fieldsets import FIELDSET_PARAMETERS, FieldsetViewMixin
+from LibraryService.pagination import KeysetPagination
+from LibraryService.values import ValuesViewMixin
+from borrowing_app.filters import (
+    BORROWING_FILTER_PARAMETERS,
+    filter_borrowings,
+)
+from payment_app.checkout import checkout_urls, create_checkout_session
 from payment_app.models import Payment
 from payment_app.serializers import PaymentSerializer, PaymentListSerializer
+from payment_app.tasks import schedule_stripe_events
+from payment_app.webhooks import (
+    WebhookNotConfigured,
+    record_event,
+    verify_event,
+)
+
+logger = logging.getLogger(__name__)
 
-stripe.api_key = STRIPE_SECRET_KEY
+PAYMENT_EXPORT_FIELDS = (
+    "id",
+    "status",
+    "type",
+    "money_to_pay",
+    "session_id",
+    "borrowing_id",
+    "borrowing__borrow_date",
+    "borrowing__actual_return_date",
+    "borrowing__book__title",
+    "borrowing__user_id",
+    "borrowing__user__email",
+)
 
 
 @extend_schema_view(
     list=extend_schema(
         summary="Retrieve a list of payments",
-        description="Retrieve a list of all payments. Accessible by authenticated users.",
+        description=(
+            "Retrieve a list of all payments. The borrowing is an id unless "
+            "?expand=borrowing, add borrowing.book / borrowing.user to nest "
+            "those too. Accessible by authenticated users."
+        ),
+        parameters=FIELDSET_PARAMETERS,
         responses={200: PaymentListSerializer(many=True)},
         examples=[
             OpenApiExample(
                 "Payment list example",
+                description="?expand=borrowing.book,borrowing.user",
                 value=[
                     {
                         "id": 1,
                         "status": "PENDING",
                         "type": "PAYMENT",
-                        "session_url": "https://example.com/session_url",
-                        "session_id": "sess_123",
                         "money_to_pay": "4.00",
                         "borrowing": {
                             "id": 1,
@@ -65,10 +101,12 @@ stripe.api_key = STRIPE_SECRET_KEY
     retrieve=extend_schema(
         summary="Retrieve a single payment",
         description="Retrieve the details of a specific payment by its ID. Accessible by authenticated user.",
+        parameters=FIELDSET_PARAMETERS,
         responses={200: PaymentSerializer},
         examples=[
             OpenApiExample(
                 "Payment detail example",
+                description="?expand=borrowing.book,borrowing.user",
                 value={
                     "id": 2,
                     "status": "PENDING",
@@ -101,19 +139,24 @@ stripe.api_key = STRIPE_SECRET_KEY
     ),
 )
 class PaymentViewSet(
+    ValuesViewMixin,
+    FieldsetViewMixin,
     mixins.ListModelMixin,
     mixins.RetrieveModelMixin,
     viewsets.GenericViewSet,
 ):
-    queryset = Payment.objects.select_related("borrowing")
+    queryset = Payment.objects.all()
     serializer_class = PaymentSerializer
     permission_classes = (IsAuthenticated,)
+    pagination_class = KeysetPagination
+    query_budget = {"list": 2, "retrieve": 1}
 
     def get_queryset(self):
+        queryset = self.expand_queryset(self.queryset)
         if self.request.user.is_staff:
-            return self.queryset
+            return queryset
 
-        return self.queryset.filter(borrowing__user=self.request.user)
+        return queryset.filter(borrowing__user=self.request.user)
 
     def get_serializer_class(self):
         if self.action == "list":
@@ -122,8 +165,11 @@ class PaymentViewSet(
         return self.serializer_class
 
     @extend_schema(
-        summary="Mark payment as successful",
-        description="Check the payment status and mark it as paid if successful.",
+        summary="Check whether the payment succeeded",
+        description=(
+            "Answer from the payment status, which the Stripe webhook marks "
+            "as paid. No call to Stripe is made."
+        ),
         responses={
             200: OpenApiResponse(
                 response=OpenApiTypes.OBJECT,
@@ -150,20 +196,8 @@ class PaymentViewSet(
     )
     def success_payment(self, request, pk=None):
         payment = self.get_object()
-        session = stripe.checkout.Session.retrieve(payment.session_id)
-
-        if session.payment_status == "paid":
-            payment.status = Payment.Status.PAID
-            payment.save()
-
-            send_telegram_message.delay(
-                f"*Successful payment!*\n"
-                f"*Book title*: {payment.borrowing.book.title},\n"
-                f"*User*: {payment.borrowing.user.email},\n"
-                f"*Payment id*: {payment.id},\n"
-                f"*Money paid*: {payment.money_to_pay},\n"
-                f"*Payment status*: {payment.status}"
-            )
+
+        if payment.status == Payment.Status.PAID:
             return Response({"detail": "Payment was successful!"})
 
         return Response(
@@ -201,10 +235,44 @@ class PaymentViewSet(
             }
         )
 
+    @extend_schema(
+        summary="Export payments",
+        description=(
+            "Stream all payments as CSV or NDJSON, ordered by id. The "
+            "user_id / is_active filters apply to the paid borrowing. "
+            "Accessible only by admin users."
+        ),
+        parameters=BORROWING_FILTER_PARAMETERS + EXPORT_PARAMETERS,
+        responses={200: OpenApiTypes.BINARY},
+    )
+    @action(
+        detail=False,
+        methods=["get"],
+        url_path="export",
+        permission_classes=[IsAdminUser],
+    )
+    def export(self, request):
+        try:
+            file_format, after_id = parse_export_params(request.query_params)
+        except ValueError as error:
+            return Response(
+                {"detail": str(error)}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return export_response(
+            filter_borrowings(
+                Payment.objects.all(), request, prefix="borrowing__"
+            ),
+            PAYMENT_EXPORT_FIELDS,
+            file_format,
+            "payments",
+            after_id=after_id,
+        )
+
     @staticmethod
     def create_stripe_session(
             payment: Payment, request: HttpRequest
-    ) -> Session | Response:
+    ) -> Payment | Response:
         if payment.status != Payment.Status.PENDING:
             return Response(
                 {"detail": "Payment already processed"},
@@ -212,41 +280,63 @@ class PaymentViewSet(
             )
 
         try:
-            session = stripe.checkout.Session.create(
-                payment_method_types=["card"],
-                line_items=[
-                    {
-                        "price_data": {
-                            "currency": "usd",
-                            "product_data": {
-                                "name": payment.borrowing.book.title,
-                            },
-                            "unit_amount": int(payment.money_to_pay * 100),
-                        },
-                        "quantity": 1,
-                    }
-                ],
-                mode="payment",
-                success_url=request.build_absolute_uri(
-                    reverse(
-                        "payment_app:payment-success",
-                        kwargs={"pk": payment.pk},
-                    )
-                ),
-                cancel_url=request.build_absolute_uri(
-                    reverse(
-                        "payment_app:payment-cancel", kwargs={"pk": payment.pk}
-                    )
-                ),
+            payment = create_checkout_session(
+                payment, *checkout_urls(payment, request)
+            )
+        except Exception as e:
+            return Response(
+                {"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST
             )
+        # Paid while the session was being created.
+        if payment.status != Payment.Status.PENDING:
+            return Response(
+                {"detail": "Payment already processed"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return payment
 
-            payment.session_id = session.id
-            payment.session_url = session.url
-            payment.save()
 
-            return session
+class StripeWebhookView(APIView):
+    """Receives checkout session events signed with STRIPE_WEBHOOK_SECRET"""
 
-        except Exception as e:
+    authentication_classes = ()
+    permission_classes = (AllowAny,)
+    # Stripe delivers from a handful of IPs, the signature is the guard.
+    throttle_classes = ()
+
+    @extend_schema(
+        summary="Stripe webhook",
+        description=(
+            "Endpoint for Stripe checkout.session.completed, "
+            "async_payment_succeeded and expired events. The signature is "
+            "verified and the event stored, payments are updated in the "
+            "background. Redelivered events are ignored."
+        ),
+        request=OpenApiTypes.OBJECT,
+        responses={
+            200: OpenApiTypes.OBJECT,
+            400: OpenApiTypes.OBJECT,
+            503: OpenApiTypes.OBJECT,
+        },
+    )
+    def post(self, request):
+        try:
+            event = verify_event(
+                request.body, request.headers.get("Stripe-Signature", "")
+            )
+        except WebhookNotConfigured:
+            # Stripe keeps retrying, events arrive once the secret is set.
+            logger.error("Stripe webhook called without STRIPE_WEBHOOK_SECRET")
             return Response(
-                {"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST
+                {"detail": "Stripe webhook is not configured."},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            )
+        except (stripe.SignatureVerificationError, ValueError):
+            return Response(
+                {"detail": "Invalid payload or signature."},
+                status=status.HTTP_400_BAD_REQUEST,
             )
+
+        if record_event(event):
+            schedule_stripe_events()
+        return Response({"received": True})
@@ -0,0 +1,152 @@
+import json
+from decimal import Decimal
+
+import stripe
+from django.db import transaction
+from django.utils import timezone
+
+from LibraryService.settings import STRIPE_WEBHOOK_SECRET
+from borrowing_app.cache import invalidate_borrowings
+from borrowing_app.tasks import notify
+from payment_app.models import Payment, StripeEvent
+from user.models import UserAccountSummary
+
+PAID_EVENTS = (
+    "checkout.session.completed",
+    "checkout.session.async_payment_succeeded",
+)
+EXPIRED_EVENTS = ("checkout.session.expired",)
+HANDLED_EVENTS = PAID_EVENTS + EXPIRED_EVENTS
+PAID_STATUSES = ("paid", "no_payment_required")
+
+
+class WebhookNotConfigured(Exception):
+    """STRIPE_WEBHOOK_SECRET is unset, so no signature can be trusted"""
+
+
+def verify_event(payload: bytes, signature: str) -> dict:
+    """
+    Check the ``Stripe-Signature`` header and decode the event.
+
+    Only an HMAC of the raw body, no call to Stripe. Raises
+    ``WebhookNotConfigured``, ``stripe.SignatureVerificationError`` or
+    ``ValueError``.
+    """
+    # An empty key would accept anyone's HMAC.
+    if not STRIPE_WEBHOOK_SECRET:
+        raise WebhookNotConfigured("STRIPE_WEBHOOK_SECRET is not set")
+    payload = payload.decode()
+    stripe.WebhookSignature.verify_header(
+        payload, signature, STRIPE_WEBHOOK_SECRET, tolerance=300
+    )
+    return json.loads(payload)
+
+
+def record_event(event: dict) -> bool:
+    """Store a handled event once, return whether it needs processing"""
+    if event.get("type") not in HANDLED_EVENTS:
+        return False
+
+    StripeEvent.objects.bulk_create(
+        [
+            StripeEvent(
+                event_id=event["id"],
+                type=event["type"],
+                session_id=event["data"]["object"]["id"],
+                payload=event,
+            )
+        ],
+        # Stripe delivers at least once, a redelivery is not an error.
+        ignore_conflicts=True,
+    )
+    return True
+
+
+def render_paid_payment(payment: Payment) -> str:
+    return (
+        f"*Successful payment!*\n"
+        f"*Book title*: {payment.borrowing.book.title},\n"
+        f"*User*: {payment.borrowing.user.email},\n"
+        f"*Payment id*: {payment.id},\n"
+        f"*Money paid*: {payment.money_to_pay},\n"
+        f"*Payment status*: {Payment.Status.PAID}"
+    )
+
+
+def record_paid(payments: list[Payment]) -> None:
+    """Move paid payments from outstanding to spent on their accounts"""
+    deltas = {}
+    for payment in payments:
+        delta = deltas.setdefault(
+            payment.borrowing.user_id,
+            {
+                "pending_payments": 0,
+                "outstanding_amount": Decimal("0.00"),
+                "lifetime_spend": Decimal("0.00"),
+            },
+        )
+        delta["pending_payments"] -= 1
+        delta["outstanding_amount"] -= payment.money_to_pay
+        delta["lifetime_spend"] += payment.money_to_pay
+    UserAccountSummary.objects.adjust_many(deltas)
+    invalidate_borrowings(*deltas)
+    notify(*(render_paid_payment(payment) for payment in payments))
+
+
+def _is_paid(event: StripeEvent) -> bool:
+    session = event.payload["data"]["object"]
+    return (
+        event.type in PAID_EVENTS
+        and session.get("payment_status") in PAID_STATUSES
+    )
+
+
+def process_events(batch_size: int = 500) -> int:
+    """
+    Apply one batch of pending events to payments, return its size.
+
+    Paid sessions mark their payment PAID and announce it, expired ones
+    drop the session so the next return creates a new one. Each kind is a
+    single UPDATE, however many events the batch holds.
+    """
+    with transaction.atomic():
+        events = list(
+            StripeEvent.objects.select_for_update(skip_locked=True)
+            .filter(processed_at__isnull=True)
+            .order_by("id")[:batch_size]
+        )
+        if not events:
+            return 0
+
+        paid_sessions = {event.session_id for event in events if _is_paid(event)}
+        expired_sessions = {
+            event.session_id for event in events if event.type in EXPIRED_EVENTS
+        } - paid_sessions
+
+        payments = list(
+            Payment.objects.select_for_update()
+            .select_related("borrowing__book", "borrowing__user")
+            .filter(
+                session_id__in=paid_sessions | expired_sessions,
+                status=Payment.Status.PENDING,
+            )
+        )
+        paid = [p for p in payments if p.session_id in paid_sessions]
+        expired = [p for p in payments if p.session_id in expired_sessions]
+        Payment.objects.filter(id__in=[payment.id for payment in paid]).update(
+            status=Payment.Status.PAID
+        )
+        # The expiry stays for the idempotency key of the next session.
+        Payment.objects.filter(
+            id__in=[payment.id for payment in expired]
+        ).update(session_id=None, session_url=None)
+        invalidate_borrowings(
+            *(payment.borrowing.user_id for payment in expired)
+        )
+
+        record_paid(paid)
+
+        StripeEvent.objects.filter(
+            id__in=[event.id for event in events]
+        ).update(processed_at=timezone.now())
+        return len(events)
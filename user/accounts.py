@@ -0,0 +1,81 @@
+from django.apps import apps as global_apps
+from django.db import transaction
+from django.db.models import Count, Sum
+
+SUMMARY_FIELDS = (
+    "active_borrowings",
+    "pending_payments",
+    "outstanding_amount",
+    "lifetime_spend",
+)
+
+
+def rebuild_account_summaries(apps=global_apps, chunk_size: int = 1000) -> int:
+    """
+    Recompute every account summary from borrowings and payments.
+
+    Users are processed in id order a chunk at a time, each chunk in one
+    transaction that locks its summaries first, so concurrent borrows and
+    returns wait instead of being overwritten. ``apps`` lets migrations
+    pass their historical models. Returns the number of users.
+    """
+    User = apps.get_model("user", "User")
+    Borrowing = apps.get_model("borrowing_app", "Borrowing")
+    Payment = apps.get_model("payment_app", "Payment")
+    UserAccountSummary = apps.get_model("user", "UserAccountSummary")
+
+    rebuilt = 0
+    last_id = 0
+    while True:
+        user_ids = list(
+            User.objects.filter(id__gt=last_id)
+            .order_by("id")
+            .values_list("id", flat=True)[:chunk_size]
+        )
+        if not user_ids:
+            return rebuilt
+        last_id = user_ids[-1]
+
+        with transaction.atomic():
+            list(
+                UserAccountSummary.objects.select_for_update()
+                .filter(user_id__in=user_ids)
+                .values_list("user_id")
+            )
+            summaries = {
+                user_id: UserAccountSummary(user_id=user_id)
+                for user_id in user_ids
+            }
+
+            active = (
+                Borrowing.objects.filter(
+                    user_id__in=user_ids, actual_return_date__isnull=True
+                )
+                .values_list("user_id")
+                .annotate(count=Count("id"))
+                .order_by()
+            )
+            for user_id, count in active:
+                summaries[user_id].active_borrowings = count
+
+            payments = (
+                Payment.objects.filter(borrowing__user_id__in=user_ids)
+                .values_list("borrowing__user_id", "status")
+                .annotate(count=Count("id"), amount=Sum("money_to_pay"))
+                .order_by()
+            )
+            for user_id, status, count, amount in payments:
+                summary = summaries[user_id]
+                if status == "PENDING":
+                    summary.pending_payments = count
+                    summary.outstanding_amount = amount
+                else:
+                    summary.lifetime_spend = amount
+
+            UserAccountSummary.objects.bulk_create(
+                summaries.values(),
+                update_conflicts=True,
+                unique_fields=["user"],
+                update_fields=SUMMARY_FIELDS,
+            )
+        rebuilt += len(user_ids)
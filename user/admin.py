@@ -2,7 +2,7 @@ from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as DjangoUserAdmin
 from django.utils.translation import gettext as _
 
-from .models import User
+from .models import User, UserAccountSummary
 
 
 @admin.register(User)
@@ -38,3 +38,15 @@ class UserAdmin(DjangoUserAdmin):
     list_display = ("email", "first_name", "last_name", "is_staff")
     search_fields = ("email", "first_name", "last_name")
     ordering = ("email",)
+
+
+@admin.register(UserAccountSummary)
+class UserAccountSummaryAdmin(admin.ModelAdmin):
+    list_display = (
+        "user",
+        "active_borrowings",
+        "pending_payments",
+        "outstanding_amount",
+        "lifetime_spend",
+    )
+    readonly_fields = list_display
@@ -0,0 +1,99 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import router
+from django.utils.translation import gettext_lazy as _
+from drf_spectacular.contrib.rest_framework_simplejwt import SimpleJWTScheme
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import Token
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from LibraryService.conditional import fresh_version, invalidate_versions
+
+USER_CACHE_TIMEOUT = 5 * 60
+USER_VERSION_KEY = "user:auth:version:{}"
+# Renamed from "user:auth:user:", whose entries were whole pickled users.
+USER_KEY = "user:auth:entry:{}"
+# All a request needs of its user, the other fields load when read.
+CACHED_USER_FIELDS = ("id", "is_staff", "is_active")
+
+
+def invalidate_cached_user(user_id) -> None:
+    """Make authentication load ``user_id`` from the database again"""
+    invalidate_versions([USER_VERSION_KEY.format(user_id)])
+
+
+def cached_user_entry(user) -> dict:
+    """What is cached of ``user``: no password hash, only a digest of it"""
+    return {
+        **{name: getattr(user, name) for name in CACHED_USER_FIELDS},
+        "revoke_hash": get_md5_hash_password(user.password),
+    }
+
+
+def lightweight_user(entry: dict):
+    """A user holding the cached fields, the others deferred"""
+    User = get_user_model()
+    names = [
+        field.attname
+        for field in User._meta.concrete_fields
+        if field.attname in CACHED_USER_FIELDS
+    ]
+    return User.from_db(
+        router.db_for_read(User), names, [entry[name] for name in names]
+    )
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    ``JWTAuthentication`` that keeps the token's user in the cache.
+
+    Only the user's id, ``is_staff``, ``is_active`` and a digest of the
+    password hash for revocation are stored, next to the per-user version
+    they were loaded under, and both are read in one round trip. A cache
+    hit authenticates without a query and returns a user with the other
+    fields deferred. Saving or deleting the user bumps the version. Writes
+    that bypass the model signals (``QuerySet.update``) are seen after
+    ``USER_CACHE_TIMEOUT``.
+    """
+
+    def get_user(self, validated_token: Token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None:
+            return super().get_user(validated_token)
+
+        version_key = USER_VERSION_KEY.format(user_id)
+        user_key = USER_KEY.format(user_id)
+        cached = cache.get_many([version_key, user_key])
+        version = cached.get(version_key)
+        if version is None:
+            cache.add(version_key, fresh_version(), None)
+            version = cache.get(version_key)
+
+        entry = cached.get(user_key)
+        if entry is not None and entry[0] == version:
+            self.check_revoked(validated_token, entry[1]["revoke_hash"])
+            return lightweight_user(entry[1])
+
+        # Checks is_active and revocation before anything is cached.
+        user = super().get_user(validated_token)
+        cache.set(
+            user_key, (version, cached_user_entry(user)), USER_CACHE_TIMEOUT
+        )
+        return user
+
+    def check_revoked(self, validated_token: Token, revoke_hash: str) -> None:
+        if api_settings.CHECK_REVOKE_TOKEN and validated_token.get(
+            api_settings.REVOKE_TOKEN_CLAIM
+        ) != revoke_hash:
+            raise AuthenticationFailed(
+                _("The user's password has been changed."),
+                code="password_changed",
+            )
+
+
+class CachedJWTScheme(SimpleJWTScheme):
+    """Documents ``CachedJWTAuthentication`` like the plain JWT scheme"""
+
+    target_class = CachedJWTAuthentication
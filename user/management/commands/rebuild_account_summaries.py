@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from user.accounts import rebuild_account_summaries
+
+
+class Command(BaseCommand):
+    """Repair drift of the denormalized account summaries"""
+
+    help = (
+        "Recompute every user's active borrowings, pending payments, "
+        "outstanding amount and lifetime spend from the source tables."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        rebuilt = rebuild_account_summaries(chunk_size=options["chunk_size"])
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt {rebuilt} account summaries.")
+        )
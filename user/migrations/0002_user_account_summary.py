@@ -0,0 +1,58 @@
+# Generated by Django 5.0.6 on 2026-10-18 02:11
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+from user.accounts import rebuild_account_summaries
+
+
+def backfill(apps, schema_editor):
+    rebuild_account_summaries(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("user", "0001_initial"),
+        ("borrowing_app", "0004_outboxmessage"),
+        ("payment_app", "0004_stripe_event"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UserAccountSummary",
+            fields=[
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="account_summary",
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                ("active_borrowings", models.IntegerField(default=0)),
+                ("pending_payments", models.IntegerField(default=0)),
+                (
+                    "outstanding_amount",
+                    models.DecimalField(
+                        decimal_places=2, default=Decimal("0.00"), max_digits=12
+                    ),
+                ),
+                (
+                    "lifetime_spend",
+                    models.DecimalField(
+                        decimal_places=2, default=Decimal("0.00"), max_digits=12
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "account summary",
+                "verbose_name_plural": "account summaries",
+            },
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,11 @@
+from decimal import Decimal
+
 from django.contrib.auth.models import (
     AbstractUser,
     BaseUserManager,
 )
 from django.db import models
+from django.db.models import Case, F, Value, When
 from django.utils.translation import gettext as _
 
 
@@ -48,3 +51,96 @@ class User(AbstractUser):
     REQUIRED_FIELDS = []
 
     objects = UserManager()
+
+
+class UserAccountSummaryQuerySet(models.QuerySet):
+    COUNTERS = (
+        "active_borrowings",
+        "pending_payments",
+        "outstanding_amount",
+        "lifetime_spend",
+    )
+
+    def reserve_loans(
+        self, user_id: int, count: int, limit: int | None = None
+    ) -> bool:
+        """
+        Count ``count`` new loans, False when that would exceed ``limit``.
+
+        A single conditional UPDATE, so concurrent borrows cannot both
+        slip under the limit.
+        """
+        self.bulk_create([self.model(user_id=user_id)], ignore_conflicts=True)
+        summaries = self.filter(user_id=user_id)
+        if limit:
+            summaries = summaries.filter(active_borrowings__lte=limit - count)
+        return bool(
+            summaries.update(active_borrowings=F("active_borrowings") + count)
+        )
+
+    def adjust(self, user_id: int, **deltas) -> None:
+        """Add ``deltas`` to the counters of one user"""
+        self.adjust_many({user_id: deltas})
+
+    def adjust_many(self, deltas: dict[int, dict]) -> None:
+        """
+        Add per user deltas to the counters in one UPDATE.
+
+        Missing rows are created first. Call it in the transaction that
+        makes the change being counted, so the summary commits with it.
+        """
+        deltas = {user_id: delta for user_id, delta in deltas.items() if delta}
+        if not deltas:
+            return
+
+        self.bulk_create(
+            (self.model(user_id=user_id) for user_id in deltas),
+            ignore_conflicts=True,
+        )
+        changes = {}
+        for counter in self.COUNTERS:
+            whens = [
+                When(user_id=user_id, then=Value(delta[counter]))
+                for user_id, delta in deltas.items()
+                if counter in delta
+            ]
+            if whens:
+                field = self.model._meta.get_field(counter)
+                changes[counter] = F(counter) + Case(
+                    *whens, default=Value(0), output_field=field.clone()
+                )
+        self.filter(user_id__in=deltas).update(**changes)
+
+
+class UserAccountSummary(models.Model):
+    """
+    Running totals of a user's loans and payments.
+
+    Kept up to date by the borrow, return and payment code paths, so
+    eligibility checks read one row by primary key. Repair drift with
+    ``python manage.py rebuild_account_summaries``.
+    """
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="account_summary",
+    )
+    active_borrowings = models.IntegerField(default=0)
+    pending_payments = models.IntegerField(default=0)
+    outstanding_amount = models.DecimalField(
+        max_digits=12, decimal_places=2, default=Decimal("0.00")
+    )
+    lifetime_spend = models.DecimalField(
+        max_digits=12, decimal_places=2, default=Decimal("0.00")
+    )
+
+    objects = UserAccountSummaryQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = "account summary"
+        verbose_name_plural = "account summaries"
+
+    def __str__(self):
+        return f"Account summary of {self.user_id}"
@@ -1,6 +1,8 @@
 from django.contrib.auth import get_user_model
 from rest_framework import serializers
 
+from user.models import UserAccountSummary
+
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -22,3 +24,14 @@ class UserSerializer(serializers.ModelSerializer):
             user.save()
 
         return user
+
+
+class UserAccountSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UserAccountSummary
+        fields = (
+            "active_borrowings",
+            "pending_payments",
+            "outstanding_amount",
+            "lifetime_spend",
+        )
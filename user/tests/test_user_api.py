@@ -1,3 +1,10 @@
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.core.management import call_command
 from django.test import TestCase
 from rest_framework import status
 from rest_framework.test import APIClient
@@ -5,6 +12,14 @@ from rest_framework.exceptions import ErrorDetail
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 
+from LibraryService.throttling import reset_throttle
+from books_app.models import Book
+from borrowing_app.models import Borrowing
+from payment_app.models import Payment
+from payment_app.webhooks import record_paid
+from user.authentication import CACHED_USER_FIELDS, USER_KEY
+from user.models import UserAccountSummary
+
 
 class UserManagerTest(TestCase):
 
@@ -103,3 +118,144 @@ class UserAPITest(TestCase):
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(self.user.email, res.data.get("email"))
+
+
+class CachedJWTAuthenticationTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="cached@api.com", password="password"
+        )
+        response = self.client.post(
+            reverse("users:token_obtain_pair"),
+            {"email": "cached@api.com", "password": "password"},
+        )
+        self.client.credentials(
+            HTTP_AUTHORIZE=f"Bearer {response.data['access']}"
+        )
+
+    def me(self):
+        return self.client.get(reverse("users:manage"))
+
+    def test_cached_user_needs_no_query(self):
+        books = reverse("books_app:book-list")
+        self.assertEqual(self.client.get(books).status_code, status.HTTP_200_OK)
+        # The catalog page is cached too, authentication is all that's left.
+        with self.assertNumQueries(0):
+            response = self.client.get(books)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.assertEqual(self.me().data["email"], "cached@api.com")
+
+    def test_password_hash_is_not_cached(self):
+        self.me()
+        version, entry = cache.get(USER_KEY.format(self.user.pk))
+        self.assertEqual(set(entry), {*CACHED_USER_FIELDS, "revoke_hash"})
+        self.assertNotIn(self.user.password, entry.values())
+
+    def test_profile_update_is_seen(self):
+        self.me()
+        response = self.client.patch(
+            reverse("users:manage"), {"email": "renamed@api.com"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.me().data["email"], "renamed@api.com")
+        self.assertTrue(
+            get_user_model().objects.get(pk=self.user.pk)
+            .check_password("password")
+        )
+
+    def test_admin_changes_are_seen(self):
+        self.me()
+        self.user.is_staff = True
+        self.user.save()
+        self.assertTrue(self.me().data["is_staff"])
+
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.me().status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deleted_user_is_rejected(self):
+        self.me()
+        self.user.delete()
+        self.assertEqual(self.me().status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class UserAccountSummaryTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="testuser@mail.com", password="password"
+        )
+        reset_throttle("return_book", self.user.pk)
+        self.client.force_authenticate(user=self.user)
+        self.book = Book.objects.create(
+            title="Test Book",
+            author="Author",
+            inventory=10,
+            daily_fee=Decimal("1.00"),
+        )
+
+    def borrow(self, count=1):
+        return self.client.post(
+            reverse("borrowing_app:borrowing-batch-create"),
+            {
+                "expected_return_date": (
+                    date.today() + timedelta(days=7)
+                ).isoformat(),
+                "books": [self.book.id] * count,
+            },
+            format="json",
+        )
+
+    def summary(self):
+        response = self.client.get(reverse("users:account"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_summary_follows_borrow_return_and_payment(self):
+        self.assertEqual(self.summary()["active_borrowings"], 0)
+        self.borrow(2)
+        self.assertEqual(self.summary()["active_borrowings"], 2)
+
+        borrowing = Borrowing.objects.first()
+        url = reverse("borrowing_app:borrowing-return-book", args=[borrowing.id])
+        with patch("payment_app.tasks.create_payment_session.delay"):
+            for _ in range(2):
+                self.client.post(url, HTTP_PREFER="respond-async")
+        self.assertEqual(
+            self.summary(),
+            {
+                "active_borrowings": 1,
+                "pending_payments": 1,
+                "outstanding_amount": "1.00",
+                "lifetime_spend": "0.00",
+            },
+        )
+
+        response = self.borrow()
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("pending payments", str(response.data))
+
+        payment = Payment.objects.select_related("borrowing").get()
+        record_paid([payment])
+        self.assertEqual(self.summary()["pending_payments"], 0)
+        self.assertEqual(self.summary()["lifetime_spend"], "1.00")
+        self.assertEqual(self.borrow().status_code, status.HTTP_201_CREATED)
+
+    @patch("borrowing_app.serializers.MAX_ACTIVE_LOANS", 3)
+    def test_max_active_loans(self):
+        self.assertEqual(self.borrow(2).status_code, status.HTTP_201_CREATED)
+        response = self.borrow(2)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("more than 3 books", str(response.data))
+        self.assertEqual(self.borrow(1).status_code, status.HTTP_201_CREATED)
+
+    def test_rebuild_repairs_drift(self):
+        self.borrow(3)
+        UserAccountSummary.objects.filter(user=self.user).update(
+            active_borrowings=7, pending_payments=2
+        )
+        call_command("rebuild_account_summaries", stdout=StringIO())
+        self.assertEqual(self.summary()["active_borrowings"], 3)
+        self.assertEqual(self.summary()["pending_payments"], 0)
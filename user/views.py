@@ -1,10 +1,12 @@
 from drf_spectacular.utils import extend_schema_view, extend_schema
+from django.contrib.auth import get_user_model
 from rest_framework import generics
 from rest_framework.permissions import IsAuthenticated
-from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework_simplejwt.views import TokenVerifyView, TokenRefreshView, TokenObtainPairView
 
-from user.serializers import UserSerializer
+from user.authentication import CachedJWTAuthentication
+from user.models import UserAccountSummary
+from user.serializers import UserAccountSummarySerializer, UserSerializer
 
 
 @extend_schema_view(
@@ -37,8 +39,31 @@ class CreateUserView(generics.CreateAPIView):
 )
 class ManageUserView(generics.RetrieveUpdateAPIView):
     serializer_class = UserSerializer
-    authentication_classes = (JWTAuthentication,)
+    authentication_classes = (CachedJWTAuthentication,)
     permission_classes = (IsAuthenticated,)
 
     def get_object(self):
-        return self.request.user
+        # The authenticated user may be a lightweight one from the cache.
+        return get_user_model().objects.get(pk=self.request.user.pk)
+
+
+@extend_schema_view(
+    get=extend_schema(
+        summary="Retrieve the account summary of the authenticated user",
+        description=(
+            "Active borrowings, pending payments, outstanding amount and "
+            "lifetime spend of the currently authenticated user."
+        ),
+        responses={200: UserAccountSummarySerializer}
+    )
+)
+class UserAccountSummaryView(generics.RetrieveAPIView):
+    serializer_class = UserAccountSummarySerializer
+    authentication_classes = (CachedJWTAuthentication,)
+    permission_classes = (IsAuthenticated,)
+
+    def get_object(self):
+        return (
+            UserAccountSummary.objects.filter(pk=self.request.user.pk).first()
+            or UserAccountSummary(user=self.request.user)
+        )